@@ -0,0 +1,111 @@
+# filename: adaptive_chunking.py
+# 自适应分块：根据每个分块的填充耗时和 Enqueue 确认延迟，在上下限内调整下一个分块的行数，使每秒入队行数最大
+from typing import Dict, List, Optional
+from loguru import logger
+from chunker import count_lines
+
+# 默认的分块行数上下限
+DEFAULT_MIN_CHUNK_LINES = 20
+DEFAULT_MAX_CHUNK_LINES = 2000
+# 每次调整的倍率：增大时乘以该值，减小时除以该值
+DEFAULT_STEP_FACTOR = 1.5
+# 吞吐量下降超过该比例才认为本次调整方向错误，避免被测量抖动带偏
+DEFAULT_TOLERANCE = 0.05
+
+
+class AdaptiveChunkSizer:
+    """
+    基于爬山法的分块行数调节器。
+    每个分块入队成功后调用 observe：计算 行数 / (填充耗时 + 确认耗时) 得到吞吐量，
+    若吞吐量比上一次提升（或持平）则沿当前方向继续调整，明显下降则反向调整；
+    调整以刚测量的分块的实际行数为基准，因此分块预读造成的滞后不会使调整方向失真。
+    next_size 作为 chunker 的 lines_per_chunk 函数传入，每个分块开始前读取一次当前行数。
+    """
+    def __init__(
+        self,
+        initial_size: int,
+        min_size: int = DEFAULT_MIN_CHUNK_LINES,
+        max_size: int = DEFAULT_MAX_CHUNK_LINES,
+        step_factor: float = DEFAULT_STEP_FACTOR,
+        tolerance: float = DEFAULT_TOLERANCE
+    ):
+        """
+        Args:
+            initial_size (int): 初始分块行数。
+            min_size (int): 分块行数下限。
+            max_size (int): 分块行数上限。
+            step_factor (float): 每次调整的倍率（大于 1）。
+            tolerance (float): 判定吞吐量下降的相对阈值。
+        """
+        if min_size <= 0 or max_size < min_size:
+            raise ValueError(f"分块行数上下限无效：min_size={min_size}, max_size={max_size}")
+        if step_factor <= 1:
+            raise ValueError(f"调整倍率必须大于 1，当前为 {step_factor}")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.step_factor = step_factor
+        self.tolerance = tolerance
+        self.current_size = self._clamp(initial_size)
+        self.direction = 1 # 1 表示增大，-1 表示减小
+        self.last_throughput: Optional[float] = None
+        self.history: List[Dict[str, float]] = [] # 每个分块的测量记录，用于运行结束时汇总
+
+    def _clamp(self, size: float) -> int:
+        return int(min(self.max_size, max(self.min_size, round(size))))
+
+    def next_size(self) -> int:
+        """返回下一个分块应使用的行数。"""
+        return self.current_size
+
+    def observe(self, index: int, content: str, timings: Dict[str, float]) -> None:
+        """
+        记录一个分块的测量结果并调整下一个分块的行数。可直接注册为 EnqueueBackend 的分块监听器。
+
+        Args:
+            index (int): 分块序号。
+            content (str): 分块文本。
+            timings (Dict[str, float]): 各阶段耗时；优先使用 "fill" + "ack"，否则使用 "total"。
+        """
+        lines = count_lines(content)
+        fill_seconds = timings.get("fill", 0.0)
+        ack_seconds = timings.get("ack", 0.0)
+        measured_seconds = fill_seconds + ack_seconds if ("fill" in timings or "ack" in timings) else timings.get("total", 0.0)
+        if lines == 0 or measured_seconds <= 0:
+            return
+
+        throughput = lines / measured_seconds
+        if self.last_throughput is not None and throughput < self.last_throughput * (1 - self.tolerance):
+            self.direction = -self.direction
+        self.last_throughput = throughput
+
+        # 以本分块的实际行数为基准调整：分块可能被预读，当前值未必就是本分块使用的行数
+        factor = self.step_factor if self.direction > 0 else 1 / self.step_factor
+        self.current_size = self._clamp(lines * factor)
+        # 到达上下限时反向，以便继续探索
+        if self.current_size == self._clamp(lines):
+            self.direction = -self.direction
+
+        self.history.append({
+            "index": index,
+            "lines": lines,
+            "fill_seconds": fill_seconds,
+            "ack_seconds": ack_seconds,
+            "lines_per_second": throughput,
+            "next_size": self.current_size,
+        })
+        logger.info(
+            f"[自适应分块] 第 {index + 1} 个分块：{lines} 行，填充 {fill_seconds:.3f} 秒，"
+            f"确认 {ack_seconds:.3f} 秒，吞吐 {throughput:.1f} 行/秒 → 下一个分块 {self.current_size} 行。"
+        )
+
+    def log_summary(self) -> None:
+        """在运行日志中输出自适应分块的汇总。"""
+        if not self.history:
+            logger.info("[自适应分块] 没有测量记录。")
+            return
+        best = max(self.history, key=lambda record: record["lines_per_second"])
+        sizes = [int(record["lines"]) for record in self.history]
+        logger.info(
+            f"[自适应分块] 共测量 {len(self.history)} 个分块，分块行数范围 {min(sizes)}~{max(sizes)}，"
+            f"最佳吞吐 {best['lines_per_second']:.1f} 行/秒（{int(best['lines'])} 行/块），最终分块行数 {self.current_size}。"
+        )
@@ -0,0 +1,64 @@
+# filename: background_writer.py
+# 后台写入线程：分块监听器在事件循环中被调用，其中的 fsync、SQLite 提交等阻塞写入交给单独的线程执行。
+# 写入线程每次取出当前排队的全部任务一起写入（一次 fsync / 一次提交覆盖多条记录），入队越快合并越多。
+import queue
+import threading
+from typing import Any, Callable, List
+from loguru import logger
+
+_STOP = object()
+
+
+class BackgroundWriter:
+    """
+    单线程串行写入器：submit 只把任务放入队列立即返回；写入线程批量取出任务交给 write_batch。
+    写入失败时记录错误并继续处理后续任务（与在监听器中直接写入时一样，不影响入队）。
+    """
+    def __init__(self, write_batch: Callable[[List[Any]], None], name: str):
+        """
+        Args:
+            write_batch (Callable[[List[Any]], None]): 在写入线程中调用，参数为按提交顺序排列的一批任务。
+            name (str): 线程名称，也用于日志。
+        """
+        self.write_batch = write_batch
+        self.name = name
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> None:
+        """提交一个写入任务（不阻塞）。"""
+        if not self._thread.is_alive():
+            raise RuntimeError(f"{self.name} 写入线程已停止。")
+        self._queue.put(item)
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in batch:
+                stopping = True
+                batch = [item for item in batch if item is not _STOP]
+            try:
+                if batch:
+                    self.write_batch(batch)
+            except Exception as e:
+                logger.error(f"{self.name} 写入 {len(batch)} 条记录失败: {e}")
+            finally:
+                for _ in range(len(batch) + (1 if stopping else 0)):
+                    self._queue.task_done()
+
+    def flush(self) -> None:
+        """等待已提交的任务全部写入。"""
+        self._queue.join()
+
+    def close(self) -> None:
+        """写完已提交的任务后停止写入线程；可重复调用。"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
@@ -0,0 +1,131 @@
+# filename: backpressure.py
+# 队列深度背压：读取队列扩展 (agent-scheduler) 中待处理任务数，使积压保持在高低水位之间
+import asyncio
+import json
+import time
+import urllib.request
+from typing import Awaitable, Callable, Optional
+from loguru import logger
+
+# 队列扩展的队列查询接口
+QUEUE_STATUS_ENDPOINT = "/agent-scheduler/v1/queue?limit=1"
+
+# 默认水位（单位：队列中的任务数，每次 Enqueue 产生一个任务）
+DEFAULT_LOW_WATERMARK = 20
+DEFAULT_HIGH_WATERMARK = 200
+# 暂停期间查询队列深度的间隔 (秒)，以及低于高水位时本地估算值的最长有效期 (秒)
+DEFAULT_POLL_INTERVAL_SECONDS = 5.0
+DEFAULT_REFRESH_INTERVAL_SECONDS = 10.0
+# 查询请求超时 (秒)
+QUEUE_STATUS_TIMEOUT_SECONDS = 10.0
+
+# 读取队列深度的协程函数：返回待处理任务数
+DepthReader = Callable[[], Awaitable[int]]
+
+
+def make_queue_depth_reader(webui_url: str) -> DepthReader:
+    """
+    创建通过 HTTP 接口读取队列扩展待处理任务数的函数（标准库 urllib，在工作线程中执行，不阻塞事件循环）。
+
+    Args:
+        webui_url (str): WebUI 地址。
+    """
+    status_url = f"{webui_url.rstrip('/')}{QUEUE_STATUS_ENDPOINT}"
+
+    def fetch() -> int:
+        with urllib.request.urlopen(status_url, timeout=QUEUE_STATUS_TIMEOUT_SECONDS) as response:
+            data = json.loads(response.read().decode('utf-8'))
+        if "total_pending_tasks" in data:
+            return int(data["total_pending_tasks"])
+        return len(data.get("pending_tasks", []))
+
+    async def read_depth() -> int:
+        return await asyncio.to_thread(fetch)
+
+    return read_depth
+
+
+class QueueBackpressure:
+    """
+    基于高低水位的入队背压控制器（带滞回）。
+    - 积压低于高水位时不等待，立即入队；两次查询之间用“上次读数 + 之后已入队数”估算积压，减少查询次数；
+    - 积压达到高水位时暂停，按 poll_interval 轮询，直到降到低水位以下再恢复；
+    - 无法读取队列深度（如未安装队列扩展）时记录一次警告并停用背压，不影响入队。
+    """
+    def __init__(
+        self,
+        read_depth: DepthReader,
+        low_watermark: int = DEFAULT_LOW_WATERMARK,
+        high_watermark: int = DEFAULT_HIGH_WATERMARK,
+        poll_interval: float = DEFAULT_POLL_INTERVAL_SECONDS,
+        refresh_interval: float = DEFAULT_REFRESH_INTERVAL_SECONDS,
+        label: str = ""
+    ):
+        """
+        Args:
+            read_depth (DepthReader): 读取待处理任务数的协程函数。
+            low_watermark (int): 低水位，暂停后积压降到此值以下才恢复入队。
+            high_watermark (int): 高水位，积压达到此值时暂停入队。
+            poll_interval (float): 暂停期间的查询间隔（秒）。
+            refresh_interval (float): 非暂停状态下重新查询的最长间隔（秒）。
+            label (str): 日志中显示的后端名称。
+        """
+        if low_watermark < 0 or high_watermark <= low_watermark:
+            raise ValueError(f"水位设置无效：low={low_watermark}, high={high_watermark}")
+        self.read_depth = read_depth
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self.poll_interval = poll_interval
+        self.refresh_interval = refresh_interval
+        self.label = label
+        self.enabled = True
+        self.last_depth: Optional[int] = None
+        self.last_read_at = 0.0
+        self.enqueued_since_read = 0
+        self.paused_seconds = 0.0 # 累计暂停时间，用于汇总
+
+    async def _refresh(self) -> Optional[int]:
+        """查询队列深度；失败时停用背压并返回 None。"""
+        try:
+            depth = await self.read_depth()
+        except Exception as e:
+            self.enabled = False
+            logger.warning(f"[背压{self.label}] 无法读取队列深度，已停用背压控制: {e}")
+            return None
+        self.last_depth = depth
+        self.last_read_at = time.monotonic()
+        self.enqueued_since_read = 0
+        return depth
+
+    def estimated_depth(self) -> Optional[int]:
+        """上次读数加上之后已入队的任务数。"""
+        if self.last_depth is None:
+            return None
+        return self.last_depth + self.enqueued_since_read
+
+    async def wait_for_capacity(self) -> None:
+        """在入队前调用：积压未达高水位时立即返回，否则暂停直到降到低水位以下。"""
+        if not self.enabled:
+            return
+        depth = self.estimated_depth()
+        stale = time.monotonic() - self.last_read_at >= self.refresh_interval
+        if depth is None or stale or depth >= self.high_watermark:
+            depth = await self._refresh()
+            if depth is None:
+                return
+        if depth < self.high_watermark:
+            return
+
+        logger.info(f"[背压{self.label}] 队列积压 {depth} 个任务，达到高水位 {self.high_watermark}，暂停入队。")
+        pause_start = time.monotonic()
+        while depth is not None and depth >= self.low_watermark:
+            await asyncio.sleep(self.poll_interval)
+            depth = await self._refresh()
+        paused = time.monotonic() - pause_start
+        self.paused_seconds += paused
+        if depth is not None:
+            logger.info(f"[背压{self.label}] 队列积压降至 {depth} 个任务，暂停 {paused:.1f} 秒后恢复入队。")
+
+    def note_enqueued(self, tasks: int = 1) -> None:
+        """入队成功后调用，更新本地估算的积压。"""
+        self.enqueued_since_read += tasks
@@ -0,0 +1,89 @@
+# filename: benchmarks/bench_selector_lookup.py
+# 基准测试：对比每一步都用 get_by_role 定位控件与使用 ui_map 缓存的标记选择器定位控件的耗时
+# 使用本地模拟页面（大量带标签的 Gradio 风格表单块 + WebUI 中需要操作的控件），无需启动 WebUI。
+# 运行方式: python benchmarks/bench_selector_lookup.py [--blocks 500 5000] [--repeat 50]
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+from playwright.async_api import async_playwright
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent)) # 允许从仓库根目录导入模块
+from ui_map import UiMap, UI_CONTROLS
+
+# 每个分块都要定位的控件
+PER_CHUNK_CONTROLS = ("prompt_list", "enqueue")
+
+FILLER_BLOCK = """
+<div class="block gradio-textbox"><label><span>设置项 {i}</span>
+<textarea aria-label="设置项 {i}" rows="1"></textarea></label>
+<button aria-label="按钮 {i}">🔄 {i}</button></div>
+"""
+
+TARGET_CONTROLS = """
+<textarea aria-label="提示词" rows="3"></textarea>
+<button>🎲️</button>
+<input type="text" aria-label="脚本">
+<textarea aria-label="提示词输入列表" rows="10"></textarea>
+<button>Enqueue</button>
+"""
+
+
+def make_page(block_count: int) -> str:
+    """生成包含 block_count 个填充块的模拟页面，目标控件放在末尾（最坏情况）。"""
+    filler = "".join(FILLER_BLOCK.format(i=i) for i in range(block_count))
+    return f"<!DOCTYPE html><html><body>{filler}{TARGET_CONTROLS}</body></html>"
+
+
+async def time_role_lookup(page, repeat: int) -> list[float]:
+    """原方式：每次都按角色与名称重新查询。"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for name in PER_CHUNK_CONTROLS:
+            control = UI_CONTROLS[name]
+            await page.get_by_role(control.role, name=control.label, exact=control.exact).wait_for(state="visible")
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def time_ui_map_lookup(page, repeat: int) -> list[float]:
+    """ui_map：首次解析后使用缓存的标记选择器（含每次的失效检查）。"""
+    ui = UiMap(page)
+    for name in PER_CHUNK_CONTROLS:
+        await ui.get(name)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for name in PER_CHUNK_CONTROLS:
+            await (await ui.get(name)).wait_for(state="visible")
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def run_benchmark(block_counts: list[int], repeat: int) -> None:
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.launch(headless=True)
+        page = await browser.new_page()
+        print(f"{'填充块数':>8} {'方式':>10} {'中位数(ms)':>12} {'p95(ms)':>10}")
+        for block_count in block_counts:
+            await page.set_content(make_page(block_count))
+            for mode, measure in (("get_by_role", time_role_lookup), ("ui_map", time_ui_map_lookup)):
+                samples = sorted(await measure(page, repeat))
+                p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+                print(f"{block_count:>8} {mode:>10} {statistics.median(samples):>12.2f} {p95:>10.2f}")
+        await browser.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比按角色查询与 ui_map 缓存选择器的控件定位耗时。")
+    parser.add_argument("--blocks", type=int, nargs="+", default=[500, 5000], help="模拟页面的填充块数量。")
+    parser.add_argument("--repeat", type=int, default=50, help="每种方式重复次数（每次定位一个分块所需的全部控件）。")
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.blocks, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
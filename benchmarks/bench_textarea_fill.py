@@ -0,0 +1,78 @@
+# filename: benchmarks/bench_textarea_fill.py
+# 基准测试：对比“提示词输入列表”的常规填充与快速填充（单次 evaluate + 一次 input 事件）
+# 使用本地的模拟页面（仿 WebUI 的 textarea + 每次 input 事件都做一遍全文处理的响应式逻辑），无需启动 WebUI。
+# 运行方式: python benchmarks/bench_textarea_fill.py [--repeat 5] [--lines 100 1000 10000]
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+from playwright.async_api import async_playwright
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent)) # 允许从仓库根目录导入模块
+from fast_fill import fill_textarea_fast, fill_textarea_standard
+
+# 模拟页面：每次 input 事件都会像 Gradio/Svelte 的绑定一样复制并处理整段文本
+STAND_IN_PAGE = """
+<!DOCTYPE html>
+<html><body>
+<label for="prompt_list">提示词输入列表</label>
+<textarea id="prompt_list" aria-label="提示词输入列表" rows="10"></textarea>
+<div id="status">0</div>
+<script>
+  const textarea = document.getElementById('prompt_list');
+  const status = document.getElementById('status');
+  window.inputEvents = 0;
+  textarea.addEventListener('input', () => {
+    window.inputEvents += 1;
+    const lines = textarea.value.split('\\n').filter(line => line.trim().length > 0);
+    status.textContent = String(lines.length);
+  });
+</script>
+</body></html>
+"""
+
+
+def make_content(line_count: int) -> str:
+    """生成与真实提示词长度相近的测试内容。"""
+    return "".join(f"masterpiece, best quality, 1girl, solo, prompt line {i}, 长提示词测试, 🎨\n" for i in range(line_count))
+
+
+async def run_benchmark(line_counts: list[int], repeat: int) -> None:
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.launch(headless=True)
+        page = await browser.new_page()
+        await page.set_content(STAND_IN_PAGE)
+        textarea = page.get_by_role("textbox", name="提示词输入列表")
+
+        print(f"{'行数':>8} {'模式':>10} {'中位数(ms)':>12} {'最小(ms)':>10} {'input事件':>10}")
+        for line_count in line_counts:
+            content = make_content(line_count)
+            for mode in ("standard", "fast"):
+                samples = []
+                events = 0
+                for _ in range(repeat):
+                    await page.evaluate("() => { window.inputEvents = 0; }")
+                    start = time.perf_counter()
+                    if mode == "fast":
+                        if not await fill_textarea_fast(textarea, content):
+                            raise RuntimeError("快速填充读回校验失败")
+                    else:
+                        await fill_textarea_standard(textarea, content)
+                    samples.append((time.perf_counter() - start) * 1000)
+                    events = await page.evaluate("() => window.inputEvents")
+                print(f"{line_count:>8} {mode:>10} {statistics.median(samples):>12.1f} {min(samples):>10.1f} {events:>10}")
+        await browser.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比提示词文本框的常规填充与快速填充耗时。")
+    parser.add_argument("--lines", type=int, nargs="+", default=[100, 1000, 10000], help="测试的行数。")
+    parser.add_argument("--repeat", type=int, default=5, help="每种组合重复次数。")
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.lines, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
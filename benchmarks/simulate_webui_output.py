@@ -0,0 +1,74 @@
+# filename: benchmarks/simulate_webui_output.py
+# 模拟 WebUI 的输出目录：按入队记录（ledger）写出带 "parameters" 文本块的 1x1 PNG，用于在本地测试与压测出图收集，无需启动 WebUI。
+# 运行方式:
+#   python benchmarks/simulate_webui_output.py 输出目录 --ledger cache/harvest/ledger_xxx.jsonl [--drop-ratio 0.1] [--interval 0.5]
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import struct
+import argparse
+import datetime
+from pathlib import Path
+from typing import Optional
+from loguru import logger
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent)) # 允许从仓库根目录导入模块
+from png_parameters import PNG_SIGNATURE, PARAMETERS_KEYWORD
+
+# 模拟图片中提示词之后的生成参数
+SIMULATED_SETTINGS = "Negative prompt: \nSteps: 20, Sampler: Euler a, CFG scale: 7, Seed: 1, Size: 512x512"
+
+
+def _png_chunk(chunk_type: bytes, body: bytes) -> bytes:
+    """组装一个 PNG 块：长度 + 类型 + 数据 + CRC。"""
+    return struct.pack(">I", len(body)) + chunk_type + body + struct.pack(">I", zlib.crc32(chunk_type + body))
+
+
+def write_parameters_png(image_path: Path, parameters: str) -> None:
+    """写出一张带 "parameters" 文本块的 1x1 PNG（与 WebUI 一致：可用 Latin-1 表示时写 tEXt，否则写 iTXt）。"""
+    try:
+        text_chunk = _png_chunk(b"tEXt", PARAMETERS_KEYWORD.encode("latin-1") + b"\x00" + parameters.encode("latin-1"))
+    except UnicodeEncodeError:
+        text_chunk = _png_chunk(b"iTXt", PARAMETERS_KEYWORD.encode("latin-1") + b"\x00\x00\x00\x00\x00" + parameters.encode("utf-8"))
+    header = _png_chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 0, 0, 0, 0)) # 1x1 灰度
+    pixels = _png_chunk(b"IDAT", zlib.compress(b"\x00\x00"))
+    with open(str(image_path), "wb") as f:
+        f.write(PNG_SIGNATURE + header + text_chunk + pixels + _png_chunk(b"IEND", b""))
+
+
+def simulate_output(output_dir: Path, ledger_path: Path, drop_ratio: float, interval: float, seed: Optional[int]) -> None:
+    """按入队记录向目录投放模拟 PNG（文件名与 WebUI 一样按序号命名），drop_ratio 比例的提示词不出图。"""
+    rng = random.Random(seed)
+    day_dir = output_dir / datetime.date.today().isoformat()
+    day_dir.mkdir(parents=True, exist_ok=True)
+    number = len(os.listdir(day_dir))
+    written = 0
+    with open(str(ledger_path), "r", encoding="utf-8") as f:
+        for line in f:
+            prompt = json.loads(line)["prompt"]
+            if rng.random() < drop_ratio:
+                continue
+            image_path = day_dir / f"{number:05d}-{rng.randrange(2 ** 32)}.png"
+            write_parameters_png(image_path, f"{prompt}\n{SIMULATED_SETTINGS}")
+            number += 1
+            written += 1
+            time.sleep(interval)
+    logger.info(f"已向 '{day_dir}' 投放 {written} 张模拟图片。")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按入队记录向目录投放模拟 PNG，用于本地测试出图收集。")
+    parser.add_argument("output_dir", type=Path)
+    parser.add_argument("--ledger", type=Path, required=True, help="main.py --harvest / --report 写出的入队记录。")
+    parser.add_argument("--drop-ratio", type=float, default=0.0, help="不出图的提示词比例。")
+    parser.add_argument("--interval", type=float, default=0.0, help="每张图片之间的间隔（秒）。")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    simulate_output(args.output_dir, args.ledger, args.drop_ratio, args.interval, args.seed)
+
+
+if __name__ == "__main__":
+    main()
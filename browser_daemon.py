@@ -0,0 +1,66 @@
+# filename: browser_daemon.py
+# 常驻浏览器：启动一个带远程调试端口的持久化 Chromium 并打开 WebUI，之后每次运行 main.py --cdp-url 都连接它，
+# 复用已加载（并已完成准备）的 WebUI 标签页，省去冷启动和页面准备时间。
+# 运行方式: python browser_daemon.py [--port 9222] [--webui-url http://localhost:7862]
+import asyncio
+import argparse
+from pathlib import Path
+from loguru import logger
+from playwright.async_api import async_playwright
+from my_tools import setup_logger
+from enqueue_backends import DEFAULT_WEBUI_URL
+
+# 默认的远程调试端口与用户数据目录
+DEFAULT_CDP_PORT = 9222
+DEFAULT_USER_DATA_DIR = Path(__file__).resolve().parent / "browser_profile"
+
+
+def cdp_url_for_port(port: int) -> str:
+    """返回本机常驻浏览器的 CDP 地址。"""
+    return f"http://127.0.0.1:{port}"
+
+
+async def run_browser_daemon(webui_url: str, port: int, user_data_dir: Path) -> None:
+    """
+    启动持久化上下文的 Chromium（开启远程调试端口），打开 WebUI，然后一直运行直到浏览器被关闭或按下 Ctrl+C。
+
+    Args:
+        webui_url (str): WebUI 地址。
+        port (int): 远程调试端口。
+        user_data_dir (Path): 浏览器用户数据目录（保存登录状态、缓存等，加快后续加载）。
+    """
+    user_data_dir.mkdir(parents=True, exist_ok=True)
+    async with async_playwright() as playwright:
+        context = await playwright.chromium.launch_persistent_context(
+            str(user_data_dir),
+            headless=False,
+            no_viewport=True,
+            args=["--start-maximized", f"--remote-debugging-port={port}"]
+        )
+        page = context.pages[0] if context.pages else await context.new_page()
+        await page.goto(f"{webui_url.rstrip('/')}/?__theme=dark")
+
+        closed = asyncio.Event()
+        context.on("close", lambda _: closed.set())
+        logger.success(f"常驻浏览器已启动，WebUI 已加载。运行 main.py 时加上 --cdp-url {cdp_url_for_port(port)} 即可复用。")
+        logger.info("关闭浏览器窗口或按 Ctrl+C 退出。")
+        await closed.wait()
+    logger.info("常驻浏览器已关闭。")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动供 main.py 通过 CDP 复用的常驻浏览器。")
+    parser.add_argument("--webui-url", default=DEFAULT_WEBUI_URL, help="WebUI 地址。")
+    parser.add_argument("--port", type=int, default=DEFAULT_CDP_PORT, help="远程调试端口。")
+    parser.add_argument("--user-data-dir", type=Path, default=DEFAULT_USER_DATA_DIR, help="浏览器用户数据目录。")
+    args = parser.parse_args()
+
+    setup_logger()
+    try:
+        asyncio.run(run_browser_daemon(args.webui_url, args.port, args.user_data_dir))
+    except KeyboardInterrupt:
+        logger.info("用户中断，常驻浏览器退出。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# filename: browser_profiles.py
+# 浏览器运行配置：full 为原有的有界面全量加载；lean 为无人值守用的精简配置（无头、小视口、屏蔽图片/字体/媒体、关闭动画）
+import json
+from typing import Any, Dict, FrozenSet, List, Optional
+from loguru import logger
+from playwright.async_api import BrowserContext, Route
+
+# 关闭 Gradio 的动画与过渡效果，避免等待元素“稳定”时被动画拖慢
+DISABLE_ANIMATIONS_CSS = """
+*, *::before, *::after {
+    animation-duration: 0s !important;
+    animation-delay: 0s !important;
+    transition-duration: 0s !important;
+    transition-delay: 0s !important;
+    scroll-behavior: auto !important;
+}
+"""
+
+# 在每个页面文档创建时注入上述样式
+DISABLE_ANIMATIONS_SCRIPT = """
+(css) => {
+    const inject = () => {
+        const style = document.createElement('style');
+        style.setAttribute('data-auto-queue', 'disable-animations');
+        style.textContent = css;
+        (document.head || document.documentElement).appendChild(style);
+    };
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', inject, { once: true });
+    } else {
+        inject();
+    }
+}
+"""
+
+
+class BrowserProfile:
+    """一组浏览器启动与上下文设置。"""
+    def __init__(
+        self,
+        name: str,
+        headless: bool,
+        launch_args: List[str],
+        viewport: Optional[Dict[str, int]] = None,
+        blocked_resource_types: FrozenSet[str] = frozenset(),
+        disable_animations: bool = False
+    ):
+        """
+        Args:
+            name (str): 配置名称。
+            headless (bool): 是否无头运行。
+            launch_args (List[str]): Chromium 启动参数。
+            viewport (Optional[Dict[str, int]]): 固定视口大小；为 None 时使用窗口大小（no_viewport）。
+            blocked_resource_types (FrozenSet[str]): 需要屏蔽的请求资源类型（Playwright 的 resource_type）。
+            disable_animations (bool): 是否注入关闭动画/过渡的样式。
+        """
+        self.name = name
+        self.headless = headless
+        self.launch_args = launch_args
+        self.viewport = viewport
+        self.blocked_resource_types = blocked_resource_types
+        self.disable_animations = disable_animations
+
+    def context_options(self) -> Dict[str, Any]:
+        """browser.new_context 的参数。"""
+        if self.viewport is None:
+            return {"no_viewport": True}
+        return {"viewport": dict(self.viewport)}
+
+    async def apply_to_context(self, context: BrowserContext) -> None:
+        """为上下文安装资源屏蔽路由和关闭动画的注入脚本。"""
+        if self.blocked_resource_types:
+            blocked = self.blocked_resource_types
+
+            async def handle_route(route: Route) -> None:
+                if route.request.resource_type in blocked:
+                    await route.abort()
+                else:
+                    await route.continue_()
+
+            await context.route("**/*", handle_route)
+            logger.info(f"[{self.name}] 已屏蔽资源类型: {', '.join(sorted(blocked))}")
+        if self.disable_animations:
+            await context.add_init_script(script=f"({DISABLE_ANIMATIONS_SCRIPT})({json.dumps(DISABLE_ANIMATIONS_CSS)})")
+            logger.info(f"[{self.name}] 已注入关闭动画与过渡的样式。")
+
+
+# 原有配置：有界面、最大化窗口、加载全部资源
+FULL_PROFILE = BrowserProfile(
+    name="full",
+    headless=False,
+    launch_args=["--start-maximized"]
+)
+
+# 精简配置：无头、固定小视口、屏蔽图片/字体/媒体、关闭动画，适合无人值守的长时间运行
+LEAN_PROFILE = BrowserProfile(
+    name="lean",
+    headless=True,
+    launch_args=["--disable-gpu", "--disable-extensions", "--mute-audio"],
+    viewport={"width": 1280, "height": 800},
+    blocked_resource_types=frozenset({"image", "font", "media"}),
+    disable_animations=True
+)
+
+BROWSER_PROFILES = {profile.name: profile for profile in (FULL_PROFILE, LEAN_PROFILE)}
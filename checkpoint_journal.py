@@ -0,0 +1,149 @@
+# filename: checkpoint_journal.py
+# 检查点日志：每个分块确认入队后追加一条记录并 fsync（在后台写入线程中进行），中断后可用 --resume 从下一个分块继续
+import os
+import asyncio
+import json
+import hashlib
+import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+from loguru import logger
+from chunker import count_lines
+from background_writer import BackgroundWriter
+
+# 计算文件哈希时每次读取的字节数
+HASH_READ_SIZE = 1024 * 1024
+
+
+def compute_file_hash(file_path: Path) -> str:
+    """流式计算文件内容的 SHA-256 十六进制摘要。"""
+    digest = hashlib.sha256()
+    with open(str(file_path), 'rb') as f:
+        for block in iter(lambda: f.read(HASH_READ_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class CheckpointJournal:
+    """
+    仅追加的检查点日志，以输入文件内容哈希区分（每个哈希一个 .jsonl 文件），每行记录一个已确认入队的分块：
+    {"chunk": 分块序号, "start": 起始字节, "end": 结束字节, "lines": 行数, "time": 时间}
+
+    持久性保证：record 只把记录交给后台写入线程即返回，写入线程随后追加并 flush + fsync
+    （同时到达的多条记录合并为一次 fsync），不阻塞事件循环。因此 record 返回时记录尚未落盘，
+    进程或机器在这段窗口内崩溃会丢失最后几条记录，续跑时这些分块会重新入队（重复出图）；
+    flush / close 返回后，之前记录的分块均已 fsync。
+    """
+    def __init__(self, journal_dir: Path, input_file_path: Path, resume: bool = False):
+        """
+        构造时不读取输入文件；续跑时由 prepare 在工作线程中计算哈希并加载记录，
+        新的运行则由写入线程在写入第一条记录前计算哈希并创建日志。
+
+        Args:
+            journal_dir (Path): 日志目录。
+            input_file_path (Path): 输入文件路径，用于计算内容哈希。
+            resume (bool): True 时加载已有记录用于续跑；False 时开始新的日志（清空同一输入的旧记录）。
+        """
+        journal_dir.mkdir(parents=True, exist_ok=True)
+        self.journal_dir = journal_dir
+        self.input_file_path = input_file_path
+        self.resume = resume
+        self.file_hash: Optional[str] = None
+        self.journal_path: Optional[Path] = None
+        self.completed: Dict[int, Tuple[int, int]] = {} # 分块序号 -> (起始字节, 结束字节)
+        # 由分块器在产出分块前填写，确认入队后据此写入日志
+        self.chunk_offsets: Dict[int, Tuple[int, int]] = {}
+        self._file = None
+        # record 可能同时在事件循环（入队确认）与读取线程（去重后为空的分块）中调用，写入统一由该线程串行执行
+        self._writer = BackgroundWriter(self._write_records, "检查点日志")
+
+    def _locate(self) -> None:
+        """计算输入文件的内容哈希并确定日志路径（读取整个输入文件，只在工作线程或写入线程中调用）。"""
+        if self.journal_path is None:
+            self.file_hash = compute_file_hash(self.input_file_path)
+            self.journal_path = self.journal_dir / f"{self.file_hash[:16]}.jsonl"
+
+    async def prepare(self) -> None:
+        """续跑时在工作线程中计算输入哈希并加载已有记录；新的运行无需准备，直接返回。"""
+        if self.resume:
+            await asyncio.to_thread(self._prepare_resume)
+
+    def _prepare_resume(self) -> None:
+        self._locate()
+        if self.journal_path.exists():
+            self._load()
+        else:
+            logger.info(f"未找到输入文件 '{self.input_file_path.name}' 的检查点日志，将从头开始。")
+
+    def _load(self) -> None:
+        """读取已有记录；末尾被截断的半行（崩溃时写入一半）会被忽略。"""
+        with open(str(self.journal_path), 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, start=1):
+                try:
+                    record = json.loads(line)
+                    self.completed[int(record["chunk"])] = (int(record["start"]), int(record["end"]))
+                except (ValueError, KeyError, TypeError):
+                    logger.warning(f"检查点日志第 {line_number} 行无法解析，已忽略。")
+        logger.info(f"已加载检查点日志 '{self.journal_path.name}'：{len(self.completed)} 个分块已完成。")
+
+    def resume_point(self) -> Tuple[int, int]:
+        """
+        计算续跑起点：从第 0 个分块起连续完成的最后一个分块之后。
+
+        Returns:
+            Tuple[int, int]: (下一个分块序号, 对应的起始字节位置)
+        """
+        next_index = 0
+        offset = 0
+        while next_index in self.completed and self.completed[next_index][0] == offset:
+            offset = self.completed[next_index][1]
+            next_index += 1
+        return next_index, offset
+
+    def completed_ranges(self) -> Set[Tuple[int, int]]:
+        """所有已完成分块的字节范围，用于跳过续跑起点之后零散完成的分块。"""
+        return set(self.completed.values())
+
+    def record(self, index: int, content: str, timings: Optional[Dict[str, float]] = None) -> None:
+        """
+        记录一个已确认入队的分块。只交给后台写入线程即返回，不等待 fsync（见类说明）。
+        可直接注册为 EnqueueBackend 的分块监听器。
+
+        Args:
+            index (int): 分块序号。
+            content (str): 分块文本（用于记录行数）。
+            timings (Optional[Dict[str, float]]): 各阶段耗时（未使用，仅为兼容监听器签名）。
+        """
+        byte_range = self.chunk_offsets.pop(index, None)
+        if byte_range is None:
+            logger.warning(f"第 {index + 1} 个分块没有字节范围信息，无法写入检查点日志。")
+            return
+        record = {
+            "chunk": index,
+            "start": byte_range[0],
+            "end": byte_range[1],
+            "lines": count_lines(content),
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        }
+        self._writer.submit(record)
+
+    def _write_records(self, records: List[Dict[str, Any]]) -> None:
+        """在写入线程中追加一批记录，只 fsync 一次；首次写入时打开（新的运行为清空）日志文件。"""
+        if self._file is None:
+            self._locate()
+            self._file = open(str(self.journal_path), 'a' if self.resume else 'w', encoding='utf-8')
+        self._file.write("".join(json.dumps(record, ensure_ascii=False) + '\n' for record in records))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        for record in records:
+            self.completed[record["chunk"]] = (record["start"], record["end"])
+
+    def flush(self) -> None:
+        """等待已记录的分块全部 fsync 到磁盘。"""
+        self._writer.flush()
+
+    def close(self) -> None:
+        """写完尚未落盘的记录后关闭日志。"""
+        self._writer.close()
+        if self._file is not None and not self._file.closed:
+            self._file.close()
@@ -0,0 +1,348 @@
+# filename: chunk_cache.py
+# 分块缓存：按内容哈希（SHA-256）存储分块，内容相同的分块只存一份（objects/<前两位>/<哈希>.txt）；
+# 每次运行写一份清单（runs/<运行ID>.jsonl），记录分块序号 → 哈希。命中已有分块时只更新其修改时间（即最近使用时间），不重复写入。
+# 分块与运行清单都计入容量上限（默认 512 MB，环境变量 CHUNK_CACHE_MAX_MB，0 为不限制）。超过容量上限或保留天数
+# （CHUNK_CACHE_MAX_AGE_DAYS）时，分块与清单统一按最近使用时间从旧到新淘汰；引用了被淘汰分块的运行清单也一并删除。
+# 每次运行结束时都会检查一次。
+# 查看与清理:
+#   python chunk_cache.py stats [--cache-dir cache/chunks]
+#   python chunk_cache.py gc [--max-mb 256] [--max-age-days 30] [--dry-run]
+#   python chunk_cache.py export 运行ID 目录      # 按运行清单还原为 拆分N_<运行ID>.txt
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from loguru import logger
+
+DEFAULT_CHUNK_CACHE_DIR = Path(__file__).resolve().parent / "cache" / "chunks"
+DEFAULT_MAX_CACHE_MB = 512.0
+OBJECT_SUFFIX = ".txt"
+MANIFEST_SUFFIX = ".jsonl"
+
+
+def default_max_bytes() -> int:
+    """容量上限（字节）：环境变量 CHUNK_CACHE_MAX_MB（由 main.py --cache-max-mb 设置），0 表示不限制。"""
+    return int(float(os.getenv("CHUNK_CACHE_MAX_MB", DEFAULT_MAX_CACHE_MB)) * 1024 * 1024)
+
+
+def default_max_age_days() -> float:
+    """保留天数：环境变量 CHUNK_CACHE_MAX_AGE_DAYS（由 main.py --cache-max-age-days 设置），0 表示不按时间淘汰。"""
+    return float(os.getenv("CHUNK_CACHE_MAX_AGE_DAYS", "0"))
+
+
+def chunk_hash(data: bytes) -> str:
+    """分块内容（UTF-8 编码）的 SHA-256 十六进制摘要。"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class CacheRun:
+    """
+    一次运行的清单：每个分块存入缓存，并向 runs/<运行ID>.jsonl 追加一行 {"chunk": 序号, "hash": 哈希}。
+    清单第一行记录运行 ID、来源与创建时间。close 时检查缓存容量与保留天数（本次运行的分块与清单不会被淘汰）。
+    """
+    def __init__(self, cache: "ChunkCache", run_id: str, source: str = ""):
+        self.cache = cache
+        self.run_id = run_id
+        self.path = cache.runs_dir / f"{run_id}{MANIFEST_SUFFIX}"
+        self.hashes: Set[str] = set()
+        self.chunks = 0
+        self.hits = 0
+        cache.runs_dir.mkdir(parents=True, exist_ok=True)
+        self._file = open(str(self.path), "w", encoding="utf-8")
+        header = {"run": run_id, "source": source, "created": datetime.datetime.now().isoformat(timespec="seconds")}
+        self._file.write(json.dumps(header, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def add(self, index: int, content: str) -> Path:
+        """存入一个分块并记录到清单，返回分块文件路径。"""
+        digest, object_path, written = self.cache.put(content)
+        self.hashes.add(digest)
+        self.chunks += 1
+        if not written:
+            self.hits += 1
+        self._file.write(json.dumps({"chunk": index, "hash": digest}) + "\n")
+        self._file.flush()
+        return object_path
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self._file.close()
+        logger.info(
+            f"分块缓存：运行 {self.run_id} 共 {self.chunks} 个分块，其中 {self.hits} 个已在缓存中（未重复写入）。清单: {self.path}"
+        )
+        # 即使没有新写入的分块，清单本身也占用空间，旧清单与旧分块也可能已过期
+        try:
+            self.cache.gc(protect=self.hashes, protect_runs={self.run_id})
+        except OSError as e:
+            logger.error(f"分块缓存清理失败: {e}")
+
+
+class ChunkCache:
+    """内容寻址的分块缓存（目录结构见文件头部说明）。"""
+    def __init__(self, root: Path = DEFAULT_CHUNK_CACHE_DIR, max_bytes: Optional[int] = None, max_age_days: Optional[float] = None):
+        """
+        Args:
+            root (Path): 缓存目录。
+            max_bytes (Optional[int]): 容量上限（字节），None 时取 default_max_bytes()，0 表示不限制。
+            max_age_days (Optional[float]): 未被使用超过该天数的分块与运行清单被淘汰，None 时取 default_max_age_days()，0 表示不按时间淘汰。
+        """
+        self.root = root
+        self.objects_dir = root / "objects"
+        self.runs_dir = root / "runs"
+        self.max_bytes = default_max_bytes() if max_bytes is None else max_bytes
+        self.max_age_days = default_max_age_days() if max_age_days is None else max_age_days
+
+    def object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / f"{digest}{OBJECT_SUFFIX}"
+
+    def put(self, content: str) -> Tuple[str, Path, bool]:
+        """
+        存入分块内容。已存在时只更新修改时间（最近使用时间）。
+
+        Returns:
+            Tuple[str, Path, bool]: (哈希, 分块文件路径, 是否新写入)。
+        """
+        data = content.encode("utf-8")
+        digest = chunk_hash(data)
+        object_path = self.object_path(digest)
+        try:
+            os.utime(str(object_path))
+            return digest, object_path, False
+        except FileNotFoundError:
+            pass
+        object_path.parent.mkdir(parents=True, exist_ok=True)
+        # 先写临时文件再原子替换，中断时不会留下内容不完整的分块
+        temp_path = object_path.with_name(f"{digest}.{os.getpid()}.tmp")
+        with open(str(temp_path), "wb") as f:
+            f.write(data)
+        os.replace(str(temp_path), str(object_path))
+        return digest, object_path, True
+
+    def start_run(self, source: str = "") -> CacheRun:
+        """开始一次运行（写出清单），运行 ID 为精确到微秒的时间戳加进程号。"""
+        run_id = f"{datetime.datetime.now():%Y%m%d_%H%M%S_%f}_{os.getpid()}"
+        return CacheRun(self, run_id, source)
+
+    def iter_objects(self) -> Iterator[Tuple[str, str, int, float]]:
+        """遍历缓存中的分块，产出 (哈希, 文件路径, 字节数, 最近使用时间)。"""
+        if not self.objects_dir.is_dir():
+            return
+        with os.scandir(str(self.objects_dir)) as buckets:
+            for bucket in buckets:
+                if not bucket.is_dir(follow_symlinks=False):
+                    continue
+                with os.scandir(bucket.path) as entries:
+                    for entry in entries:
+                        if entry.name.endswith(OBJECT_SUFFIX):
+                            stat = entry.stat()
+                            yield entry.name[:-len(OBJECT_SUFFIX)], entry.path, stat.st_size, stat.st_mtime
+
+    def iter_manifests(self) -> Iterator[Tuple[str, str, int, float]]:
+        """遍历运行清单文件，产出 (运行 ID, 文件路径, 字节数, 最近使用时间)。"""
+        if not self.runs_dir.is_dir():
+            return
+        with os.scandir(str(self.runs_dir)) as entries:
+            for entry in entries:
+                if entry.name.endswith(MANIFEST_SUFFIX):
+                    stat = entry.stat()
+                    yield entry.name[:-len(MANIFEST_SUFFIX)], entry.path, stat.st_size, stat.st_mtime
+
+    def iter_runs(self) -> Iterator[Tuple[Path, Dict[str, Any], List[str]]]:
+        """遍历运行清单，产出 (清单路径, 清单头, 按分块顺序的哈希列表)。"""
+        if not self.runs_dir.is_dir():
+            return
+        for manifest_path in sorted(self.runs_dir.glob(f"*{MANIFEST_SUFFIX}")):
+            header: Dict[str, Any] = {}
+            hashes: List[str] = []
+            try:
+                with open(str(manifest_path), "r", encoding="utf-8") as f:
+                    for line_number, line in enumerate(f):
+                        item = json.loads(line)
+                        if line_number == 0:
+                            header = item
+                        else:
+                            hashes.append(item["hash"])
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"运行清单 '{manifest_path}' 无法读取: {e}")
+            yield manifest_path, header, hashes
+
+    def stats(self) -> Dict[str, Any]:
+        """汇总：分块数、占用字节（含清单）、运行数、清单中的分块引用数（引用数/分块数即重复利用率）、分块最早与最近使用时间。"""
+        objects = 0
+        total_bytes = 0
+        oldest = newest = None
+        for _, _, size, mtime in self.iter_objects():
+            objects += 1
+            total_bytes += size
+            oldest = mtime if oldest is None else min(oldest, mtime)
+            newest = mtime if newest is None else max(newest, mtime)
+        runs = 0
+        references = 0
+        for _, _, hashes in self.iter_runs():
+            runs += 1
+            references += len(hashes)
+        manifest_bytes = sum(size for _, _, size, _ in self.iter_manifests())
+        return {
+            "objects": objects,
+            "bytes": total_bytes + manifest_bytes,
+            "manifest_bytes": manifest_bytes,
+            "runs": runs,
+            "chunk_references": references,
+            "oldest_used": oldest,
+            "newest_used": newest,
+            "max_bytes": self.max_bytes,
+            "max_age_days": self.max_age_days,
+        }
+
+    def gc(
+        self,
+        max_bytes: Optional[int] = None,
+        max_age_days: Optional[float] = None,
+        protect: Optional[Set[str]] = None,
+        protect_runs: Optional[Set[str]] = None,
+        dry_run: bool = False
+    ) -> Dict[str, int]:
+        """
+        淘汰分块与运行清单：两者统一按最近使用时间从旧到新排列，先淘汰超过保留天数的，再继续淘汰直到总占用（分块 + 清单）
+        不超过容量上限。引用了被淘汰分块的运行清单随之删除（清单已无法完整还原）。
+
+        Args:
+            max_bytes (Optional[int]): 容量上限，None 时使用实例配置。
+            max_age_days (Optional[float]): 保留天数，None 时使用实例配置。
+            protect (Optional[Set[str]]): 不淘汰的分块哈希（如当前运行刚写入的分块）。
+            protect_runs (Optional[Set[str]]): 不淘汰的运行 ID（如当前运行）。
+            dry_run (bool): True 时只统计，不删除。
+        Returns:
+            Dict[str, int]: evicted_objects / freed_bytes / removed_runs / remaining_bytes。
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        max_age_days = self.max_age_days if max_age_days is None else max_age_days
+        protect = protect or set()
+        protect_runs = protect_runs or set()
+        manifests = list(self.iter_manifests())
+        manifest_sizes = {run_id: size for run_id, _, size, _ in manifests}
+        # (最近使用时间, 是否为清单, 哈希或运行 ID, 文件路径, 字节数)
+        entries = sorted(
+            [(mtime, False, digest, path, size) for digest, path, size, mtime in self.iter_objects()]
+            + [(mtime, True, run_id, path, size) for run_id, path, size, mtime in manifests]
+        )
+        total_bytes = sum(entry[4] for entry in entries)
+        cutoff = time.time() - max_age_days * 86400 if max_age_days > 0 else None
+
+        evicted: Set[str] = set()
+        removed_runs: Set[str] = set()
+        freed_bytes = 0
+        for mtime, is_manifest, key, path, size in entries:
+            expired = cutoff is not None and mtime < cutoff
+            over_limit = max_bytes > 0 and total_bytes - freed_bytes > max_bytes
+            if not expired and not over_limit:
+                break # 按使用时间排序，之后的条目更新，均无需淘汰
+            if key in (protect_runs if is_manifest else protect):
+                continue
+            if not dry_run:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            (removed_runs if is_manifest else evicted).add(key)
+            freed_bytes += size
+
+        if evicted:
+            for manifest_path, _, hashes in self.iter_runs():
+                run_id = manifest_path.name[:-len(MANIFEST_SUFFIX)]
+                if run_id in removed_runs or run_id in protect_runs or not evicted.intersection(hashes):
+                    continue
+                removed_runs.add(run_id)
+                freed_bytes += manifest_sizes.get(run_id, 0)
+                if not dry_run:
+                    manifest_path.unlink(missing_ok=True)
+
+        result = {
+            "evicted_objects": len(evicted),
+            "freed_bytes": freed_bytes,
+            "removed_runs": len(removed_runs),
+            "remaining_bytes": total_bytes - freed_bytes,
+        }
+        if evicted or removed_runs:
+            action = "可淘汰" if dry_run else "已淘汰"
+            logger.info(
+                f"分块缓存{action} {len(evicted)} 个分块与 {len(removed_runs)} 份运行清单（{freed_bytes / 1024 / 1024:.1f} MB），"
+                f"剩余 {result['remaining_bytes'] / 1024 / 1024:.1f} MB。"
+            )
+        return result
+
+    def export_run(self, run_id: str, output_dir: Path) -> List[Path]:
+        """
+        按运行清单将分块还原为 拆分<序号>_<运行ID>.txt（序号从 1 开始），返回写出的文件路径。
+        清单及其分块的修改时间随之更新（视为最近使用）。
+        """
+        manifest_path = self.runs_dir / f"{run_id}{MANIFEST_SUFFIX}"
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"运行清单不存在: {manifest_path}")
+        os.utime(str(manifest_path))
+        output_dir.mkdir(parents=True, exist_ok=True)
+        written = []
+        with open(str(manifest_path), "r", encoding="utf-8") as f:
+            next(f, None) # 清单头
+            for line in f:
+                item = json.loads(line)
+                output_path = output_dir / f"拆分{item['chunk'] + 1}_{run_id}.txt"
+                object_path = self.object_path(item["hash"])
+                shutil.copyfile(str(object_path), str(output_path))
+                os.utime(str(object_path))
+                written.append(output_path)
+        return written
+
+
+def _format_time(timestamp: Optional[float]) -> str:
+    return datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S") if timestamp is not None else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看与清理内容寻址的分块缓存。")
+    parser.add_argument("--cache-dir", type=Path, default=DEFAULT_CHUNK_CACHE_DIR, help="分块缓存目录。")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    stats_parser = subparsers.add_parser("stats", help="显示缓存占用与最近的运行。")
+    stats_parser.add_argument("--runs", type=int, default=10, help="列出的最近运行数。")
+    gc_parser = subparsers.add_parser("gc", help="按容量上限与保留天数淘汰分块与运行清单。")
+    gc_parser.add_argument("--max-mb", type=float, default=None, help="容量上限（MB），默认取 CHUNK_CACHE_MAX_MB 或 512，0 为不限制。")
+    gc_parser.add_argument("--max-age-days", type=float, default=None, help="未被使用超过该天数的分块与运行清单将被淘汰，0 为不按时间淘汰。")
+    gc_parser.add_argument("--dry-run", action="store_true", help="只显示将被淘汰的数量，不删除。")
+    export_parser = subparsers.add_parser("export", help="按运行清单还原拆分文件。")
+    export_parser.add_argument("run_id")
+    export_parser.add_argument("output_dir", type=Path)
+    args = parser.parse_args()
+
+    if args.command == "gc":
+        max_bytes = int(args.max_mb * 1024 * 1024) if args.max_mb is not None else None
+        cache = ChunkCache(args.cache_dir, max_bytes, args.max_age_days)
+        result = cache.gc(dry_run=args.dry_run)
+        if not result["evicted_objects"] and not result["removed_runs"]:
+            logger.info(f"分块缓存占用 {result['remaining_bytes'] / 1024 / 1024:.1f} MB，无需淘汰。")
+        return
+
+    cache = ChunkCache(args.cache_dir)
+    if args.command == "export":
+        written = cache.export_run(args.run_id, args.output_dir)
+        logger.info(f"已还原 {len(written)} 个拆分文件到 '{args.output_dir}'。")
+        return
+
+    stats = cache.stats()
+    limit = f"{stats['max_bytes'] / 1024 / 1024:.0f} MB" if stats["max_bytes"] > 0 else "不限制"
+    print(f"缓存目录: {cache.root}")
+    print(f"分块: {stats['objects']} 个，连同清单共 {stats['bytes'] / 1024 / 1024:.1f} MB（上限 {limit}）")
+    print(f"运行清单: {stats['runs']} 份（{stats['manifest_bytes'] / 1024:.1f} KB），引用分块 {stats['chunk_references']} 次")
+    print(f"最早使用: {_format_time(stats['oldest_used'])}，最近使用: {_format_time(stats['newest_used'])}")
+    runs = list(cache.iter_runs())[-args.runs:]
+    for manifest_path, header, hashes in runs:
+        print(f"  {header.get('run', manifest_path.stem)}  {len(hashes):>6} 个分块  {header.get('source', '')}")
+
+
+if __name__ == "__main__":
+    main()
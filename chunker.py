@@ -0,0 +1,221 @@
+# filename: chunker.py
+# 流式分块：单次遍历输入，按行数产出分块，无需预先统计总行数；分块仅在需要审计时写入分块缓存（按内容哈希去重）
+import re
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, Optional, Set, Tuple, Union
+from loguru import logger
+from chunk_cache import ChunkCache, CacheRun
+
+# 默认每个分块的行数
+DEFAULT_LINES_PER_CHUNK = 100
+
+# 分块行数：固定整数，或每个分块开始前调用一次、返回本块行数的函数（用于自适应分块）
+ChunkSize = Union[int, Callable[[], int]]
+
+# 二进制读取的一行中按通用换行拆分出的各行（\r\n、单独的 \r、\n 结尾，或末尾无换行的部分）
+_RAW_LINE_PATTERN = re.compile(rb"[^\r\n]*(?:\r\n|\r|\n)|[^\r\n]+")
+
+
+def count_lines(content: str) -> int:
+    """统计分块文本的行数（最后一行可能没有换行符）。"""
+    if not content:
+        return 0
+    return content.count('\n') + (0 if content.endswith('\n') else 1)
+
+
+def check_chunk(index: int, chunk_lines: list[str], content: str) -> bool:
+    """
+    入队前校验分块（在读取线程中执行，与上一个分块的入队重叠）。
+    拼接后的行数与分组行数不一致（某行缺少换行符或含内嵌换行）或全部为空行时记录错误并返回 False，该分块不入队；
+    含部分空行时记录警告（WebUI 会跳过空行，实际出图数少于行数）。
+
+    Args:
+        index (int): 分块序号（从 0 开始）。
+        chunk_lines (list[str]): 分块的所有行。
+        content (str): 拼接后的分块文本。
+
+    Returns:
+        bool: 分块是否可以入队。
+    """
+    joined_lines = count_lines(content)
+    if joined_lines != len(chunk_lines):
+        logger.error(f"第 {index + 1} 个分块应有 {len(chunk_lines)} 行，拼接后为 {joined_lines} 行（存在缺少换行符或含内嵌换行的行），不入队。")
+        return False
+    empty_lines = sum(1 for line in chunk_lines if not line.strip())
+    if empty_lines == len(chunk_lines):
+        logger.error(f"第 {index + 1} 个分块全部为空行，不入队。")
+        return False
+    if empty_lines:
+        logger.warning(f"第 {index + 1} 个分块含 {empty_lines} 个空行，WebUI 会跳过这些行。")
+    return True
+
+
+def iter_line_chunks(lines: Iterable[str], lines_per_chunk: ChunkSize = DEFAULT_LINES_PER_CHUNK) -> Iterator[list[str]]:
+    """
+    将任意行序列按行数分组，最后一组可能不足规定行数。
+    只保留当前分组在内存中。
+
+    Args:
+        lines (Iterable[str]): 行序列（通常保留行尾换行符）。
+        lines_per_chunk (ChunkSize): 每个分块的行数，或返回下一块行数的函数。
+
+    Yields:
+        list[str]: 一个分块的所有行。
+    """
+    next_chunk_size = lines_per_chunk if callable(lines_per_chunk) else (lambda: lines_per_chunk)
+    iterator = iter(lines)
+    while True:
+        chunk_size = next_chunk_size()
+        if chunk_size <= 0:
+            raise ValueError(f"每个分块的行数必须大于 0，当前为 {chunk_size}")
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _open_audit_run(audit_dir: Optional[Path], source: str) -> Optional[CacheRun]:
+    """按需在分块缓存（audit_dir）中开始一次运行；失败只记录错误，不影响分块的产出。"""
+    if audit_dir is None:
+        return None
+    try:
+        return ChunkCache(audit_dir).start_run(source)
+    except OSError as e:
+        logger.error(f"无法打开分块缓存 '{audit_dir}'，本次不写出审计分块: {e}")
+        return None
+
+
+def _write_audit_chunk(audit_run: Optional[CacheRun], index: int, content: str) -> None:
+    """按需将分块存入缓存（内容相同的分块不重复写入）；写入失败只记录错误，不影响分块的产出。"""
+    if audit_run is None:
+        return
+    try:
+        object_path = audit_run.add(index, content)
+        logger.debug(f"第 {index + 1} 个分块已存入分块缓存：'{object_path}'")
+    except OSError as e:
+        logger.error(f"第 {index + 1} 个分块存入分块缓存失败: {e}")
+
+
+def iter_text_chunks(
+    lines: Iterable[str],
+    lines_per_chunk: ChunkSize = DEFAULT_LINES_PER_CHUNK,
+    audit_dir: Optional[Path] = None,
+    source: str = "",
+    start_index: int = 0
+) -> Iterator[Tuple[int, str]]:
+    """
+    将行序列分块并拼接成文本，产出 (分块序号, 分块内容)。
+    如指定 audit_dir，则每个分块同时存入该目录下的分块缓存，并记录本次运行的清单。
+    未通过 check_chunk 校验的分块不产出。
+
+    Args:
+        lines (Iterable[str]): 行序列（保留行尾换行符）。
+        lines_per_chunk (ChunkSize): 每个分块的行数，或返回下一块行数的函数。
+        audit_dir (Optional[Path]): 分块缓存目录，为 None 时不写任何文件。
+        source (str): 写入运行清单的来源说明。
+        start_index (int): 第一个分块的序号（多个来源连续入队时保持序号全局唯一）。
+
+    Yields:
+        Tuple[int, str]: 分块序号（从 start_index 开始）和分块文本。
+    """
+    audit_run = _open_audit_run(audit_dir, source)
+    try:
+        for index, chunk_lines in enumerate(iter_line_chunks(lines, lines_per_chunk), start=start_index):
+            content = "".join(chunk_lines)
+            if not check_chunk(index, chunk_lines, content):
+                continue
+            _write_audit_chunk(audit_run, index, content)
+            yield index, content
+    finally:
+        if audit_run is not None:
+            audit_run.close()
+
+
+def _split_raw_line(raw_line: bytes) -> Iterator[bytes]:
+    """
+    二进制读取只按 \\n 分行；与文本模式的通用换行（及 prefix_adder 的并行加前缀）一致，
+    将其中单独的 \\r 也视为换行，拆分为多行（各段字节长度之和等于原行，便于记录字节范围）。
+    """
+    if b'\r' not in raw_line:
+        yield raw_line
+        return
+    for match in _RAW_LINE_PATTERN.finditer(raw_line):
+        yield match.group()
+
+
+def _decode_line(raw_line: bytes) -> str:
+    """将二进制读取的一行解码为文本，并与文本模式一样把行尾的 \\r\\n 或单独的 \\r 统一为 \\n。"""
+    line = raw_line.decode('utf-8')
+    if line.endswith('\r\n'):
+        return line[:-2] + '\n'
+    if line.endswith('\r'):
+        return line[:-1] + '\n'
+    return line
+
+
+def iter_file_chunks(
+    file_path: Path,
+    lines_per_chunk: ChunkSize = DEFAULT_LINES_PER_CHUNK,
+    audit_dir: Optional[Path] = None,
+    start_offset: int = 0,
+    start_index: int = 0,
+    skip_ranges: Optional[Set[Tuple[int, int]]] = None,
+    chunk_offsets: Optional[Dict[int, Tuple[int, int]]] = None
+) -> Iterator[Tuple[int, str]]:
+    """
+    单次遍历文本文件，产出 (分块序号, 分块内容)。
+    以二进制方式读取以便记录每个分块在文件中的字节范围，供检查点日志断点续跑使用。
+    未通过 check_chunk 校验的分块不产出。
+
+    Args:
+        file_path (Path): 输入文件路径。
+        lines_per_chunk (ChunkSize): 每个分块的行数，或返回下一块行数的函数。
+        audit_dir (Optional[Path]): 分块缓存目录，为 None 时不写任何文件。
+        start_offset (int): 从该字节位置开始读取（断点续跑时跳过已完成的部分，不再读取）。
+        start_index (int): 第一个分块的序号。
+        skip_ranges (Optional[Set[Tuple[int, int]]]): 字节范围与其中某项完全一致的分块视为已完成，不再产出。
+        chunk_offsets (Optional[Dict[int, Tuple[int, int]]]): 如提供，产出每个分块前写入其 (起始字节, 结束字节)。
+    """
+    total_lines = 0
+    total_chunks = 0
+    skipped_chunks = 0
+    rejected_chunks = 0
+    position = [start_offset] # 已读取到的字节位置，由行生成器更新
+
+    audit_run = _open_audit_run(audit_dir, str(file_path))
+    try:
+        with open(str(file_path), 'rb') as infile:
+            infile.seek(start_offset)
+
+            def decoded_lines() -> Iterator[str]:
+                for raw_line in infile:
+                    for segment in _split_raw_line(raw_line):
+                        position[0] += len(segment)
+                        yield _decode_line(segment)
+
+            chunk_start = start_offset
+            for index, chunk_lines in enumerate(iter_line_chunks(decoded_lines(), lines_per_chunk), start=start_index):
+                chunk_end = position[0]
+                byte_range = (chunk_start, chunk_end)
+                chunk_start = chunk_end
+                if skip_ranges and byte_range in skip_ranges:
+                    skipped_chunks += 1
+                    continue
+                content = "".join(chunk_lines)
+                if not check_chunk(index, chunk_lines, content):
+                    rejected_chunks += 1
+                    continue
+                total_lines += len(chunk_lines)
+                total_chunks += 1
+                if chunk_offsets is not None:
+                    chunk_offsets[index] = byte_range
+                _write_audit_chunk(audit_run, index, content)
+                yield index, content
+    finally:
+        if audit_run is not None:
+            audit_run.close()
+
+    skipped_note = f"，跳过已完成的 {skipped_chunks} 个分块" if skipped_chunks else ""
+    rejected_note = f"，{rejected_chunks} 个分块未通过校验" if rejected_chunks else ""
+    logger.info(f"文件 '{file_path}' 分块完成：共 {total_lines} 行，{total_chunks} 个分块{skipped_note}{rejected_note}。")
@@ -0,0 +1,544 @@
+# filename: enqueue_backends.py
+# 入队后端：统一的 EnqueueBackend 接口，以及 Playwright 浏览器后端和 HTTP API 后端两种实现
+import asyncio
+import time
+from pathlib import Path
+from typing import Optional, Tuple, Dict, List, Any, Callable, Iterable, AsyncIterable, AsyncIterator, Union
+from loguru import logger
+from playwright.async_api import Playwright, async_playwright
+from webui_waits import StepWaiter, DEFAULT_MIN_DELAY_SECONDS
+from backpressure import QueueBackpressure
+from fast_fill import fill_textarea, FILL_MODE_FAST
+from browser_profiles import BrowserProfile, FULL_PROFILE
+from trace_spans import TRACER
+from ui_map import UiMap
+from png_parameters import reference_payload
+
+try:
+    import aiohttp # 可选依赖：仅 HTTP API 后端需要
+except ImportError:
+    aiohttp = None
+
+# WebUI 默认地址
+DEFAULT_WEBUI_URL = "http://localhost:7862"
+
+# HTTP API 后端可用的接口：queue 为队列扩展 (agent-scheduler) 的入队接口，txt2img 为 WebUI 原生接口
+API_ENDPOINTS = {
+    "queue": "/agent-scheduler/v1/queue/txt2img",
+    "txt2img": "/sdapi/v1/txt2img",
+}
+
+# 请求发出后（读取超时、连接中断）仍可重试的接口：队列接口只负责排队并立即返回。
+# txt2img 同步出图且不幂等，请求发出后的失败可能意味着服务器仍在出图，重试会重复占用 GPU。
+RETRY_AFTER_SEND_ENDPOINTS = ("queue",)
+
+# “Prompts from file or textbox” 脚本在 API 中的名称
+PROMPTS_FROM_FILE_SCRIPT_NAME = "prompts from file or textbox"
+
+# 分块数据：(分块序号, 分块文本内容)，序号从 0 开始
+ChunkItem = Tuple[int, str]
+
+# 分块入队失败的类型（子类记录在 chunk_failures 中；未记录的失败视为后端故障，可改派给其他后端）
+# 分块本身被 WebUI 拒绝（4xx、参数校验失败）：与后端健康无关，换后端也不会成功
+FAILURE_REJECTED = "rejected"
+# 请求已发出但结果未知（如 txt2img 读取超时）：后端可能仍在处理，改派可能重复出图
+FAILURE_UNCONFIRMED = "unconfirmed"
+
+# 分块入队成功后的回调：(分块序号, 分块文本, 各阶段耗时)，耗时字典至少包含 "total"（秒）
+ChunkListener = Callable[[int, str, Dict[str, float]], None]
+
+
+async def _iterate_chunks(chunks: Union[Iterable[ChunkItem], AsyncIterable[ChunkItem]]) -> AsyncIterator[ChunkItem]:
+    """统一遍历同步或异步的分块来源。"""
+    if hasattr(chunks, "__aiter__"):
+        async for item in chunks:
+            yield item
+    else:
+        for item in chunks:
+            yield item
+
+
+class EnqueueBackend:
+    """
+    入队后端的统一接口。
+    子类实现 start / enqueue_chunk / close；enqueue_chunks 负责按 max_in_flight 限制并发地提交所有分块。
+    """
+    name = "base"
+    max_in_flight = 1 # 同时在途的入队请求数上限
+
+    def __init__(self):
+        self.chunk_listeners: List[ChunkListener] = []
+        # 子类在 enqueue_chunk 中按分块序号记录各阶段耗时（如 "fill"、"ack"），入队成功后交给监听器
+        self.chunk_timings: Dict[int, Dict[str, float]] = {}
+        # 子类在 enqueue_chunk 返回 False 时按分块序号记录失败类型（FAILURE_*），未记录表示后端故障
+        self.chunk_failures: Dict[int, str] = {}
+        self.backpressure: Optional[QueueBackpressure] = None # 队列深度背压控制器，为 None 时不做限制
+
+    def add_chunk_listener(self, listener: ChunkListener) -> None:
+        """注册分块入队成功后的回调（如自适应分块、统计）。"""
+        self.chunk_listeners.append(listener)
+
+    async def wait_for_queue_capacity(self) -> None:
+        """入队前调用：设置了队列背压控制器时，等待 WebUI 队列积压回落到允许入队的范围。"""
+        if self.backpressure is not None:
+            await self.backpressure.wait_for_capacity()
+
+    def note_chunk_enqueued(self) -> None:
+        """入队成功后调用：更新背压控制器估算的队列积压。"""
+        if self.backpressure is not None:
+            self.backpressure.note_enqueued()
+
+    async def start(self) -> None:
+        """准备后端（启动浏览器、建立连接池等）。"""
+
+    async def enqueue_chunk(self, index: int, content: str) -> bool:
+        """
+        将一个分块加入 WebUI 队列。
+        Returns:
+            bool: 成功加入队列返回 True，否则返回 False。
+        """
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """释放后端占用的资源。"""
+
+    async def switch_reference(self, image_path: Path, reference_parameters: Optional[str] = None) -> None:
+        """
+        在已启动的会话中切换参考图片（多图任务清单按图片分组执行时调用）。
+
+        Args:
+            image_path (Path): 新的参考图片路径。
+            reference_parameters (Optional[str]): 本地读出的生成参数文本；为 None 时浏览器后端经“图片信息”页上传图片。
+        """
+        raise NotImplementedError
+
+    async def __aenter__(self) -> "EnqueueBackend":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def enqueue_chunks(self, chunks: Union[Iterable[ChunkItem], AsyncIterable[ChunkItem]]) -> Tuple[int, int]:
+        """
+        依次提交所有分块，同时在途的请求数不超过 max_in_flight。
+        分块来源在信号量满时会被暂停读取，因此内存占用有上限。
+
+        Returns:
+            Tuple[int, int]: (成功分块数, 失败分块数)
+        """
+        semaphore = asyncio.Semaphore(max(1, self.max_in_flight))
+        pending = set()
+        results = {"success": 0, "failed": 0}
+        errors = [] # enqueue_chunk 抛出的异常：出现后停止提交新的分块
+
+        async def run_one(index: int, content: str) -> None:
+            try:
+                start = time.perf_counter()
+                with TRACER.chunk_span("入队分块", index, content, backend=self.name) as span_attrs:
+                    enqueued = await self.enqueue_chunk(index, content)
+                    span_attrs["ok"] = enqueued
+                if enqueued:
+                    results["success"] += 1
+                    self.note_chunk_enqueued()
+                    timings = self.chunk_timings.pop(index, {})
+                    timings["total"] = time.perf_counter() - start
+                    logger.info(f"[{self.name}] 第 {index + 1} 个分块已加入队列（耗时 {timings['total']:.2f} 秒）。")
+                    for listener in self.chunk_listeners:
+                        listener(index, content, timings)
+                else:
+                    self.chunk_timings.pop(index, None)
+                    self.chunk_failures.pop(index, None)
+                    results["failed"] += 1
+                    logger.error(f"[{self.name}] 第 {index + 1} 个分块加入队列失败。")
+            except Exception as e:
+                logger.error(f"[{self.name}] 第 {index + 1} 个分块处理时发生异常: {e}")
+                errors.append(e)
+            finally:
+                semaphore.release()
+
+        async for index, content in _iterate_chunks(chunks):
+            await semaphore.acquire()
+            with TRACER.span("等待队列容量", "backpressure", backend=self.name):
+                await self.wait_for_queue_capacity()
+            if errors:
+                semaphore.release()
+                break
+            task = asyncio.create_task(run_one(index, content))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+
+        if pending:
+            await asyncio.gather(*pending)
+        if errors:
+            raise errors[0]
+
+        logger.info(f"[{self.name}] 入队完成：成功 {results['success']} 个分块，失败 {results['failed']} 个分块。")
+        return results["success"], results["failed"]
+
+
+class PlaywrightEnqueueBackend(EnqueueBackend):
+    """
+    通过浏览器操作 WebUI：导入参考图片 → 发送到文生图 → 选择 “Prompts from file or textbox” 脚本，
+    然后每个分块填充“提示词输入列表”并点击 Enqueue。
+    """
+    name = "playwright"
+    max_in_flight = 1 # 同一页面只能串行操作
+
+    def __init__(
+        self,
+        image_path: Path,
+        webui_url: str = DEFAULT_WEBUI_URL,
+        min_step_delay: float = DEFAULT_MIN_DELAY_SECONDS,
+        playwright: Optional[Playwright] = None,
+        fill_mode: str = FILL_MODE_FAST,
+        cdp_url: Optional[str] = None,
+        profile: BrowserProfile = FULL_PROFILE,
+        reference_parameters: Optional[str] = None
+    ):
+        """
+        Args:
+            image_path (Path): 导入的参考图片文件的绝对路径。
+            webui_url (str): WebUI 地址。
+            min_step_delay (float): 每个步骤的最小延迟（秒），作为安全下限。
+            playwright (Optional[Playwright]): 外部传入的 Playwright 实例；为 None 时由后端自行启动。
+            fill_mode (str): “提示词输入列表”的填充模式，"fast"（单次 evaluate）或 "standard"（常规 fill）。
+            cdp_url (Optional[str]): 常驻浏览器（browser_daemon.py）的 CDP 地址；指定时连接该浏览器、复用已打开的
+                WebUI 标签页，结束时只断开连接而不关闭浏览器。
+            profile (BrowserProfile): 浏览器运行配置（full 或 lean）；连接常驻浏览器时只应用资源屏蔽与动画设置。
+            reference_parameters (Optional[str]): 本地从参考图片读出的生成参数文本；指定时直接粘贴到文生图页面，
+                不再经“图片信息”页上传图片。
+        """
+        super().__init__()
+        self.image_path = image_path
+        self.webui_url = webui_url.rstrip("/")
+        self.min_step_delay = min_step_delay
+        self.fill_mode = fill_mode
+        self.cdp_url = cdp_url
+        self.profile = profile
+        self.reference_parameters = reference_parameters
+        self.page_load_seconds: Optional[float] = None
+        self.playwright = playwright
+        self._playwright_manager = None
+        self.browser = None
+        self.context = None
+        self.page = None
+        self.waiter: Optional[StepWaiter] = None
+        self.ui: Optional[UiMap] = None
+
+    @property
+    def setup_marker(self) -> str:
+        """标记页面已按当前参考图片完成准备的值（图片路径 + 修改时间），图片变化后需重新准备。"""
+        return f"{self.image_path}|{self.image_path.stat().st_mtime_ns if self.image_path.exists() else 0}"
+
+    async def _attach_over_cdp(self) -> bool:
+        """
+        连接常驻浏览器并复用已加载 WebUI 的标签页。
+        Returns:
+            bool: 复用的标签页是否已按当前参考图片完成准备（可跳过导入图片等步骤）。
+        """
+        self.browser = await self.playwright.chromium.connect_over_cdp(self.cdp_url)
+        # 常驻浏览器的默认上下文即持久化的用户数据上下文
+        self.context = self.browser.contexts[0] if self.browser.contexts else await self.browser.new_context(no_viewport=True)
+        await self.profile.apply_to_context(self.context)
+        for candidate in self.context.pages:
+            if candidate.url.startswith(self.webui_url):
+                self.page = candidate
+                break
+        if self.page is None:
+            self.page = await self.context.new_page()
+            logger.info("常驻浏览器中没有已打开的 WebUI 标签页，已新建标签页。")
+            return False
+
+        await self.page.bring_to_front()
+        logger.info(f"已连接常驻浏览器 {self.cdp_url}，复用 WebUI 标签页: {self.page.url}")
+        prepared = await self.page.evaluate("() => window.__autoQueuePrepared || ''")
+        return prepared == self.setup_marker
+
+    async def start(self) -> None:
+        logger.info("开始运行 Playwright 自动化任务。")
+        if self.playwright is None:
+            self._playwright_manager = async_playwright()
+            self.playwright = await self._playwright_manager.start()
+
+        already_prepared = False
+        if self.cdp_url:
+            already_prepared = await self._attach_over_cdp()
+        else:
+            with TRACER.span("启动浏览器", "action", profile=self.profile.name):
+                self.browser = await self.playwright.chromium.launch(
+                    headless=self.profile.headless,
+                    args=self.profile.launch_args
+                )
+                self.context = await self.browser.new_context(**self.profile.context_options())
+                await self.profile.apply_to_context(self.context)
+                self.page = await self.context.new_page()
+        page = self.page
+        waiter = self.waiter = StepWaiter(page, min_delay=self.min_step_delay)
+        self.ui = UiMap(page, timeout_ms=waiter.timeout_ms)
+
+        if already_prepared:
+            logger.info("WebUI 标签页已完成准备（参考图片与脚本均已设置），直接开始入队。")
+            return
+
+        if not page.url.startswith(self.webui_url):
+            load_start = time.perf_counter()
+            with TRACER.span("goto WebUI", "action", profile=self.profile.name):
+                await page.goto(f"{self.webui_url}/?__theme=dark")
+            await waiter.until_network_idle("页面加载")
+            self.page_load_seconds = time.perf_counter() - load_start
+            logger.info(f"[{self.profile.name}] WebUI 页面加载耗时 {self.page_load_seconds:.2f} 秒。")
+
+        # 启动检查：文生图页面的必需控件缺失时立即报错，而不是在某一步等到超时
+        await self.ui.verify()
+        await self._prepare_txt2img()
+
+    async def _prepare_txt2img(self) -> None:
+        """按当前参考图片准备文生图页面：应用生成参数、清空提示词、随机种子、选择脚本。"""
+        page = self.page
+        waiter = self.waiter
+        prompt_textbox = await self.ui.get("prompt")
+        if self.reference_parameters:
+            await self._paste_reference_parameters(prompt_textbox)
+        else:
+            await self._import_reference_image()
+
+        # --- 提示词清空操作（只执行一次） ---
+        await waiter.until_enabled(prompt_textbox, "提示词输入框")
+        with TRACER.span("清空提示词", "action"):
+            await prompt_textbox.click()
+            await prompt_textbox.fill("")
+        await waiter.until_value(prompt_textbox, "", "提示词清空")
+
+        # --- 骰子按钮（只执行一次） ---
+        dice_button = await self.ui.get("random_seed")
+        await waiter.until_enabled(dice_button, "骰子按钮")
+        with TRACER.span("click 骰子按钮", "action"):
+            await dice_button.click()
+
+        # 点击“脚本”输入框并选择 “Prompts from file or textbox”
+        script_textbox = await self.ui.get("script_dropdown")
+        await waiter.until_enabled(script_textbox, "脚本下拉框")
+        with TRACER.span("click 脚本下拉框", "action"):
+            await script_textbox.click()
+
+        script_option = await self.ui.get("script_prompts_from_file")
+        await waiter.until_enabled(script_option, "Prompts from file or textbox 选项")
+        with TRACER.span("click Prompts from file or textbox", "action"):
+            await script_option.click()
+
+        # 记录准备完成，下次通过常驻浏览器复用该标签页时可跳过以上步骤
+        await page.evaluate("(marker) => { window.__autoQueuePrepared = marker; }", self.setup_marker)
+
+    async def switch_reference(self, image_path: Path, reference_parameters: Optional[str] = None) -> None:
+        """在同一页面上切换参考图片：重新应用生成参数并设置脚本，不重启浏览器、不重新加载页面。"""
+        self.image_path = image_path
+        self.reference_parameters = reference_parameters
+        self.ui.invalidate() # 上一张参考图片的导入与粘贴可能使控件被重新渲染
+        with TRACER.span("切换参考图片", "stage", image=image_path.name):
+            await self._prepare_txt2img()
+        logger.info(f"已切换参考图片: {image_path.name}")
+
+    async def _import_reference_image(self) -> None:
+        """经“图片信息”页上传参考图片，再发送到文生图，由 WebUI 解析其中的生成参数。"""
+        waiter = self.waiter
+        png_info_button = await self.ui.get("png_info_tab")
+        await waiter.until_enabled(png_info_button, "图片信息按钮")
+        with TRACER.span("click 图片信息", "action"):
+            await png_info_button.click()
+
+        file_input_locator = await self.ui.get("png_info_file_input")
+        await waiter.until_attached(file_input_locator, "图片上传控件")
+        with TRACER.span("上传参考图片", "action", bytes=self.image_path.stat().st_size):
+            await file_input_locator.set_input_files(str(self.image_path))
+
+        send_to_txt2img_button = await self.ui.get("send_to_txt2img")
+        await waiter.until_enabled(send_to_txt2img_button, ">> 文生图按钮")
+        with TRACER.span("click >> 文生图", "action"):
+            await send_to_txt2img_button.click()
+
+    async def _paste_reference_parameters(self, prompt_textbox) -> None:
+        """将本地读出的生成参数填入文生图提示词框，点击 ↙️ 按钮由 WebUI 将其应用到各个设置项。"""
+        waiter = self.waiter
+        await waiter.until_enabled(prompt_textbox, "提示词输入框")
+        with TRACER.span("填入生成参数", "action", bytes=len(self.reference_parameters.encode("utf-8"))):
+            await prompt_textbox.fill(self.reference_parameters)
+
+        paste_button = await self.ui.get("paste_parameters")
+        await waiter.until_enabled(paste_button, "读取生成参数按钮")
+        with TRACER.span("click 读取生成参数", "action"):
+            await paste_button.click()
+        await waiter.until_network_idle("应用生成参数")
+        logger.info("已将参考图片的生成参数直接应用到文生图页面（跳过图片上传）。")
+
+    async def enqueue_chunk(self, index: int, content: str) -> bool:
+        waiter = self.waiter
+        prompt_list_textbox = await self.ui.get("prompt_list")
+        enqueue_button = await self.ui.get("enqueue")
+
+        # 提示词输入列表的操作：填充新内容并确认内容已写入（快速模式在填充时已读回校验）
+        await waiter.until_enabled(prompt_list_textbox, "提示词输入列表")
+        fill_start = time.perf_counter()
+        with TRACER.chunk_span("填充提示词输入列表", index, content, "action") as span_attrs:
+            used_mode, _ = await fill_textarea(prompt_list_textbox, content, self.fill_mode)
+            span_attrs["mode"] = used_mode
+        if used_mode != FILL_MODE_FAST:
+            await waiter.until_value(prompt_list_textbox, content, "提示词输入列表填充")
+        fill_seconds = time.perf_counter() - fill_start
+
+        # 点击 Enqueue 并等待加入队列的确认
+        await waiter.until_enabled(enqueue_button, "Enqueue 按钮")
+        acknowledged, ack_seconds = await waiter.click_and_wait_ack(enqueue_button, "Enqueue 确认")
+        if not acknowledged:
+            # 点击可能已生效：记为未确认，不改派给其他后端，也不写入检查点、去重索引与入队记录
+            logger.error(f"第 {index + 1} 个分块点击 Enqueue 后未收到确认，按入队失败处理。")
+            self.chunk_failures[index] = FAILURE_UNCONFIRMED
+            return False
+        self.chunk_timings[index] = {"fill": fill_seconds, "ack": ack_seconds}
+        return True
+
+    async def close(self) -> None:
+        if self.waiter is not None:
+            # 关闭前等待最后的请求发送完成
+            await self.waiter.until_network_idle("关闭浏览器前")
+            logger.info(f"本次自动化各步骤累计等待 {self.waiter.total_waited:.2f} 秒。")
+            self.waiter.log_step_summary(f"（{self.profile.name} 配置）")
+        if self.cdp_url:
+            # 常驻浏览器：只断开连接，保留浏览器和已准备好的 WebUI 标签页供下次复用
+            if self.browser is not None:
+                await self.browser.close()
+            logger.info(f"已断开与常驻浏览器 {self.cdp_url} 的连接（浏览器保持运行）。")
+        else:
+            if self.context is not None:
+                await self.context.close()
+            if self.browser is not None:
+                await self.browser.close()
+        if self._playwright_manager is not None:
+            await self._playwright_manager.__aexit__(None, None, None)
+            self._playwright_manager = None
+            self.playwright = None
+        logger.info("Playwright 自动化任务完成。")
+
+
+def _connect_errors() -> Tuple[type, ...]:
+    """请求发出之前的连接错误（含连接超时，aiohttp 3.10 起单独区分）。"""
+    connect_timeout = getattr(aiohttp, "ConnectionTimeoutError", None)
+    return (aiohttp.ClientConnectorError,) + ((connect_timeout,) if connect_timeout is not None else ())
+
+
+class HttpApiEnqueueBackend(EnqueueBackend):
+    """
+    绕过浏览器，直接通过 WebUI 的 HTTP 接口提交分块。
+    使用保持连接的 aiohttp 连接池，最多 max_in_flight 个请求同时在途，失败时按指数退避重试：
+    连接失败、HTTP 5xx 与 429 总是重试；读取超时等请求已发出后的失败只对 RETRY_AFTER_SEND_ENDPOINTS 重试；其余 4xx 不重试。
+    """
+    name = "api"
+
+    def __init__(
+        self,
+        webui_url: str = DEFAULT_WEBUI_URL,
+        endpoint: str = "queue",
+        base_payload: Optional[Dict[str, Any]] = None,
+        max_in_flight: int = 4,
+        max_retries: int = 3,
+        retry_backoff_seconds: float = 1.0,
+        request_timeout_seconds: float = 600.0,
+        prompt_position: str = "start"
+    ):
+        """
+        Args:
+            webui_url (str): WebUI 地址。
+            endpoint (str): 使用的接口，"queue"（队列扩展）或 "txt2img"（原生接口）。
+            base_payload (Optional[Dict[str, Any]]): 文生图的基础参数（采样器、步数、尺寸等），每个分块都会复制一份。
+            max_in_flight (int): 同时在途的请求数上限。
+            max_retries (int): 单个分块的最大重试次数。
+            retry_backoff_seconds (float): 首次重试前的等待时间，之后每次翻倍。
+            request_timeout_seconds (float): 单个请求的超时时间（秒）。txt2img 接口会等待出图，需要足够长。
+            prompt_position (str): 脚本参数 “Insert prompts at the” 的取值（"start" 或 "end"）。
+        """
+        super().__init__()
+        if endpoint not in API_ENDPOINTS:
+            raise ValueError(f"未知的 API 接口 '{endpoint}'，可选值: {', '.join(API_ENDPOINTS)}")
+        self.webui_url = webui_url.rstrip("/")
+        self.endpoint = endpoint
+        self.base_payload = dict(base_payload or {})
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max(0, max_retries)
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.request_timeout_seconds = request_timeout_seconds
+        self.prompt_position = prompt_position
+        self.session = None
+
+    @property
+    def request_url(self) -> str:
+        return f"{self.webui_url}{API_ENDPOINTS[self.endpoint]}"
+
+    def build_payload(self, content: str) -> Dict[str, Any]:
+        """
+        构造单个分块的请求体：基础参数 + “Prompts from file or textbox” 脚本参数。
+        脚本参数顺序为 (逐行迭代种子, 批次使用同一随机种子, 插入位置, 提示词列表)。
+        """
+        payload = dict(self.base_payload)
+        payload.setdefault("seed", -1) # 与浏览器后端点击骰子按钮一致：随机种子
+        payload["script_name"] = PROMPTS_FROM_FILE_SCRIPT_NAME
+        payload["script_args"] = [False, False, self.prompt_position, content]
+        return payload
+
+    async def switch_reference(self, image_path: Path, reference_parameters: Optional[str] = None) -> None:
+        """API 后端只需替换基础请求参数，连接池继续复用。"""
+        if not reference_parameters:
+            logger.warning(f"参考图片 '{image_path.name}' 没有可用的生成参数，后续分块只使用默认参数。")
+        self.base_payload = dict(reference_payload(reference_parameters) or {})
+        logger.info(f"API 后端已切换参考图片: {image_path.name}")
+
+    async def start(self) -> None:
+        if aiohttp is None:
+            raise RuntimeError("HTTP API 后端需要 aiohttp，请先执行: pip install aiohttp")
+        connector = aiohttp.TCPConnector(limit=self.max_in_flight, keepalive_timeout=60)
+        timeout = aiohttp.ClientTimeout(total=self.request_timeout_seconds)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        logger.info(f"HTTP API 后端已就绪：{self.request_url}（最多 {self.max_in_flight} 个请求同时在途）")
+
+    async def enqueue_chunk(self, index: int, content: str) -> bool:
+        payload = self.build_payload(content)
+        for attempt in range(self.max_retries + 1):
+            try:
+                request_start = time.perf_counter()
+                async with self.session.post(self.request_url, json=payload) as response:
+                    if response.status < 400:
+                        await response.read()
+                        self.chunk_timings[index] = {"ack": time.perf_counter() - request_start}
+                        return True
+                    body = (await response.text())[:500]
+                    # 4xx（429 除外）属于请求本身的问题，重试没有意义
+                    if response.status < 500 and response.status != 429:
+                        logger.error(f"第 {index + 1} 个分块被 WebUI 拒绝 (HTTP {response.status}): {body}")
+                        self.chunk_failures[index] = FAILURE_REJECTED
+                        return False
+                    logger.warning(f"第 {index + 1} 个分块请求失败 (HTTP {response.status}): {body}")
+            except _connect_errors() as e:
+                # 连接未建立，请求没有发出，重试是安全的
+                logger.warning(f"第 {index + 1} 个分块无法连接 WebUI: {e!r}")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if self.endpoint not in RETRY_AFTER_SEND_ENDPOINTS:
+                    logger.error(
+                        f"第 {index + 1} 个分块请求已发出但未得到响应: {e!r}。{self.endpoint} 接口不可重复提交"
+                        f"（服务器可能仍在出图），不再重试。"
+                    )
+                    self.chunk_failures[index] = FAILURE_UNCONFIRMED
+                    return False
+                logger.warning(f"第 {index + 1} 个分块请求异常: {e!r}")
+
+            if attempt < self.max_retries:
+                delay = self.retry_backoff_seconds * (2 ** attempt)
+                logger.info(f"第 {index + 1} 个分块将在 {delay:.1f} 秒后重试 ({attempt + 1}/{self.max_retries})。")
+                await asyncio.sleep(delay)
+
+        logger.error(f"第 {index + 1} 个分块在 {self.max_retries} 次重试后仍然失败。")
+        return False
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        logger.info("HTTP API 后端已关闭。")
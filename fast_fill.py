@@ -0,0 +1,72 @@
+# filename: fast_fill.py
+# 文本框快速填充：一次页面内 evaluate 设置值，只派发一次 input 事件，并读回校验；失败时退回常规填充
+import time
+from typing import Tuple
+from loguru import logger
+from playwright.async_api import Locator
+
+# 可选的填充模式
+FILL_MODE_FAST = "fast"
+FILL_MODE_STANDARD = "standard"
+FILL_MODES = (FILL_MODE_FAST, FILL_MODE_STANDARD)
+
+# 页面内执行的填充脚本：通过原型上的 value setter 赋值（绕过框架对实例属性的包装），
+# 然后只派发一次冒泡的 input 事件，让 Gradio/Svelte 的绑定同步一次，最后返回实际的值用于校验
+FAST_FILL_SCRIPT = """
+(element, value) => {
+    const prototype = element instanceof HTMLTextAreaElement ? HTMLTextAreaElement.prototype : HTMLInputElement.prototype;
+    const setter = Object.getOwnPropertyDescriptor(prototype, 'value').set;
+    setter.call(element, value);
+    element.dispatchEvent(new Event('input', { bubbles: true }));
+    return element.value;
+}
+"""
+
+
+def _normalize_newlines(text: str) -> str:
+    """textarea 的值会把 \\r\\n 统一为 \\n，校验前做同样处理。"""
+    return text.replace('\r\n', '\n')
+
+
+async def fill_textarea_fast(locator: Locator, content: str) -> bool:
+    """
+    一次 evaluate 完成赋值 + 单次 input 事件 + 读回，返回读回的值是否与内容一致。
+
+    Args:
+        locator (Locator): 文本框定位器。
+        content (str): 要填充的内容。
+    """
+    actual_value = await locator.evaluate(FAST_FILL_SCRIPT, content)
+    return _normalize_newlines(actual_value) == _normalize_newlines(content)
+
+
+async def fill_textarea_standard(locator: Locator, content: str) -> None:
+    """常规填充路径：点击、全选、清空后再填充（原有做法）。"""
+    await locator.click()
+    await locator.press("ControlOrMeta+a")
+    await locator.fill("")
+    await locator.fill(content)
+
+
+async def fill_textarea(locator: Locator, content: str, mode: str = FILL_MODE_FAST) -> Tuple[str, float]:
+    """
+    按指定模式填充文本框。快速模式校验失败或出错时，自动退回常规填充。
+
+    Args:
+        locator (Locator): 文本框定位器。
+        content (str): 要填充的内容。
+        mode (str): "fast" 或 "standard"。
+
+    Returns:
+        Tuple[str, float]: (实际使用的模式, 填充耗时秒数)
+    """
+    start = time.perf_counter()
+    if mode == FILL_MODE_FAST:
+        try:
+            if await fill_textarea_fast(locator, content):
+                return FILL_MODE_FAST, time.perf_counter() - start
+            logger.warning("快速填充后读回的内容与预期不一致，退回常规填充。")
+        except Exception as e:
+            logger.warning(f"快速填充失败，退回常规填充: {e}")
+    await fill_textarea_standard(locator, content)
+    return FILL_MODE_STANDARD, time.perf_counter() - start
@@ -0,0 +1,296 @@
+# filename: job_manifest.py
+# 多图任务清单：一个 JSON 或 TOML 文件列出多个任务，每个任务指定参考图片、提示词来源（提示词文件或模板）与分块设置。
+# 执行时在同一个浏览器会话（或同一个 API 连接池）中完成全部任务：任务按参考图片分组，
+# 每张图片只导入（或粘贴生成参数）并设置脚本一次，同一图片的任务连续入队；每个任务单独汇报进度与结果。
+# 分块序号在整个清单中连续编号（不按任务从 0 重新开始），入队记录与运行报告中的分块可以区分所属任务；
+# 提示词去重按参考图片区分，同一提示词用于不同图片的任务不算重复。
+# 清单示例（TOML）：
+#   [defaults]
+#   lines_per_chunk = 100
+#
+#   [[jobs]]
+#   name = "猫"
+#   image = "refs/cat.png"          # 相对路径以清单文件所在目录为准
+#   prompts = "prompts/cat.txt"     # 每行一个提示词
+#   prefix = "masterpiece, "        # 可选：每行加的前缀
+#
+#   [[jobs]]
+#   image = "refs/dog.png"
+#   template = "templates/dog.txt"  # 或使用模板（见 prompt_templates.py）
+#   template_mode = "random"
+#   template_limit = 500
+# 检查清单与执行计划: python job_manifest.py 清单.toml
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from loguru import logger
+from chunker import DEFAULT_LINES_PER_CHUNK, iter_text_chunks
+from enqueue_backends import EnqueueBackend, ChunkItem
+from pipeline import iterate_in_thread, iter_source_chunks, DEFAULT_PREFETCH_CHUNKS
+from png_parameters import load_reference_parameters
+from prompt_index import PromptIndex, generation_context
+from prompt_templates import load_template_file, iter_expanded_prompts, EXPANSION_MODES, DEFAULT_WILDCARD_DIR
+from trace_spans import TRACER
+
+try:
+    import tomllib # Python 3.11+ 标准库；更早的版本只支持 JSON 清单
+except ImportError:
+    tomllib = None
+
+# 任务可用的字段（defaults 中可设置除 name / image / prompts / template 以外的任意字段）
+JOB_FIELDS = (
+    "name", "image", "prompts", "template", "prefix", "lines_per_chunk",
+    "template_mode", "template_limit", "template_seed", "wildcard_dir",
+)
+PATH_FIELDS = ("image", "prompts", "template", "wildcard_dir")
+
+
+class ManifestError(ValueError):
+    """任务清单格式错误或引用的文件不存在。"""
+
+
+class ManifestJob:
+    """清单中的一个任务：一张参考图片 + 一个提示词来源 + 分块设置。"""
+    def __init__(self, name: str, image: Path, prompts: Optional[Path] = None, template: Optional[Path] = None,
+                 prefix: str = "", lines_per_chunk: int = DEFAULT_LINES_PER_CHUNK, template_mode: str = "all",
+                 template_limit: Optional[int] = None, template_seed: Optional[int] = None,
+                 wildcard_dir: Path = DEFAULT_WILDCARD_DIR):
+        """
+        Args:
+            name (str): 任务名称（日志与进度中显示）。
+            image (Path): 参考图片路径。
+            prompts (Optional[Path]): 提示词文件，每行一个提示词。与 template 二选一。
+            template (Optional[Path]): 提示词模板文件。
+            prefix (str): 每行提示词前加的前缀（仅用于提示词文件）。
+            lines_per_chunk (int): 每个分块的行数。
+            template_mode (str): 模板展开模式，"all" 或 "random"。
+            template_limit (Optional[int]): 模板最多生成的行数。
+            template_seed (Optional[int]): random 模式的随机种子。
+            wildcard_dir (Path): 模板通配符文件目录。
+        """
+        self.name = name
+        self.image = image
+        self.prompts = prompts
+        self.template = template
+        self.prefix = prefix
+        self.lines_per_chunk = lines_per_chunk
+        self.template_mode = template_mode
+        self.template_limit = template_limit
+        self.template_seed = template_seed
+        self.wildcard_dir = wildcard_dir
+
+    @property
+    def source(self) -> Path:
+        """提示词来源文件。"""
+        return self.prompts if self.prompts is not None else self.template
+
+    def iter_chunks(self, audit_dir: Optional[Path] = None,
+                    line_filter: Optional[Callable[[Iterable[str]], Iterator[str]]] = None,
+                    start_index: int = 0) -> Iterator[ChunkItem]:
+        """流式产出本任务的分块（分块序号从 start_index 开始）。"""
+        if self.prompts is not None:
+            yield from iter_source_chunks(
+                self.prefix, self.prompts, self.lines_per_chunk, audit_dir=audit_dir, line_filter=line_filter, start_index=start_index
+            )
+            return
+        template = load_template_file(self.template, self.wildcard_dir)
+        logger.info(f"任务 '{self.name}' 的模板共 {template.count:,} 种组合。")
+        lines = iter_expanded_prompts(template, self.template_mode, self.template_limit, self.template_seed)
+        if line_filter is not None:
+            lines = line_filter(lines)
+        yield from iter_text_chunks(
+            lines, self.lines_per_chunk, audit_dir, source=f"{self.name}: {self.template}", start_index=start_index
+        )
+
+
+def _read_manifest_file(manifest_path: Path) -> Dict[str, Any]:
+    """按扩展名读取 JSON 或 TOML 清单。"""
+    suffix = manifest_path.suffix.lower()
+    if suffix not in (".json", ".toml"):
+        raise ManifestError(f"不支持的任务清单格式 '{suffix}'，请使用 .json 或 .toml。")
+    if suffix == ".toml" and tomllib is None:
+        raise ManifestError("读取 TOML 清单需要 Python 3.11 及以上版本，请改用 JSON 清单。")
+    try:
+        if suffix == ".toml":
+            with open(str(manifest_path), "rb") as f:
+                return tomllib.load(f)
+        with open(str(manifest_path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except OSError as e:
+        raise ManifestError(f"无法读取任务清单 '{manifest_path}': {e}") from e
+    except ValueError as e: # json.JSONDecodeError 与 tomllib.TOMLDecodeError 均为 ValueError
+        raise ManifestError(f"任务清单 '{manifest_path}' 格式错误: {e}") from e
+
+
+def _build_job(number: int, entry: Dict[str, Any], defaults: Dict[str, Any], base_dir: Path) -> ManifestJob:
+    """合并默认值并校验单个任务条目。"""
+    if not isinstance(entry, dict):
+        raise ManifestError(f"第 {number} 个任务不是表/对象。")
+    fields = {**defaults, **entry}
+    unknown = sorted(set(fields) - set(JOB_FIELDS))
+    if unknown:
+        raise ManifestError(f"第 {number} 个任务包含未知字段: {', '.join(unknown)}")
+    if "image" not in fields:
+        raise ManifestError(f"第 {number} 个任务缺少 image（参考图片）。")
+    if ("prompts" in fields) == ("template" in fields):
+        raise ManifestError(f"第 {number} 个任务必须且只能指定 prompts 或 template 之一。")
+    for key in PATH_FIELDS:
+        if key in fields:
+            path = Path(fields[key]).expanduser()
+            fields[key] = path if path.is_absolute() else base_dir / path
+    for key in ("image", "prompts", "template"):
+        if key in fields and not fields[key].exists():
+            raise ManifestError(f"第 {number} 个任务的 {key} 文件不存在: {fields[key]}")
+    if fields.get("template_mode", "all") not in EXPANSION_MODES:
+        raise ManifestError(f"第 {number} 个任务的 template_mode 无效，可选值: {', '.join(EXPANSION_MODES)}")
+    lines_per_chunk = fields.get("lines_per_chunk", DEFAULT_LINES_PER_CHUNK)
+    if not isinstance(lines_per_chunk, int) or lines_per_chunk < 1:
+        raise ManifestError(f"第 {number} 个任务的 lines_per_chunk 必须是大于 0 的整数。")
+    fields.setdefault("name", f"{number}:{Path(fields.get('prompts') or fields['template']).name}")
+    return ManifestJob(**fields)
+
+
+def load_manifest(manifest_path: Path) -> List[ManifestJob]:
+    """
+    读取并校验任务清单（.json 或 .toml），返回清单顺序的任务列表。
+
+    Raises:
+        ManifestError: 格式错误、字段无效或引用的文件不存在。
+    """
+    data = _read_manifest_file(manifest_path)
+    jobs = data.get("jobs") if isinstance(data, dict) else None
+    if not isinstance(jobs, list) or not jobs:
+        raise ManifestError(f"任务清单 '{manifest_path}' 中没有 jobs 列表。")
+    defaults = data.get("defaults", {})
+    if not isinstance(defaults, dict) or {"name", "image", "prompts", "template"} & set(defaults):
+        raise ManifestError("defaults 必须是表/对象，且不能包含 name / image / prompts / template。")
+    base_dir = manifest_path.resolve().parent
+    return [_build_job(number, entry, defaults, base_dir) for number, entry in enumerate(jobs, start=1)]
+
+
+def group_jobs_by_image(jobs: List[ManifestJob]) -> List[Tuple[Path, List[ManifestJob]]]:
+    """
+    按参考图片分组：同一图片的任务连续执行，每张图片只切换一次。
+    组按图片在清单中首次出现的顺序排列，组内保持清单顺序。
+    """
+    groups: Dict[Path, List[ManifestJob]] = {}
+    for job in jobs:
+        groups.setdefault(job.image.resolve(), []).append(job)
+    return list(groups.items())
+
+
+def _track_next_index(chunks: Iterable[ChunkItem], state: Dict[str, int]) -> Iterator[ChunkItem]:
+    """原样产出分块，并在 state["next_index"] 中记录下一个可用的分块序号（任务中途出错时也准确）。"""
+    for index, content in chunks:
+        state["next_index"] = index + 1
+        yield index, content
+
+
+async def run_manifest(
+    jobs: List[ManifestJob],
+    backend: EnqueueBackend,
+    load_parameters: bool = True,
+    audit_dir: Optional[Path] = None,
+    prompt_index: Optional[PromptIndex] = None,
+    max_prefetch: int = DEFAULT_PREFETCH_CHUNKS
+) -> List[Dict[str, Any]]:
+    """
+    在同一个后端会话中执行全部任务。后端应以第一组的参考图片创建（启动时完成该图片的准备）。
+
+    Args:
+        jobs (List[ManifestJob]): load_manifest 的结果。
+        backend (EnqueueBackend): 尚未启动的入队后端。
+        load_parameters (bool): 切换图片时是否在本地读取生成参数（API 后端或 --image-setup paste）。
+        audit_dir (Optional[Path]): 如指定，同时将每个分块存入该目录下的分块缓存。
+        prompt_index (Optional[PromptIndex]): 提示词去重索引，每组任务开始前切换到该组参考图片的生成上下文。
+        max_prefetch (int): 读取线程最多领先的分块数。
+
+    Returns:
+        List[Dict[str, Any]]: 每个任务的结果（name / image / first_chunk / chunks_success / chunks_failed / seconds / error），
+            按执行顺序。first_chunk 为该任务第一个分块的全局序号。
+    """
+    groups = group_jobs_by_image(jobs)
+    logger.info(f"任务清单共 {len(jobs)} 个任务，{len(groups)} 张参考图片。")
+    results: List[Dict[str, Any]] = []
+    job_number = 0
+    chunk_state = {"next_index": 0} # 全局分块序号：下一个任务从这里继续编号
+    async with backend:
+        for group_number, (image_path, group_jobs) in enumerate(groups):
+            switch_error = None
+            if group_number > 0:
+                try:
+                    parameters = load_reference_parameters(image_path) if load_parameters else None
+                    await backend.switch_reference(image_path, parameters)
+                except Exception as e:
+                    switch_error = f"切换参考图片失败: {e}"
+                    logger.error(f"[图片 {group_number + 1}/{len(groups)}] {image_path.name}: {switch_error}，跳过该图片的任务。")
+            logger.info(f"[图片 {group_number + 1}/{len(groups)}] {image_path.name}：{len(group_jobs)} 个任务。")
+            line_filter = None
+            if prompt_index is not None and not switch_error:
+                # 上一组的分块均已确认入队（记录已按上一组的上下文计算），此时切换不会混用去重键
+                prompt_index.switch_context(generation_context(image_path))
+                line_filter = prompt_index.filter_lines
+
+            for job in group_jobs:
+                job_number += 1
+                result = {"name": job.name, "image": image_path.name, "first_chunk": chunk_state["next_index"],
+                          "chunks_success": 0, "chunks_failed": 0, "seconds": 0.0, "error": switch_error}
+                results.append(result)
+                if switch_error:
+                    continue
+                logger.info(f"[任务 {job_number}/{len(jobs)}] 开始 '{job.name}'（来源 {job.source.name}，每块 {job.lines_per_chunk} 行）。")
+                start = time.perf_counter()
+                chunks = _track_next_index(job.iter_chunks(audit_dir, line_filter, chunk_state["next_index"]), chunk_state)
+                chunk_stream = iterate_in_thread(TRACER.iterate(chunks, "读取并生成分块"), max_prefetch)
+                try:
+                    with TRACER.span("执行任务", "stage", job=job.name, image=image_path.name):
+                        result["chunks_success"], result["chunks_failed"] = await backend.enqueue_chunks(chunk_stream)
+                except Exception as e:
+                    result["error"] = str(e)
+                    logger.error(f"[任务 {job_number}/{len(jobs)}] '{job.name}' 执行出错: {e}")
+                finally:
+                    await chunk_stream.aclose()
+                result["seconds"] = time.perf_counter() - start
+                logger.info(
+                    f"[任务 {job_number}/{len(jobs)}] 完成 '{job.name}'（分块 {result['first_chunk'] + 1}~{chunk_state['next_index']}）："
+                    f"成功 {result['chunks_success']} 个分块，失败 {result['chunks_failed']} 个分块，耗时 {result['seconds']:.1f} 秒。"
+                )
+    log_manifest_summary(results)
+    return results
+
+
+def log_manifest_summary(results: List[Dict[str, Any]]) -> None:
+    """输出每个任务的结果汇总。"""
+    logger.info("--- 任务清单执行结果 ---")
+    for result in results:
+        status = f"出错（{result['error']}）" if result["error"] else "完成"
+        logger.info(
+            f"{result['name']} [{result['image']}]：{status}，成功 {result['chunks_success']} 个分块，"
+            f"失败 {result['chunks_failed']} 个分块，{result['seconds']:.1f} 秒"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="校验任务清单并输出按参考图片分组后的执行计划。")
+    parser.add_argument("manifest", type=Path, help="任务清单文件（.json 或 .toml）。")
+    args = parser.parse_args()
+
+    try:
+        jobs = load_manifest(args.manifest)
+    except ManifestError as e:
+        logger.error(str(e))
+        sys.exit(1)
+    groups = group_jobs_by_image(jobs)
+    logger.info(f"清单有效：{len(jobs)} 个任务，{len(groups)} 张参考图片（执行时切换图片 {len(groups)} 次）。")
+    for group_number, (image_path, group_jobs) in enumerate(groups, start=1):
+        logger.info(f"图片 {group_number}: {image_path}")
+        for job in group_jobs:
+            kind = "提示词文件" if job.prompts is not None else f"模板（{job.template_mode}）"
+            logger.info(f"    {job.name}: {kind} {job.source}，每块 {job.lines_per_chunk} 行")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,66 @@
 # filename: main.py
 import os
+import sys
+import argparse
 import datetime
 from loguru import logger
 import asyncio # 导入 asyncio
-from playwright.async_api import Playwright, async_playwright, expect # 更改: 从 sync_api 变为 async_api
 from pathlib import Path
-from my_tools import setup_logger, open_output_files_automatically, open_completed_logs
+from typing import Optional
+from my_tools import (
+    setup_logger, open_output_files_automatically, open_completed_logs, enable_batch_mode,
+    RunStatusManager, LIVE_STATUS, LOG_PROFILES
+)
+from webui_waits import DEFAULT_MIN_DELAY_SECONDS
+from fast_fill import FILL_MODES, FILL_MODE_FAST
+from browser_profiles import BROWSER_PROFILES
+from prompt_index import PromptIndex, DEDUP_MODES, generation_context
+from trace_spans import TRACER
+from output_harvester import OutputHarvester, default_harvest_paths, DEFAULT_POLL_INTERVAL_SECONDS
+from run_report import write_harvest_report, default_report_path
+from job_manifest import load_manifest, group_jobs_by_image, run_manifest, ManifestError
+from prompt_templates import load_template_file, iter_expanded_prompts, TemplateError, EXPANSION_MODES, DEFAULT_WILDCARD_DIR
+from png_parameters import load_reference_parameters, reference_payload
+from pipeline import run_fused_pipeline, run_chunk_stream, DEFAULT_PREFETCH_CHUNKS
+from multi_backend import MultiBackendScheduler
+from checkpoint_journal import CheckpointJournal
+from backpressure import QueueBackpressure, make_queue_depth_reader, DEFAULT_LOW_WATERMARK, DEFAULT_HIGH_WATERMARK
+from prefix_adder import prepare_files, get_prefix
+from adaptive_chunking import AdaptiveChunkSizer, DEFAULT_MIN_CHUNK_LINES, DEFAULT_MAX_CHUNK_LINES
+from chunker import DEFAULT_LINES_PER_CHUNK, ChunkSize, iter_line_chunks, iter_text_chunks, iter_file_chunks
+from chunk_cache import ChunkCache, DEFAULT_CHUNK_CACHE_DIR, DEFAULT_MAX_CACHE_MB
+from enqueue_backends import (
+    EnqueueBackend, PlaywrightEnqueueBackend, HttpApiEnqueueBackend, DEFAULT_WEBUI_URL, API_ENDPOINTS
+)
+
+# 退出码（--batch 模式下供 cron / 任务调度器判断结果；2 为 argparse 的参数错误）
+EXIT_SUCCESS = 0          # 全部完成，或没有需要处理的内容
+EXIT_FAILURE = 1          # 未处理的异常等运行错误
+EXIT_INPUT_ERROR = 3      # 输入文件缺失或无法读取
+EXIT_PARTIAL_FAILURE = 4  # 部分分块入队失败
+
+def exit_code_for(failed_chunks: int) -> int:
+    """根据失败分块数返回退出码。"""
+    return EXIT_PARTIAL_FAILURE if failed_chunks > 0 else EXIT_SUCCESS
 
 # --- 文件拆分功能 ---
-def split_txt_file_by_lines(file_path: Path) -> list[Path]:
+def prepare_input_file(file_path: Path, interactive: bool = True) -> bool:
     """
-    将指定的TXT文件按行数进行拆分。
-    拆分后的文件将锁定在Python运行文件的同一个目录里面。
-    默认按照每份100行进行拆分，并等待用户确认后继续。
+    检查输入文件（不存在则创建空文件），自动打开供用户检查，并等待用户确认。
 
     Args:
-        file_path (Path): 要拆分的TXT文件路径。
+        file_path (Path): 输入的TXT文件路径。
+        interactive (bool): False 时不打开文件、不等待确认（无人值守运行与基准测试），文件不存在时直接返回 False。
 
     Returns:
-        list[Path]: 成功生成的拆分文件路径列表。
+        bool: 文件已就绪返回 True，创建失败（或非交互模式下文件不存在）返回 False。
     """
-    script_dir = Path(__file__).resolve().parent # 获取当前脚本的目录
     logger.info(f"开始处理文件拆分任务：'{file_path}'")
+    if not interactive and not file_path.exists():
+        logger.error(f"输入文件 '{file_path}' 不存在。")
+        return False
 
-    # 1. 检查文件是否存在，不存在则创建
+    # 检查文件是否存在，不存在则创建
     if not file_path.exists(): # 检查文件是否存在，使用 Path.exists()
         logger.info(f"文件 '{file_path}' 不存在，已创建空文件作为初始化。")
         try:
@@ -32,260 +69,488 @@ def split_txt_file_by_lines(file_path: Path) -> list[Path]:
             logger.success(f"成功创建空文件 '{file_path}'。")
         except IOError as e:
             logger.error(f"创建文件 '{file_path}' 失败: {e}")
-            return []
+            return False
 
-    # 2. 读取文件并统计总行数 (第一次读取)
-    total_lines = 0
-    try:
-        with open(str(file_path), 'r', encoding='utf-8') as f: # 将 Path 对象转换为字符串以便 open() 函数使用
-            for _ in f:
-                total_lines += 1
-        logger.info(f"文件 '{file_path}' 总行数：{total_lines} (初次读取)")
-    except Exception as e:
-        logger.error(f"读取文件 '{file_path}' 统计行数失败: {e}")
-        return []
+    if not interactive:
+        return True
 
     # 自动打开文件供用户检查，并等待用户确认（即使文件为空，也先打开让用户填写）
     logger.info(f"即将自动打开文件 '{file_path}' 供您检查。")
     # 使用 my_tools 中的函数打开文件
     open_output_files_automatically([file_path], logger)
     input("请检查文件内容，填写完成后，保存文件并按 Enter 键继续文件处理...") # 等待用户输入
+    return True
+
+def split_txt_file_by_lines(
+    file_path: Path,
+    lines_per_output_file: int = DEFAULT_LINES_PER_CHUNK,
+    interactive: bool = True,
+    cache_dir: Optional[Path] = None
+) -> list[Path]:
+    """
+    将指定的TXT文件按行数进行拆分，拆分结果存入脚本目录下的分块缓存（cache/chunks，按内容哈希去重）。
+    用户确认后只读取一遍输入文件（不再预先统计行数）；与之前运行内容相同的分块不再重复写入。
 
-    # 在用户确认后，重新读取文件以获取最新的行数
-    new_total_lines = 0
-    try:
-        with open(str(file_path), 'r', encoding='utf-8') as f:
-            for _ in f:
-                new_total_lines += 1
-        logger.info(f"文件 '{file_path}' 总行数：{new_total_lines} (用户填写后重新读取)")
-    except Exception as e:
-        logger.error(f"重新读取文件 '{file_path}' 统计行数失败: {e}")
-        return []
+    Args:
+        file_path (Path): 要拆分的TXT文件路径。
+        lines_per_output_file (int): 每份的行数，默认 100。
+        interactive (bool): False 时跳过打开文件与等待确认。
+        cache_dir (Optional[Path]): 分块缓存目录，默认为脚本目录下的 cache/chunks。
 
-    # 3. 处理空文件情况 (重新读取后再次判断)
-    if new_total_lines == 0:
-        logger.info(f"文件 '{file_path}' 仍为空。由于没有内容可供拆分，Playwright 自动化将跳过运行。")
+    Returns:
+        list[Path]: 按顺序排列的分块文件路径列表（内容相同的分块指向同一个文件）。
+    """
+    if not prepare_input_file(file_path, interactive):
         return []
 
-    # 4. 默认按照一次输入一百行进行拆分
-    lines_per_output_file = 100
-    num_parts = (new_total_lines + lines_per_output_file - 1) // lines_per_output_file # 向上取整计算份数
-
-    logger.info(f"文件 '{file_path}' 共有 {new_total_lines} 行。将按每份 {lines_per_output_file} 行进行拆分。")
-    logger.info(f"计划拆分为 {num_parts} 份。")
-    if new_total_lines % lines_per_output_file != 0:
-        logger.info(f"其中，最后一份将包含 {new_total_lines % lines_per_output_file} 行。")
-
-    # 初始化计数器和已生成文件路径列表
+    cache_run = ChunkCache(cache_dir or DEFAULT_CHUNK_CACHE_DIR).start_run(str(file_path))
+    generated_file_paths = []
     processed_lines = 0
-    success_files = 0
     failed_files = 0
-    generated_file_paths = []
 
-    # 5. 读取文件并写入拆分文件
     try:
-        with open(str(file_path), 'r', encoding='utf-8') as infile: # 将 Path 对象转换为字符串以便 open() 函数使用
-            current_part_num = 1
-            current_line_count = 0
-            current_output_file = None
-            current_writer = None
-
-            for line in infile:
-                # 确定当前文件应包含的行数
-                if current_part_num < num_parts:
-                    target_lines_for_this_part = lines_per_output_file
-                else: # 这是最后一部分
-                    target_lines_for_this_part = new_total_lines % lines_per_output_file
-                    if target_lines_for_this_part == 0 and new_total_lines > 0: # 如果 new_total_lines 是 100 的倍数，则最后一部分也是 100 行
-                        target_lines_for_this_part = lines_per_output_file
-
-                # 如果没有输出文件打开，或者当前文件已达到行数限制，则创建新的输出文件
-                if current_output_file is None or current_line_count >= target_lines_for_this_part:
-                    # 关闭之前的文件（如果存在）
-                    if current_writer:
-                        current_writer.close()
-                        logger.success(f"文件 '{current_output_file}' 写入完成。")
-                        success_files += 1
-
-                    # 生成新的文件名并保存到 'cache' 目录
-                    timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-                    cache_dir = script_dir / "cache" # 使用 Path 对象创建目录
-                    cache_dir.mkdir(parents=True, exist_ok=True) # 创建 cache 目录（如果不存在）
-                    output_filename = cache_dir / f"拆分{current_part_num}_{timestamp}.txt" # 使用 Path 对象创建文件名
-                    generated_file_paths.append(output_filename) # 存储生成的文件路径
-                    current_output_file = output_filename
-                    current_line_count = 0 # 重置行计数器
-
-                    try:
-                        current_writer = open(str(output_filename), 'w', encoding='utf-8') # 将 Path 对象转换为字符串以便 open() 函数使用
-                        logger.info(f"开始写入文件：'{output_filename}'")
-                    except IOError as e:
-                        logger.error(f"打开文件 '{output_filename}' 失败: {e}")
-                        failed_files += 1
-                        current_part_num += 1 # 尝试创建下一个文件
-                        continue # 继续主循环，跳过当前行
-
-                # 写入当前行
-                if current_writer:
-                    current_writer.write(line)
-                    current_line_count += 1
-                    processed_lines += 1
-
-                # 如果当前份的行数达到预定值，则关闭当前文件，准备下一个文件
-                if current_line_count == target_lines_for_this_part:
-                    if current_writer:
-                        current_writer.close()
-                        logger.success(f"文件 '{current_output_file}' 写入完成。")
-                        success_files += 1
-                        current_writer = None # 确保在下一轮循环中创建新文件
-                    current_part_num += 1
-
-            # 确保最后一个文件被关闭（处理最后一部分行数不足 100 的情况）
-            if current_writer:
-                current_writer.close()
-                logger.success(f"文件 '{current_output_file}' 写入完成。")
-                success_files += 1
-
+        with open(str(file_path), 'r', encoding='utf-8') as infile:
+            for index, chunk_lines in enumerate(iter_line_chunks(infile, lines_per_output_file)):
+                processed_lines += len(chunk_lines)
+                try:
+                    output_filename = cache_run.add(index, "".join(chunk_lines))
+                    generated_file_paths.append(output_filename)
+                    logger.debug(f"第 {index + 1} 份拆分内容已存入分块缓存：'{output_filename}'")
+                except OSError as e:
+                    logger.error(f"写入第 {index + 1} 份拆分文件失败: {e}")
+                    failed_files += 1
     except Exception as e:
         logger.error(f"文件拆分过程中发生错误: {e}")
         logger.critical(f"【异常警报】文件拆分失败！")
     finally:
-        logger.info(f"--- 文件拆分任务总结 ---")
-        logger.info(f"总行数：{new_total_lines}")
-        logger.info(f"已处理行数：{processed_lines}")
-        logger.info(f"成功拆分文件数：{success_files}")
-        logger.info(f"失败拆分文件数：{failed_files}")
-        logger.info(f"任务完成。")
-        return generated_file_paths
-
-# --- Playwright 自动化功能 ---
-async def run_playwright_automation(playwright: Playwright, input_file_paths: list[Path], image_path: Path) -> None: # 更改: 接受图片路径
+        cache_run.close()
+
+    if processed_lines == 0:
+        logger.info(f"文件 '{file_path}' 为空。由于没有内容可供拆分，入队将跳过运行。")
+
+    logger.info(f"--- 文件拆分任务总结 ---")
+    logger.info(f"已处理行数：{processed_lines}")
+    logger.info(f"成功拆分文件数：{len(generated_file_paths)}（其中 {cache_run.hits} 份已在缓存中，未重复写入）")
+    logger.info(f"失败拆分文件数：{failed_files}")
+    logger.info(f"任务完成。")
+    return generated_file_paths
+
+def create_enqueue_backend(args: argparse.Namespace, image_path: Path) -> EnqueueBackend:
     """
-    运行 Playwright 自动化脚本，将拆分后的文件内容依次填充到网页输入框。
+    根据命令行参数创建入队后端。指定多个 --webui-url 时，返回在这些实例间分发分块的多后端调度器。
 
     Args:
-        playwright (Playwright): Playwright 实例。
-        input_file_paths (list[Path]): 包含要填充到网页的文本文件路径列表。
-        image_path (Path): 导入的图片文件的绝对路径。
+        args (argparse.Namespace): 命令行参数。
+        image_path (Path): 参考图片路径。生成参数在本地读取：API 后端作为基础请求参数，
+            浏览器后端在 --image-setup paste 时直接粘贴到文生图页面。
     """
-    logger.info("开始运行 Playwright 自动化任务。")
-    browser = await playwright.chromium.launch( # 更改: 添加 await
-        headless=False,
-        args=["--start-maximized"]
-    )
-    context = await browser.new_context(no_viewport=True) # 更改: 添加 await
-    page = await context.new_page() # 更改: 添加 await
-
-    await page.goto("http://localhost:7862/?__theme=dark") # 更改: 添加 await
-    await asyncio.sleep(2) # 更改: 使用 asyncio.sleep
-
-    await page.get_by_role("button", name="图片信息").wait_for(state="visible", timeout=10000) # 更改: 添加 await
-    await page.get_by_role("button", name="图片信息").click() # 更改: 添加 await
-    await asyncio.sleep(2) # 更改: 使用 asyncio.sleep
-
-    file_input_locator = page.locator("#pnginfo_image input[type='file']")
-    await file_input_locator.wait_for(state="attached", timeout=10000) # 更改: 添加 await
-    await file_input_locator.set_input_files(str(image_path)) # 更改: 使用传入的绝对路径
-    await asyncio.sleep(2) # 更改: 使用 asyncio.sleep
-
-    await page.get_by_role("button", name=">> 文生图").wait_for(state="visible", timeout=10000) # 更改: 添加 await
-    await page.get_by_role("button", name=">> 文生图").click() # 更改: 添加 await
-    await asyncio.sleep(2) # 更改: 使用 asyncio.sleep
-
-    # --- 提示词清空操作（只执行一次） ---
-    await page.get_by_role("textbox", name="提示词", exact=True).wait_for(state="visible", timeout=10000) # 更改: 添加 await
-    await page.get_by_role("textbox", name="提示词", exact=True).click() # 更改: 添加 await
-    await asyncio.sleep(2) # 更改: 使用 asyncio.sleep
-    await page.get_by_role("textbox", name="提示词", exact=True).press("ControlOrMeta+a") # 更改: 添加 await
-    await asyncio.sleep(2) # 更改: 使用 asyncio.sleep
-    await page.get_by_role("textbox", name="提示词", exact=True).fill("") # 更改: 添加 await
-    await asyncio.sleep(2) # 更改: 使用 asyncio.sleep
-    # --- 提示词清空操作结束 ---
-
-    # --- 骰子按钮（只执行一次） ---
-    await page.get_by_role("button", name="🎲️").wait_for(state="visible", timeout=10000) # 更改: 添加 await
-    await page.get_by_role("button", name="🎲️").click() # 更改: 添加 await
-    await asyncio.sleep(2) # 更改: 使用 asyncio.sleep
-    # --- 骰子按钮操作结束 ---
-
-    # Playwright 自动点击“脚本”输入框
-    await page.get_by_role("textbox", name="脚本").wait_for(state="visible", timeout=10000) # 更改: 添加 await
-    await page.get_by_role("textbox", name="脚本").click() # 更改: 添加 await
-    await asyncio.sleep(2) # 更改: 使用 asyncio.sleep
-
-    await page.get_by_role("button", name="Prompts from file or textbox").wait_for(state="visible", timeout=10000) # 更改: 添加 await
-    await page.get_by_role("button", name="Prompts from file or textbox").click() # 更改: 添加 await
-    await asyncio.sleep(2) # 更改: 使用 asyncio.sleep
-
-    # 循环读取拆分文件内容并填充到“提示词输入列表”
-    for i, file_path_for_input in enumerate(input_file_paths):
-        logger.info(f"正在处理第 {i+1}/{len(input_file_paths)} 个拆分文件：'{file_path_for_input}'")
-        try:
-            with open(str(file_path_for_input), 'r', encoding='utf-8') as f: # 将 Path 对象转换为字符串以便 open() 函数使用
-                content_to_fill = f.read()
-        except Exception as e:
-            logger.error(f"读取拆分文件 '{file_path_for_input}' 失败: {e}")
-            continue # 跳过当前文件，继续下一个
-
-        # 提示词输入列表的操作：清空并填充新内容
-        await page.get_by_role("textbox", name="提示词输入列表").wait_for(state="visible", timeout=10000) # 更改: 添加 await
-        await page.get_by_role("textbox", name="提示词输入列表").click() # 更改: 添加 await
-        await asyncio.sleep(2) # 更改: 使用 asyncio.sleep
-        await page.get_by_role("textbox", name="提示词输入列表").press("ControlOrMeta+a") # 更改: 添加 await
-        await asyncio.sleep(2) # 更改: 使用 asyncio.sleep
-        await page.get_by_role("textbox", name="提示词输入列表").fill("") # 更改: 添加 await
-        await asyncio.sleep(2) # 更改: 使用 asyncio.sleep
-
-        await page.get_by_role("textbox", name="提示词输入列表").fill(content_to_fill) # 更改: 添加 await
-        await asyncio.sleep(2) # 更改: 使用 asyncio.sleep
-
-        await page.get_by_role("button", name="Enqueue").wait_for(state="visible", timeout=10000) # 更改: 添加 await
-        await page.get_by_role("button", name="Enqueue").click() # 更改: 添加 await
-        await asyncio.sleep(2) # 更改: 使用 asyncio.sleep
-
-        # 每次加入队列后，等待一段时间让网页处理任务，然后进行下一个输入
-        logger.info(f"第 {i+1} 个任务已加入队列，等待 5 秒进行下一个任务。")
-        await asyncio.sleep(5) # 更改: 使用 asyncio.sleep
-
-    logger.info("所有拆分文件内容已处理完毕。")
-
-    # --- 添加总等待时间 ---
-    print("等待 10 秒后关闭浏览器...")
-    await asyncio.sleep(10) # 更改: 使用 asyncio.sleep
-
-    await context.close() # 更改: 添加 await
-    await browser.close() # 更改: 添加 await
-    logger.info("Playwright 自动化任务完成。")
+    reference_parameters = None
+    if args.backend == "api" or args.image_setup == "paste":
+        reference_parameters = load_reference_parameters(image_path)
+    base_payload = reference_payload(reference_parameters) if args.backend == "api" else None
+
+    backends = []
+    for webui_url in args.webui_url:
+        if args.backend == "api":
+            backends.append(HttpApiEnqueueBackend(
+                webui_url=webui_url,
+                endpoint=args.api_endpoint,
+                base_payload=base_payload,
+                max_in_flight=args.max_in_flight,
+                max_retries=args.max_retries
+            ))
+        else:
+            backends.append(PlaywrightEnqueueBackend(
+                image_path,
+                webui_url=webui_url,
+                min_step_delay=args.min_step_delay,
+                fill_mode=args.fill_mode,
+                cdp_url=args.cdp_url,
+                profile=BROWSER_PROFILES[args.browser_profile],
+                reference_parameters=reference_parameters
+            ))
+    if args.backpressure:
+        for webui_url, backend in zip(args.webui_url, backends):
+            backend.backpressure = QueueBackpressure(
+                make_queue_depth_reader(webui_url),
+                low_watermark=args.queue_low_watermark,
+                high_watermark=args.queue_high_watermark,
+                label=f" {webui_url}"
+            )
+        logger.info(f"已开启队列背压：积压达到 {args.queue_high_watermark} 个任务时暂停，降到 {args.queue_low_watermark} 个以下恢复。")
+    if len(backends) == 1:
+        backend = backends[0]
+    else:
+        logger.info(f"共 {len(backends)} 个 WebUI 实例，使用多后端调度器分发分块。")
+        backend = MultiBackendScheduler(backends, labels=list(args.webui_url))
+    if args.harvester is not None:
+        # 出图收集：确认入队的每个提示词记入入队记录，用于与输出目录中的图片对照
+        backend.add_chunk_listener(args.harvester.record)
+    return backend
+
+def configure_chunk_size(args: argparse.Namespace, backend: EnqueueBackend) -> tuple[ChunkSize, Optional[AdaptiveChunkSizer]]:
+    """
+    根据命令行参数确定分块行数。
+    开启 --adaptive-chunks 时返回自适应调节器的 next_size，并将调节器注册为后端的分块监听器。
+
+    Returns:
+        tuple[ChunkSize, Optional[AdaptiveChunkSizer]]: (传给分块器的行数或函数, 自适应调节器或 None)
+    """
+    if not args.adaptive_chunks:
+        return args.lines_per_chunk, None
+    sizer = AdaptiveChunkSizer(args.lines_per_chunk, min_size=args.min_chunk_lines, max_size=args.max_chunk_lines)
+    backend.add_chunk_listener(sizer.observe)
+    logger.info(f"已开启自适应分块：初始 {sizer.current_size} 行，范围 {sizer.min_size}~{sizer.max_size} 行。")
+    return sizer.next_size, sizer
+
+def create_prompt_index(args: argparse.Namespace, backend: EnqueueBackend, image_path: Path) -> Optional[PromptIndex]:
+    """
+    根据 --dedup 创建提示词去重索引，并将其注册为后端的分块监听器（确认入队后写入索引）。
+    去重按参考图片（含其中的生成参数）区分：同一提示词配另一张参考图片不算重复。
+    --dedup off 时返回 None。
+    """
+    if args.dedup == "off":
+        return None
+    index = PromptIndex(mode=args.dedup, expire_days=args.dedup_expire_days, context=generation_context(image_path))
+    purged = index.purge_expired()
+    if purged:
+        logger.info(f"提示词去重索引已清理 {purged} 条过期条目。")
+    backend.add_chunk_listener(index.record)
+    logger.info(f"已开启提示词去重（{args.dedup} 模式），索引共 {index.count()} 条。")
+    return index
+
+def close_prompt_index(index: Optional[PromptIndex]) -> None:
+    """输出去重统计并关闭索引。"""
+    if index is not None:
+        index.log_summary()
+        index.close()
+
+async def run_source_pipeline(args: argparse.Namespace, script_dir: Path, image_path: Path) -> int:
+    """
+    融合流水线入口：前缀.txt + 处理文档.txt → 加前缀 → 分块 → 入队。
+    仅在指定 --materialize 时才写出 总行数.txt。
+
+    Args:
+        args (argparse.Namespace): 命令行参数。
+        script_dir (Path): 脚本所在目录，前缀与文档文件默认位于此目录。
+        image_path (Path): 参考图片路径。
+
+    Returns:
+        int: 退出码。
+    """
+    prefix_file = args.prefix_file or script_dir / "前缀.txt"
+    source_file = args.source_file or script_dir / "处理文档.txt"
+    if args.batch:
+        # 无人值守：不创建示例文件、不打开文件、不等待确认
+        missing = [str(path) for path in (prefix_file, source_file) if not path.exists()]
+        if missing:
+            logger.error(f"输入文件不存在: {', '.join(missing)}")
+            return EXIT_INPUT_ERROR
+    else:
+        if not prepare_files(str(prefix_file), str(source_file)):
+            logger.error("文件准备失败，跳过入队。")
+            return EXIT_INPUT_ERROR
+        input("请检查前缀与处理文档，确认后按 Enter 键继续...") # 等待用户输入
+
+    prefix = get_prefix(str(prefix_file))
+    if prefix is None:
+        logger.error("无法获取前缀，跳过入队。")
+        return EXIT_INPUT_ERROR
+
+    materialize_path = script_dir / "总行数.txt" if args.materialize else None
+    audit_dir = script_dir / "cache" / "chunks" if args.write_chunk_files else None
+    backend = create_enqueue_backend(args, image_path)
+    chunk_size, sizer = configure_chunk_size(args, backend)
+    prompt_index = create_prompt_index(args, backend, image_path)
+    try:
+        stats = await run_fused_pipeline(
+            prefix,
+            source_file,
+            backend,
+            lines_per_chunk=chunk_size,
+            materialize_path=materialize_path,
+            audit_dir=audit_dir,
+            max_prefetch=args.prefetch_chunks,
+            line_filter=prompt_index.filter_lines if prompt_index is not None else None
+        )
+    finally:
+        close_prompt_index(prompt_index)
+    if sizer is not None:
+        sizer.log_summary()
+    return exit_code_for(stats["chunks_failed"])
+
+async def run_template_pipeline(args: argparse.Namespace, script_dir: Path, image_path: Path) -> int:
+    """
+    模板模式入口：模板文件 → 按需展开为提示词 → 分块 → 入队，全程流式，不写出展开后的文件。
+
+    Args:
+        args (argparse.Namespace): 命令行参数。
+        script_dir (Path): 脚本所在目录（审计分块存入其 cache/chunks 分块缓存）。
+        image_path (Path): 参考图片路径。
+
+    Returns:
+        int: 退出码。
+    """
+    try:
+        template = load_template_file(args.template, args.wildcard_dir)
+    except (OSError, TemplateError) as e:
+        logger.error(f"模板读取失败，跳过入队: {e}")
+        return EXIT_INPUT_ERROR
+    planned = template.count if args.template_limit is None else min(args.template_limit, template.count)
+    logger.info(f"模板 '{args.template.name}' 共 {template.count:,} 种组合，本次按 {args.template_mode} 模式生成 {planned:,} 行。")
+
+    audit_dir = script_dir / "cache" / "chunks" if args.write_chunk_files else None
+    backend = create_enqueue_backend(args, image_path)
+    chunk_size, sizer = configure_chunk_size(args, backend)
+    prompt_index = create_prompt_index(args, backend, image_path)
+    lines = iter_expanded_prompts(template, args.template_mode, args.template_limit, args.template_seed)
+    if prompt_index is not None:
+        lines = prompt_index.filter_lines(lines)
+    try:
+        success, failed = await run_chunk_stream(
+            iter_text_chunks(lines, chunk_size, audit_dir, source=str(args.template)), backend, args.prefetch_chunks, source_label=f"模板 '{args.template.name}'"
+        )
+        logger.info(f"模板入队完成：成功 {success} 个分块，失败 {failed} 个分块。")
+    finally:
+        close_prompt_index(prompt_index)
+    if sizer is not None:
+        sizer.log_summary()
+    return exit_code_for(failed)
+
+async def run_manifest_pipeline(args: argparse.Namespace, script_dir: Path) -> int:
+    """
+    任务清单模式入口：在同一个后端会话中执行清单中的全部任务，按参考图片分组，每张图片只准备一次。
+
+    Args:
+        args (argparse.Namespace): 命令行参数。
+        script_dir (Path): 脚本所在目录（审计分块存入其 cache/chunks 分块缓存）。
+
+    Returns:
+        int: 退出码。
+    """
+    try:
+        jobs = load_manifest(args.manifest)
+    except ManifestError as e:
+        logger.error(f"任务清单无效，跳过入队: {e}")
+        return EXIT_INPUT_ERROR
+    if args.adaptive_chunks:
+        logger.warning("任务清单模式使用各任务的 lines_per_chunk，--adaptive-chunks 将被忽略。")
+
+    first_image = group_jobs_by_image(jobs)[0][0]
+    audit_dir = script_dir / "cache" / "chunks" if args.write_chunk_files else None
+    backend = create_enqueue_backend(args, first_image)
+    prompt_index = create_prompt_index(args, backend, first_image)
+    try:
+        results = await run_manifest(
+            jobs,
+            backend,
+            load_parameters=args.backend == "api" or args.image_setup == "paste",
+            audit_dir=audit_dir,
+            prompt_index=prompt_index,
+            max_prefetch=args.prefetch_chunks
+        )
+    finally:
+        close_prompt_index(prompt_index)
+    return exit_code_for(sum(result["chunks_failed"] + (1 if result["error"] else 0) for result in results))
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    """解析命令行参数。"""
+    parser = argparse.ArgumentParser(description="将提示词分块后批量加入 Stable Diffusion WebUI 队列。")
+    parser.add_argument("--backend", choices=["playwright", "api"], default="playwright",
+                        help="入队后端：playwright 通过浏览器操作，api 直接调用 WebUI HTTP 接口。")
+    parser.add_argument("--webui-url", nargs="+", default=[DEFAULT_WEBUI_URL],
+                        help="WebUI 地址，可指定多个以在多个实例间分发分块。")
+    parser.add_argument("--api-endpoint", choices=list(API_ENDPOINTS), default="queue",
+                        help="api 后端使用的接口：queue 为队列扩展接口，txt2img 为原生接口。")
+    parser.add_argument("--max-in-flight", type=int, default=4, help="api 后端同时在途的请求数上限。")
+    parser.add_argument("--max-retries", type=int, default=3, help="api 后端单个分块的最大重试次数。")
+    parser.add_argument("--backpressure", action="store_true",
+                        help="读取队列扩展的待处理任务数，使积压保持在高低水位之间。")
+    parser.add_argument("--queue-low-watermark", type=int, default=DEFAULT_LOW_WATERMARK,
+                        help="队列背压低水位（任务数）：暂停后降到此值以下才恢复入队。")
+    parser.add_argument("--queue-high-watermark", type=int, default=DEFAULT_HIGH_WATERMARK,
+                        help="队列背压高水位（任务数）：达到此值时暂停入队。")
+    parser.add_argument("--lines-per-chunk", type=int, default=DEFAULT_LINES_PER_CHUNK, help="每个分块的行数。")
+    parser.add_argument("--adaptive-chunks", action="store_true",
+                        help="根据填充耗时和 Enqueue 确认延迟自动调整每个分块的行数（以 --lines-per-chunk 为初始值）。")
+    parser.add_argument("--min-chunk-lines", type=int, default=DEFAULT_MIN_CHUNK_LINES, help="自适应分块的行数下限。")
+    parser.add_argument("--max-chunk-lines", type=int, default=DEFAULT_MAX_CHUNK_LINES, help="自适应分块的行数上限。")
+    parser.add_argument("--write-chunk-files", action="store_true",
+                        help="同时将每个分块存入 cache/chunks 分块缓存（按内容哈希去重，每次运行记录一份清单），仅用于审计。")
+    parser.add_argument("--cache-max-mb", type=float, default=None,
+                        help=f"分块缓存的容量上限（MB），含运行清单，超出时按最近使用时间淘汰旧分块与清单；默认 {DEFAULT_MAX_CACHE_MB:.0f}，0 为不限制。")
+    parser.add_argument("--cache-max-age-days", type=float, default=None,
+                        help="分块缓存中超过该天数未被使用的分块与运行清单将被淘汰；默认不按时间淘汰。")
+    parser.add_argument("--prefetch-chunks", type=int, default=DEFAULT_PREFETCH_CHUNKS,
+                        help="读取线程最多领先入队的分块数（有界队列容量）；输入位于慢速或网络存储时可适当调大。")
+    parser.add_argument("--resume", action="store_true",
+                        help="根据检查点日志跳过上次已确认入队的分块（输入文件内容必须未变）。")
+    parser.add_argument("--from-source", action="store_true",
+                        help="融合流水线：直接读取 处理文档.txt 并加上 前缀.txt 中的前缀后入队，不经过 总行数.txt。")
+    parser.add_argument("--materialize", action="store_true",
+                        help="配合 --from-source 使用：同时写出完整的 总行数.txt。")
+    parser.add_argument("--harvest", type=Path, default=None, metavar="OUTPUT_DIR",
+                        help="监视 WebUI 输出目录（如 outputs/txt2img-images），将新图片与入队的提示词对照，统计出图速度与未出图的提示词。")
+    parser.add_argument("--harvest-timeout", type=float, default=300.0,
+                        help="入队结束后继续等待出图的最长秒数。")
+    parser.add_argument("--harvest-interval", type=float, default=DEFAULT_POLL_INTERVAL_SECONDS,
+                        help="输出目录的轮询间隔（秒）。")
+    parser.add_argument("--report", nargs="?", const="", default=None, metavar="PATH",
+                        help="运行结束时写出 Excel 运行报告（每个提示词一行：分块、状态、时间、图片超链接，另附汇总表）；"
+                             "不指定路径时写到 cache/reports/。配合 --harvest 可包含出图状态与图片链接。")
+    parser.add_argument("--manifest", type=Path, default=None,
+                        help="任务清单模式：按 .json / .toml 清单执行多张参考图片各自的提示词任务（同一浏览器会话，按图片分组）。")
+    parser.add_argument("--template", type=Path, default=None,
+                        help="模板模式：从模板文件（每行一个模板，支持 {a|b|c} 与 __通配符__）按需展开提示词并入队。")
+    parser.add_argument("--wildcard-dir", type=Path, default=DEFAULT_WILDCARD_DIR, help="模板中 __名称__ 引用的通配符文件目录。")
+    parser.add_argument("--template-mode", choices=list(EXPANSION_MODES), default="all",
+                        help="all 按顺序枚举全部组合；random 随机顺序且组合不重复。")
+    parser.add_argument("--template-limit", type=int, default=None, help="模板模式最多生成的提示词行数。")
+    parser.add_argument("--template-seed", type=int, default=None, help="random 模式的随机种子，指定后结果可复现。")
+    parser.add_argument("--batch", action="store_true",
+                        help="无人值守模式：不等待 input() 确认、不自动打开文件，按结果返回退出码（0 成功，1 运行错误，3 输入缺失，4 部分分块失败）。")
+    parser.add_argument("--input", type=Path, default=None, help="待入队的提示词文件，默认为脚本目录下的 总行数.txt。")
+    parser.add_argument("--prefix-file", type=Path, default=None, help="--from-source 使用的前缀文件，默认为脚本目录下的 前缀.txt。")
+    parser.add_argument("--source-file", type=Path, default=None, help="--from-source 使用的原始文档，默认为脚本目录下的 处理文档.txt。")
+    parser.add_argument("--image", type=Path, default=None, help="参考图片路径，默认为脚本目录下的 00558-913820330.png。")
+    parser.add_argument("--log-profile", choices=list(LOG_PROFILES), default="full",
+                        help="日志配置档：full 主日志记录 DEBUG 详情；lean 仅记录 INFO 及以上且关闭 backtrace/diagnose，适合长时间运行。")
+    parser.add_argument("--trace", nargs="?", const="", default=None, metavar="PATH",
+                        help="记录每个浏览器操作、等待步骤和流水线阶段的耗时，结束时输出 p50/p95 汇总并写出 Chrome trace JSON"
+                             "（可在 ui.perfetto.dev 打开）；不指定路径时写到 cache/traces/。")
+    parser.add_argument("--dedup", choices=list(DEDUP_MODES), default="off",
+                        help="跨运行的提示词去重：skip 跳过已生成过的提示词，count 只统计重复数量，off 关闭。")
+    parser.add_argument("--dedup-expire-days", type=float, default=None,
+                        help="去重索引中超过该天数未再入队的提示词视为未生成过（并在启动时清理）；默认永不过期。")
+    parser.add_argument("--image-setup", choices=["paste", "upload"], default="paste",
+                        help="playwright 后端导入参考图片参数的方式：paste 为本地读取 PNG 参数后直接粘贴（默认，图片无参数时自动退回 upload），"
+                             "upload 为经“图片信息”页上传图片。")
+    parser.add_argument("--browser-profile", choices=list(BROWSER_PROFILES), default="full",
+                        help="playwright 后端的浏览器配置：full 为有界面全量加载，lean 为无头 + 屏蔽图片/字体/媒体 + 关闭动画。")
+    parser.add_argument("--cdp-url", default=None,
+                        help="连接常驻浏览器（python browser_daemon.py 启动，如 http://127.0.0.1:9222），复用已加载的 WebUI 标签页。")
+    parser.add_argument("--fill-mode", choices=list(FILL_MODES), default=FILL_MODE_FAST,
+                        help="playwright 后端填充“提示词输入列表”的方式：fast 为单次 evaluate + 一次 input 事件，standard 为常规 fill。")
+    parser.add_argument("--min-step-delay", type=float, default=DEFAULT_MIN_DELAY_SECONDS,
+                        help="playwright 后端每个步骤的最小延迟（秒）。")
+    parser.set_defaults(harvester=None) # 运行时由 main 填入 OutputHarvester
+    return parser.parse_args(argv)
 
 # --- 主程序入口点 ---
-async def main(): # 封装为异步主函数
+async def main(args: argparse.Namespace) -> int: # 封装为异步主函数，返回退出码
+    if args.batch:
+        # 无人值守：不等待确认，关闭所有自动打开文件（同时省去打开前的等待）
+        enable_batch_mode()
+    # 分块缓存的容量上限与保留天数通过环境变量传给 chunk_cache（子进程同样继承）
+    if args.cache_max_mb is not None:
+        os.environ["CHUNK_CACHE_MAX_MB"] = str(args.cache_max_mb)
+    if args.cache_max_age_days is not None:
+        os.environ["CHUNK_CACHE_MAX_AGE_DAYS"] = str(args.cache_max_age_days)
     # 使用 my_tools 配置 Loguru 日志
-    error_log_path, main_log_path = setup_logger()
+    error_log_path, main_log_path = setup_logger(profile=args.log_profile)
 
-    # 确保输入文件在脚本的同一目录中
+    # 默认输入文件在脚本的同一目录中
     script_dir = Path(__file__).resolve().parent
-    input_file_path = script_dir / "总行数.txt" # 使用 Path 对象表示输入文件
+    input_file_path = args.input or script_dir / "总行数.txt" # 使用 Path 对象表示输入文件
     
     # 【新增】图片文件路径自适应配置
     IMAGE_FILENAME = "00558-913820330.png"
-    IMAGE_PATH = script_dir / IMAGE_FILENAME
+    IMAGE_PATH = args.image or script_dir / IMAGE_FILENAME
     logger.info(f"图片文件预设路径: {IMAGE_PATH}")
-
-    # 运行文件拆分任务
-    logger.info("准备进行文件拆分。")
-    # split_txt_file_by_lines 返回一个列表，包含所有生成的拆分文件路径
-    split_file_paths = split_txt_file_by_lines(input_file_path)
-
-    # 如果文件拆分成功，则运行 Playwright 自动化
-    if split_file_paths:
-        logger.info(f"文件拆分成功，共生成 {len(split_file_paths)} 个文件。")
-        async with async_playwright() as playwright: # 更改: 变为异步上下文管理器
-            await run_playwright_automation(playwright, split_file_paths, IMAGE_PATH) # 更改: 传入图片绝对路径
+    exit_code = EXIT_SUCCESS
+
+    if args.trace is not None:
+        TRACER.enable()
+        logger.info("已开启计时埋点，运行结束后写出 Chrome trace。")
+
+    if args.harvest is not None or args.report is not None:
+        # 只指定 --report 时也记录入队（不监视输出目录），报告中的状态为“已入队”
+        ledger_path, harvest_report_path = default_harvest_paths()
+        args.harvester = OutputHarvester(args.harvest, ledger_path)
+        await args.harvester.start(args.harvest_interval)
+        logger.info(f"入队记录将写入: {ledger_path}")
+
+    if (args.manifest or args.from_source or args.template) and args.resume:
+        logger.warning("--resume 仅适用于 总行数.txt 的分块入队，任务清单、融合流水线与模板模式下将忽略。")
+
+    if args.manifest:
+        # 任务清单模式：多张参考图片、各自的提示词来源，一个会话内按图片分组执行
+        exit_code = await run_manifest_pipeline(args, script_dir)
+    elif args.template:
+        # 模板模式：按需展开 {a|b} 与 __通配符__，直接分块入队
+        exit_code = await run_template_pipeline(args, script_dir, IMAGE_PATH)
+    elif args.from_source:
+        # 融合流水线：直接从 处理文档.txt 读取、加前缀、分块并入队，不经过 总行数.txt
+        exit_code = await run_source_pipeline(args, script_dir, IMAGE_PATH)
+    # 检查输入文件并等待用户确认
+    elif not prepare_input_file(input_file_path, interactive=not args.batch):
+        logger.info("输入文件准备失败，跳过入队。")
+        exit_code = EXIT_INPUT_ERROR
     else:
-        logger.info("由于没有文件可供处理，跳过 Playwright 自动化。")
-
-    # 任务完成后自动打开日志文件
-    await open_completed_logs(main_log_path, error_log_path, logger, is_auto_open=True)
+        # 单次遍历输入文件，流式产出分块；仅在需要审计时存入分块缓存 cache/chunks
+        audit_dir = script_dir / "cache" / "chunks" if args.write_chunk_files else None
+        backend = create_enqueue_backend(args, IMAGE_PATH)
+        chunk_size, sizer = configure_chunk_size(args, backend)
+
+        # 检查点日志：每个确认入队的分块都会落盘，--resume 时跳过已完成的分块
+        journal = CheckpointJournal(script_dir / "cache" / "checkpoints", input_file_path, resume=args.resume)
+        await journal.prepare()
+        backend.add_chunk_listener(journal.record)
+        start_index, start_offset = journal.resume_point()
+        if args.resume and start_index > 0:
+            logger.info(f"断点续跑：前 {start_index} 个分块已完成，从第 {start_index + 1} 个分块（字节 {start_offset}）继续。")
+
+        chunks = iter_file_chunks(
+            input_file_path,
+            chunk_size,
+            audit_dir=audit_dir,
+            start_offset=start_offset,
+            start_index=start_index,
+            skip_ranges=journal.completed_ranges(),
+            chunk_offsets=journal.chunk_offsets
+        )
+        prompt_index = create_prompt_index(args, backend, IMAGE_PATH)
+        if prompt_index is not None:
+            # 全部提示词都已生成过的分块视为已完成，写入检查点日志以保持续跑位置连续
+            chunks = prompt_index.filter_chunks(chunks, on_empty_chunk=lambda index: journal.record(index, ""))
+        try:
+            # 分块在读取线程中产出并预读（第 N 个分块入队时第 N+1 个分块已在读取），事件循环不会被磁盘读取阻塞
+            logger.info(f"使用 '{args.backend}' 后端入队，初始每个分块 {args.lines_per_chunk} 行，最多预读 {args.prefetch_chunks} 个分块。")
+            success, failed = await run_chunk_stream(chunks, backend, args.prefetch_chunks, source_label=f"文件 '{input_file_path}'")
+            exit_code = exit_code_for(failed)
+            if sizer is not None and success + failed > 0:
+                sizer.log_summary()
+        finally:
+            journal.close()
+            close_prompt_index(prompt_index)
+
+    report_files = []
+    if args.harvester is not None:
+        await args.harvester.finish(args.harvest_timeout, args.harvest_interval)
+        if args.harvest is not None:
+            args.harvester.log_summary()
+            args.harvester.write_report(harvest_report_path)
+        if args.report is not None:
+            report_path = Path(args.report) if args.report else default_report_path()
+            try:
+                report_files.append(write_harvest_report(args.harvester, report_path))
+            except Exception as e:
+                logger.error(f"写出运行报告 '{report_path}' 失败: {e}")
+        args.harvester.close()
+
+    if TRACER.enabled:
+        TRACER.log_summary()
+        trace_path = Path(args.trace) if args.trace else script_dir / "cache" / "traces" / f"trace_{datetime.datetime.now():%Y%m%d_%H%M%S}.json"
+        TRACER.write_chrome_trace(trace_path)
+
+    run_status = RunStatusManager(error_log_path, logger, status_sink=LIVE_STATUS).get_status()
+    level_counts = LIVE_STATUS.snapshot()["level_counts"]
+    logger.info(f"运行结束，状态: {run_status}（警告 {level_counts.get('WARNING', 0)} 条，错误 {level_counts.get('ERROR', 0) + level_counts.get('CRITICAL', 0)} 条）")
+
+    # 任务完成后自动打开日志文件（--batch 时跳过）
+    await open_completed_logs(main_log_path, error_log_path, logger, is_auto_open=not args.batch, extra_files=report_files)
+    logger.info(f"退出码: {exit_code}")
+    return exit_code
 
 if __name__ == "__main__":
-    asyncio.run(main()) # 运行异步主函数
\ No newline at end of file
+    sys.exit(asyncio.run(main(parse_args()))) # 运行异步主函数，以退出码结束进程
@@ -0,0 +1,217 @@
+# filename: multi_backend.py
+# 多后端调度：把分块分发到多个 WebUI 实例，优先交给预计最快完成的后端，后端故障时把分块改派给其他后端
+import asyncio
+import time
+from pathlib import Path
+from typing import Any, Collection, Dict, List, Optional
+from loguru import logger
+from chunker import count_lines
+from enqueue_backends import EnqueueBackend, FAILURE_REJECTED, FAILURE_UNCONFIRMED
+
+# 连续失败达到该次数后，将后端标记为下线（只统计后端故障，分块本身被拒绝不计入）
+DEFAULT_MAX_CONSECUTIVE_FAILURES = 3
+# 单个分块因后端故障最多改派的次数；每次改派到尚未尝试过的后端，避免一个有问题的分块把所有后端拖下线
+DEFAULT_MAX_REASSIGNMENTS = 2
+# 吞吐量指数滑动平均的平滑系数（越大越看重最近的分块）
+THROUGHPUT_EWMA_ALPHA = 0.3
+
+
+class BackendSlot:
+    """调度器中单个后端的运行状态与统计。"""
+    def __init__(self, backend: EnqueueBackend, label: str):
+        self.backend = backend
+        self.label = label
+        self.in_flight = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.seconds_per_line: Optional[float] = None # 最近吞吐的滑动平均（秒/行），None 表示尚无测量
+        self.lines_done = 0
+        self.chunks_done = 0
+        self.chunks_failed = 0
+        self.busy_seconds = 0.0
+
+    @property
+    def has_capacity(self) -> bool:
+        return self.healthy and self.in_flight < max(1, self.backend.max_in_flight)
+
+    def expected_finish_seconds(self, lines: int) -> float:
+        """估算把 lines 行交给该后端后完成所需的时间：排队中的分块 + 本分块。尚无测量的后端优先试用。"""
+        if self.seconds_per_line is None:
+            return 0.0
+        return (self.in_flight + 1) * lines * self.seconds_per_line
+
+    def record_success(self, lines: int, elapsed: float) -> None:
+        self.consecutive_failures = 0
+        self.lines_done += lines
+        self.chunks_done += 1
+        self.busy_seconds += elapsed
+        if lines > 0:
+            sample = elapsed / lines
+            if self.seconds_per_line is None:
+                self.seconds_per_line = sample
+            else:
+                self.seconds_per_line = THROUGHPUT_EWMA_ALPHA * sample + (1 - THROUGHPUT_EWMA_ALPHA) * self.seconds_per_line
+
+
+class MultiBackendScheduler(EnqueueBackend):
+    """
+    组合多个入队后端（通常每个 WebUI 实例一个），对外表现为单个 EnqueueBackend。
+    - 分块交给有空闲容量、且预计最快完成（在途分块最少 / 最近吞吐最好）的健康后端；
+    - 后端抛出异常或连续失败时标记为下线，分块改派给尚未尝试过的其他后端（次数有上限）；
+    - 分块本身被拒绝（4xx、参数校验失败）时直接判定该分块失败，不改派，也不计入后端的连续失败；
+    - close 时输出每个后端的行数/秒统计。
+    """
+    name = "multi"
+
+    def __init__(
+        self,
+        backends: List[EnqueueBackend],
+        labels: Optional[List[str]] = None,
+        max_consecutive_failures: int = DEFAULT_MAX_CONSECUTIVE_FAILURES,
+        max_reassignments: int = DEFAULT_MAX_REASSIGNMENTS
+    ):
+        """
+        Args:
+            backends (List[EnqueueBackend]): 尚未启动的子后端列表。
+            labels (Optional[List[str]]): 各后端在日志中的名称（如 WebUI 地址），默认使用序号。
+            max_consecutive_failures (int): 连续失败多少次后将后端下线。
+            max_reassignments (int): 单个分块因后端故障最多改派的次数。
+        """
+        super().__init__()
+        if not backends:
+            raise ValueError("至少需要一个后端。")
+        labels = labels or [f"{backend.name}#{i + 1}" for i, backend in enumerate(backends)]
+        self.slots = [BackendSlot(backend, label) for backend, label in zip(backends, labels)]
+        self.max_consecutive_failures = max(1, max_consecutive_failures)
+        self.max_reassignments = max(0, max_reassignments)
+        self.max_in_flight = sum(max(1, backend.max_in_flight) for backend in backends)
+        self._slot_available = asyncio.Condition()
+        self._started_at = 0.0
+
+    async def start(self) -> None:
+        results = await asyncio.gather(*(slot.backend.start() for slot in self.slots), return_exceptions=True)
+        for slot, result in zip(self.slots, results):
+            if isinstance(result, BaseException):
+                slot.healthy = False
+                logger.error(f"[调度] 后端 {slot.label} 启动失败，已下线: {result}")
+            else:
+                logger.info(f"[调度] 后端 {slot.label} 已就绪（最多 {slot.backend.max_in_flight} 个分块同时在途）。")
+        if not any(slot.healthy for slot in self.slots):
+            raise RuntimeError("所有后端均启动失败。")
+        self._started_at = time.perf_counter()
+
+    async def switch_reference(self, image_path: Path, reference_parameters: Optional[str] = None) -> None:
+        """所有在线后端同时切换参考图片；切换失败的后端下线。"""
+        healthy = [slot for slot in self.slots if slot.healthy]
+        results = await asyncio.gather(
+            *(slot.backend.switch_reference(image_path, reference_parameters) for slot in healthy), return_exceptions=True
+        )
+        for slot, result in zip(healthy, results):
+            if isinstance(result, BaseException):
+                slot.healthy = False
+                logger.error(f"[调度] 后端 {slot.label} 切换参考图片失败，已下线: {result}")
+        if not any(slot.healthy for slot in self.slots):
+            raise RuntimeError("所有后端均无法切换参考图片。")
+
+    async def _acquire_slot(self, lines: int, exclude: Collection[BackendSlot] = ()) -> Optional[BackendSlot]:
+        """等待并选出预计最快完成的健康后端（跳过 exclude 中已尝试过的后端）；没有可选的健康后端时返回 None。"""
+        async with self._slot_available:
+            while True:
+                if not any(slot.healthy and slot not in exclude for slot in self.slots):
+                    return None
+                candidates = [slot for slot in self.slots if slot.has_capacity and slot not in exclude]
+                if candidates:
+                    slot = min(candidates, key=lambda s: (s.expected_finish_seconds(lines), s.in_flight))
+                    slot.in_flight += 1
+                    return slot
+                await self._slot_available.wait()
+
+    async def _release_slot(self, slot: BackendSlot) -> None:
+        async with self._slot_available:
+            slot.in_flight -= 1
+            self._slot_available.notify_all()
+
+    async def _mark_failure(self, slot: BackendSlot, reason: str) -> None:
+        slot.chunks_failed += 1
+        slot.consecutive_failures += 1
+        if slot.consecutive_failures >= self.max_consecutive_failures and slot.healthy:
+            slot.healthy = False
+            logger.error(f"[调度] 后端 {slot.label} 连续失败 {slot.consecutive_failures} 次，已下线：{reason}")
+            async with self._slot_available:
+                self._slot_available.notify_all()
+
+    async def enqueue_chunk(self, index: int, content: str) -> bool:
+        lines = count_lines(content)
+        tried: List[BackendSlot] = []
+        while True:
+            slot = await self._acquire_slot(lines, exclude=tried)
+            if slot is None:
+                if tried:
+                    logger.error(f"[调度] 第 {index + 1} 个分块在 {len(tried)} 个后端上均失败，不再改派。")
+                else:
+                    logger.error(f"[调度] 没有可用的后端，第 {index + 1} 个分块无法入队。")
+                return False
+            tried.append(slot)
+            start = time.perf_counter()
+            failure = None
+            try:
+                # 每个实例各自的队列背压：只阻塞该实例的这个名额，其他实例继续入队
+                await slot.backend.wait_for_queue_capacity()
+                succeeded = await slot.backend.enqueue_chunk(index, content)
+                failure = slot.backend.chunk_failures.pop(index, None)
+                reason = "入队返回失败"
+            except Exception as e:
+                succeeded = False
+                reason = f"异常: {e}"
+                # 浏览器崩溃、连接断开等异常通常意味着后端已不可用，直接下线
+                slot.consecutive_failures = self.max_consecutive_failures - 1
+            finally:
+                await self._release_slot(slot)
+
+            if succeeded:
+                slot.backend.note_chunk_enqueued()
+                slot.record_success(lines, time.perf_counter() - start)
+                timings = slot.backend.chunk_timings.pop(index, {})
+                timings["backend"] = float(self.slots.index(slot))
+                self.chunk_timings[index] = timings
+                logger.debug(f"[调度] 第 {index + 1} 个分块由后端 {slot.label} 完成。")
+                return True
+
+            if failure == FAILURE_REJECTED:
+                # 分块本身的问题：换后端也不会成功，后端仍然健康
+                slot.chunks_failed += 1
+                logger.error(f"[调度] 第 {index + 1} 个分块被后端 {slot.label} 拒绝，不改派。")
+                return False
+            await self._mark_failure(slot, reason)
+            if failure == FAILURE_UNCONFIRMED:
+                logger.error(f"[调度] 第 {index + 1} 个分块在后端 {slot.label} 的结果未知，为避免重复出图不改派。")
+                return False
+            if len(tried) > self.max_reassignments:
+                logger.error(f"[调度] 第 {index + 1} 个分块已改派 {self.max_reassignments} 次仍失败，放弃该分块。")
+                return False
+            logger.warning(f"[调度] 第 {index + 1} 个分块在后端 {slot.label} 失败（{reason}），改派给其他后端。")
+
+    def backend_stats(self) -> List[Dict[str, Any]]:
+        """返回每个后端的统计：行数、分块数、失败数、行/秒（按运行总时长）。"""
+        elapsed = max(time.perf_counter() - self._started_at, 1e-9) if self._started_at else 0.0
+        stats = []
+        for slot in self.slots:
+            stats.append({
+                "label": slot.label,
+                "healthy": slot.healthy,
+                "lines": slot.lines_done,
+                "chunks": slot.chunks_done,
+                "failed": slot.chunks_failed,
+                "lines_per_second": slot.lines_done / elapsed if elapsed else 0.0,
+            })
+        return stats
+
+    async def close(self) -> None:
+        logger.info("--- 多后端调度统计 ---")
+        for record in self.backend_stats():
+            status = "在线" if record["healthy"] else "已下线"
+            logger.info(
+                f"[调度] {record['label']}（{status}）：{record['lines']} 行，{record['chunks']} 个分块，"
+                f"失败 {record['failed']} 次，{record['lines_per_second']:.1f} 行/秒"
+            )
+        await asyncio.gather(*(slot.backend.close() for slot in self.slots), return_exceptions=True)
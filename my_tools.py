@@ -11,6 +11,9 @@ import re # 新增：用于正则表达式，支持 clean_filename_string
 import hashlib # 新增：用于哈希计算，支持 generate_unique_filename
 import shutil # 新增：用于文件复制，支持 copy_file_robustly
 import asyncio # 新增：用于 run_application 中的 asyncio.run
+import threading # 新增：用于 LiveStatusSink 的计数器加锁
+import unicodedata # 新增：用于 estimate_column_widths 计算东亚宽字符
+from collections import deque # 新增：用于 LiveStatusSink 保留最近记录
 from typing import Tuple, List, Optional, Dict, Any, Callable # 导入 Any, Callable
 
 # openpyxl 相关导入
@@ -18,10 +21,26 @@ from openpyxl import Workbook
 from openpyxl.worksheet.worksheet import Worksheet
 from openpyxl.styles import Font
 from openpyxl.utils import get_column_letter
+from openpyxl.cell import WriteOnlyCell
 
 # 获取当前脚本的父目录（项目根目录）
 BASE_DIR = Path(__file__).resolve().parent
 
+# 无人值守（--batch）模式下等待文件释放的默认重试次数与间隔（秒）
+BATCH_FILE_RELEASE_ATTEMPTS = 30
+BATCH_FILE_RELEASE_DELAY_SECONDS = 1.0
+
+
+def is_batch_mode() -> bool:
+    """是否处于无人值守模式（环境变量 BATCH_MODE=1，由 --batch 设置，子进程同样继承）。"""
+    return os.getenv("BATCH_MODE", "0") == "1"
+
+
+def enable_batch_mode() -> None:
+    """开启无人值守模式：不等待 input()，不自动打开文件。"""
+    os.environ["BATCH_MODE"] = "1"
+    os.environ["DISABLE_AUTO_OPEN"] = "1"
+
 # --- 从 file_system_utils.py 复制过来的函数 ---
 
 def normalize_drive_letter(path_str: str) -> str:
@@ -95,13 +114,14 @@ def open_output_files_automatically(
         logger_obj.info("已禁用自动打开文件功能。")
         return
 
-    # 定义延迟时间 (秒)
+    # 定义延迟时间 (秒)，所有文件打开前只等待一次，而不是每个文件各等一次
     OPEN_FILE_DELAY_SECONDS = 2
 
-    for file_path in file_paths:
-        logger_obj.debug(f"尝试打开文件 '{normalize_drive_letter(str(file_path))}' 前，等待 {OPEN_FILE_DELAY_SECONDS} 秒。")
+    if file_paths:
+        logger_obj.debug(f"尝试打开 {len(file_paths)} 个文件前，等待 {OPEN_FILE_DELAY_SECONDS} 秒。")
         time.sleep(OPEN_FILE_DELAY_SECONDS)
 
+    for file_path in file_paths:
         actual_path_to_open = file_path
         # 特殊处理 Loguru 压缩后的日志文件
         if file_path.suffix == '.log' and not file_path.exists():
@@ -128,42 +148,118 @@ def open_output_files_automatically(
         except Exception as e:
             logger_obj.error(f"自动打开文件 '{normalized_path}' 时发生意外错误: {e}", exc_info=True)
 
+# --- 新增类：实时运行状态汇总 ---
+
+# 日志配置档：full 为 DEBUG 级别的详细日志（含 backtrace/diagnose 变量展开）；
+# lean 为低开销配置，主日志仅记录 INFO 及以上，且不做 backtrace/diagnose，适合长时间运行的入队循环
+LOG_PROFILES = ("full", "lean")
+# LiveStatusSink 默认保留的最近记录条数
+DEFAULT_RECENT_RECORDS = 50
+# 错误/警告日志中每条记录行首的格式：时间 [级别]
+LOG_RECORD_LEVEL_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} \[(\w+)\]", re.MULTILINE)
+
+
+def status_from_level_counts(level_counts: Dict[str, int]) -> str:
+    """根据各日志级别的记录数确定运行状态（"SUCCESS", "Run Warning", "Run Error"）。"""
+    if level_counts.get("ERROR", 0) or level_counts.get("CRITICAL", 0):
+        return "Run Error"
+    if level_counts.get("WARNING", 0):
+        return "Run Warning"
+    return "SUCCESS"
+
+
+class LiveStatusSink:
+    """
+    Loguru 实时状态汇总 sink：在内存中维护各级别的记录数与最近 N 条记录。
+    运行状态按记录的级别判定（不再在日志文本中搜索 "ERROR" 等字样），查询为 O(1)。
+    """
+    def __init__(self, max_records: int = DEFAULT_RECENT_RECORDS):
+        """
+        Args:
+            max_records (int): 保留的最近记录条数。
+        """
+        self.level_counts: Dict[str, int] = {}
+        self.recent_records: deque = deque(maxlen=max_records)
+        self.handler_id: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def __call__(self, message) -> None:
+        record = message.record
+        level_name = record["level"].name
+        with self._lock:
+            self.level_counts[level_name] = self.level_counts.get(level_name, 0) + 1
+            self.recent_records.append((record["time"], level_name, record["message"]))
+
+    def attach(self, level: str = "INFO") -> int:
+        """清空计数并作为 sink 添加到 loguru，返回处理器 ID。"""
+        self.reset()
+        self.handler_id = logger.add(self, level=level, format="{message}", backtrace=False, diagnose=False)
+        return self.handler_id
+
+    def reset(self) -> None:
+        """清空计数与最近记录。"""
+        with self._lock:
+            self.level_counts.clear()
+            self.recent_records.clear()
+
+    def status(self) -> str:
+        """当前运行状态（O(1)）。"""
+        with self._lock:
+            return status_from_level_counts(self.level_counts)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回各级别记录数与最近记录（时间, 级别, 消息）的副本。"""
+        with self._lock:
+            return {"level_counts": dict(self.level_counts), "recent_records": list(self.recent_records)}
+
+
+# 全局实时状态 sink：setup_logger 会自动添加，RunStatusManager 可直接使用
+LIVE_STATUS = LiveStatusSink()
+
 # --- setup_logger 函数，现在是 my_tools 的核心日志配置部分 ---
 
-def setup_logger(log_base_directory: Path = BASE_DIR / "logs") -> Tuple[Path, Path]:
+def setup_logger(log_base_directory: Path = BASE_DIR / "logs", profile: str = "full",
+                 status_sink: Optional[LiveStatusSink] = LIVE_STATUS) -> Tuple[Path, Path]:
     """
-    配置 Loguru 日志器，设置多个日志输出目标（主日志、错误/警告日志、控制台）。
+    配置 Loguru 日志器，设置多个日志输出目标（主日志、错误/警告日志、控制台、实时状态汇总）。
     此函数应在程序启动时调用一次。
-    主日志文件将以 DEBUG 级别记录所有详细信息。
+    full 配置下主日志文件以 DEBUG 级别记录所有详细信息；lean 配置下主日志仅记录 INFO 及以上，且关闭 backtrace/diagnose。
 
     Args:
         log_base_directory (Path): 日志文件的根目录。默认为脚本运行目录下的 "logs" 文件夹。
+        profile (str): 日志配置档，"full" 或 "lean"。
+        status_sink (Optional[LiveStatusSink]): 实时状态汇总 sink，为 None 时不添加。
         # auto_open (bool): 此参数已移除，日志文件不再在 setup_logger 中自动打开。
 
     Returns:
         Tuple[Path, Path]: 返回一个元组，包含 (error_warning_log_path, main_log_path)。
     """
+    if profile not in LOG_PROFILES:
+        raise ValueError(f"未知的日志配置档 '{profile}'，可选值: {', '.join(LOG_PROFILES)}")
+    verbose = profile == "full"
     logger.remove()  # 移除所有默认或之前添加的处理器
+    if status_sink is not None:
+        status_sink.attach()
 
     # 使用内部的 create_directory_if_not_exists 函数
     if not create_directory_if_not_exists(log_base_directory, logger):
         logger.critical(f"关键错误: 无法创建日志文件夹 {log_base_directory}. 日志将仅打印到控制台.")
         return Path("invalid_log_path_error"), Path("invalid_log_path_main")
 
-    # 1. 配置主程序日志 (DEBUG 及以上，到独立文件，包含所有详细信息)
+    # 1. 配置主程序日志 (full: DEBUG 及以上，包含所有详细信息；lean: INFO 及以上)
     main_log_file_name = f"main_log_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
     main_log_path = log_base_directory / main_log_file_name
 
     logger.add(
         sink=main_log_path,
-        level="DEBUG",
+        level="DEBUG" if verbose else "INFO",
         format="{time:YYYY-MM-DD HH:mm:ss} [{level}] <cyan>{file}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - {message}",
         rotation="10 MB",
         retention="7 days",
         compression="zip",
         enqueue=True,
-        backtrace=True,
-        diagnose=True
+        backtrace=verbose,
+        diagnose=verbose
     )
 
     # 2. 配置错误和警告日志 (WARNING 及以上，到独立文件)
@@ -178,8 +274,8 @@ def setup_logger(log_base_directory: Path = BASE_DIR / "logs") -> Tuple[Path, Pa
         retention="7 days",
         compression="zip",
         enqueue=True,
-        backtrace=True,
-        diagnose=True,
+        backtrace=verbose,
+        diagnose=verbose,
         filter=lambda record: record["level"].name in ["WARNING", "ERROR", "CRITICAL"]
     )
 
@@ -256,34 +352,57 @@ async def open_completed_logs( # 函数名已更新
 # --- 新增类：运行状态管理器 ---
 class RunStatusManager:
     """
-    负责管理应用程序的运行状态，主要通过检查错误日志文件来确定。
+    负责管理应用程序的运行状态。
+    指定 status_sink 时直接读取其实时计数（O(1)）；否则增量读取错误日志文件，
+    每次只解析上次读取位置之后新增的记录，并按记录的级别（而非消息文本）判定状态。
     """
-    def __init__(self, error_log_path: Path, logger_obj):
+    def __init__(self, error_log_path: Path, logger_obj, status_sink: Optional[LiveStatusSink] = None):
         """
         初始化 RunStatusManager。
         Args:
             error_log_path (Path): 错误日志文件的路径。
             logger_obj: 日志管理器实例。
+            status_sink (Optional[LiveStatusSink]): 已添加到 loguru 的实时状态 sink。
         """
         self.error_log_path = error_log_path
         self.logger_obj = logger_obj
+        self.status_sink = status_sink
         self.initial_status_checked = False # 标记是否已进行初始状态检查
+        self.log_offset = 0 # 错误日志已读取到的字节位置
+        self.level_counts: Dict[str, int] = {} # 从错误日志中累计的各级别记录数
+
+    def _read_new_log_records(self) -> None:
+        """从上次保存的字节位置继续读取错误日志，只解析完整的新行并累计各级别记录数。"""
+        size = self.error_log_path.stat().st_size
+        if size < self.log_offset:
+            # 日志文件已轮转（新文件比已读位置短），从头开始
+            self.log_offset = 0
+            self.level_counts.clear()
+        if size == self.log_offset:
+            return
+        with open(self.error_log_path, 'rb') as f:
+            f.seek(self.log_offset)
+            new_data = f.read(size - self.log_offset)
+        complete_length = new_data.rfind(b"\n") + 1 # 最后一行可能仍在写入，留到下次读取
+        if complete_length == 0:
+            return
+        self.log_offset += complete_length
+        for level_name in LOG_RECORD_LEVEL_PATTERN.findall(new_data[:complete_length].decode('utf-8', errors='replace')):
+            self.level_counts[level_name] = self.level_counts.get(level_name, 0) + 1
 
     def get_status(self) -> str:
         """
-        根据错误日志文件内容确定应用程序的运行状态。
+        确定应用程序的运行状态。
         Returns:
             str: 运行状态（"SUCCESS", "Run Warning", "Run Error", "Invalid Log Path", "Log File Not Found"）。
         """
         run_status = "SUCCESS"
-        if self.error_log_path and self.error_log_path.exists():
+        if self.status_sink is not None and self.status_sink.handler_id is not None:
+            run_status = self.status_sink.status()
+        elif self.error_log_path and self.error_log_path.exists():
             try:
-                with open(self.error_log_path, 'r', encoding='utf-8') as f:
-                    log_content = f.read()
-                if "ERROR" in log_content or "CRITICAL" in log_content:
-                    run_status = "Run Error"
-                elif "WARNING" in log_content:
-                    run_status = "Run Warning"
+                self._read_new_log_records()
+                run_status = status_from_level_counts(self.level_counts)
             except Exception as e:
                 self.logger_obj.error(f"错误: 读取日志文件 {normalize_drive_letter(str(self.error_log_path))} 时发生错误: {e}")
                 run_status = "Run Error"
@@ -295,7 +414,7 @@ class RunStatusManager:
             self.logger_obj.error(f"日志文件 '{normalize_drive_letter(str(self.error_log_path))}' 不存在，无法检查运行状态。")
 
         if not self.initial_status_checked:
-            self.logger_obj.info(f"应用程序初始运行状态（基于日志文件检查）：{run_status}")
+            self.logger_obj.info(f"应用程序初始运行状态（基于日志记录级别）：{run_status}")
             self.initial_status_checked = True
         return run_status
 
@@ -307,6 +426,12 @@ HYPERLINK_FONT = Font(color="0000FF", underline="single")
 # 定义固定列宽（以字符为单位）
 FIXED_COLUMN_WIDTH = 20
 
+# 按样本行估算列宽时的上下限（以字符为单位）
+MIN_COLUMN_WIDTH = 6
+MAX_COLUMN_WIDTH = 80
+# Excel 公式中字符串参数的最大长度
+HYPERLINK_FORMULA_MAX_LENGTH = 255
+
 # --- Excel Utilities ---
 
 def create_empty_workbook() -> Workbook:
@@ -322,7 +447,8 @@ def create_sheet_with_headers(
     workbook: Workbook,
     sheet_name: str,
     headers: List[str],
-    index: Optional[int] = None
+    index: Optional[int] = None,
+    column_widths: Optional[Dict[Any, float]] = None
 ) -> Worksheet:
     """
     在给定的工作簿中创建一个新工作表，并设置其标题行。
@@ -331,10 +457,14 @@ def create_sheet_with_headers(
         sheet_name (str): 新工作表的名称。
         headers (List[str]): 包含所有列标题的列表。
         index (Optional[int]): 工作表插入的位置索引。如果为 None，则添加到最后。
+        column_widths (Optional[Dict[Any, float]]): 列宽（键为列字母或从 1 开始的列索引）。
+            在写入标题行之前设置，只写模式的工作表必须在写入第一行之前设置列宽。
     Returns:
         Worksheet: 新创建的工作表对象。
     """
     ws = workbook.create_sheet(sheet_name, index)
+    if column_widths:
+        set_column_widths(ws, column_widths=column_widths)
     ws.append(headers)
     return ws
 
@@ -419,6 +549,76 @@ def set_column_widths(
     except Exception as e:
         logger_obj.error(f"错误: 无法为工作表 '{worksheet.title}' 设置列宽。错误: {e}")
 
+def create_write_only_workbook() -> Workbook:
+    """
+    创建只写模式（write_only）的工作簿：行按顺序流式写入临时文件，内存占用不随行数增长。
+    只写模式的工作表不能读取或修改已写入的行；列宽需在写入第一行之前设置，超链接与样式通过 make_hyperlink_cell 设置。
+    """
+    return Workbook(write_only=True)
+
+def make_hyperlink_cell(
+    worksheet,
+    location: Optional[str],
+    display_text: str,
+    logger_obj,
+    source_description: str = "未知来源"
+) -> WriteOnlyCell:
+    """
+    只写模式下的 set_hyperlink_and_style：返回设置好超链接和样式的单元格，作为 worksheet.append 的一个值。
+    超链接写为 HYPERLINK 公式：openpyxl 会把单元格超链接对象保留到工作表写完（它们位于行数据之后），
+    公式则随行写出，百万行时内存仍保持平稳。超出公式字符串长度限制的路径退回单元格超链接。
+    Args:
+        worksheet: 只写模式的工作表。
+        location (Optional[str]): 超链接的目标路径，为 None 或空字符串时只写入文本。
+        display_text (str): 单元格显示的文本。
+        logger_obj: 日志管理器实例。
+        source_description (str): 用于日志记录的来源描述。
+    Returns:
+        WriteOnlyCell: 单元格对象。
+    """
+    cell = WriteOnlyCell(worksheet)
+    if location and max(len(location), len(display_text)) <= HYPERLINK_FORMULA_MAX_LENGTH:
+        target = location.replace('"', '""')
+        text = display_text.replace('"', '""')
+        cell.value = f'=HYPERLINK("{target}","{text}")'
+        cell.font = HYPERLINK_FONT
+    else:
+        set_hyperlink_and_style(cell, location, display_text, logger_obj, source_description)
+    return cell
+
+def display_width(value: Any) -> int:
+    """单元格值的显示宽度（字符数，东亚全角字符按 2 计）。"""
+    if value is None:
+        return 0
+    if isinstance(value, datetime.datetime):
+        return 19 # YYYY-MM-DD HH:MM:SS
+    text = str(value)
+    if text.isascii():
+        return len(text)
+    return sum(2 if unicodedata.east_asian_width(char) in ("W", "F") else 1 for char in text)
+
+def estimate_column_widths(
+    headers: List[str],
+    sample_rows: List[List[Any]],
+    min_width: int = MIN_COLUMN_WIDTH,
+    max_width: int = MAX_COLUMN_WIDTH
+) -> Dict[int, float]:
+    """
+    按标题与样本行估算列宽（不扫描整列），结果可直接传给 set_column_widths / create_sheet_with_headers。
+    Args:
+        headers (List[str]): 列标题。
+        sample_rows (List[List[Any]]): 样本行（通常是最先写出的若干行）。
+        min_width (int): 最小列宽。
+        max_width (int): 最大列宽（长文本列不会无限加宽）。
+    Returns:
+        Dict[int, float]: 列索引（从 1 开始）到列宽的映射。
+    """
+    widths = [display_width(header) for header in headers]
+    for row in sample_rows:
+        for col_idx, value in enumerate(row[:len(widths)]):
+            widths[col_idx] = max(widths[col_idx], display_width(value))
+    return {col_idx: float(min(max_width, max(min_width, width + 2))) for col_idx, width in enumerate(widths, start=1)}
+
 def set_fixed_column_widths(worksheet: Worksheet, width: int, logger_obj):
     """
     为给定工作表的所有列设置固定宽度。
@@ -468,7 +668,8 @@ def generate_timestamped_filename(original_filename: str, timestamp_format: str
 
 
 # --- 从 history_execution.py 移动过来的函数：等待文件释放 ---
-def wait_for_file_release(file_path: Path, action_description: str, logger_obj, max_attempts: int = 0) -> bool:
+def wait_for_file_release(file_path: Path, action_description: str, logger_obj, max_attempts: int = 0,
+                          interactive: Optional[bool] = None) -> bool:
     """
     等待文件被释放，如果文件被占用则提示用户关闭。
     此函数现在是一个通用工具函数，可用于任何文件。
@@ -476,10 +677,15 @@ def wait_for_file_release(file_path: Path, action_description: str, logger_obj,
         file_path (Path): 要检查的文件路径。
         action_description (str): 正在尝试进行的操作描述 (例如 "删除旧的记录文件")。
         logger_obj: 日志管理器实例。
-        max_attempts (int): 最大重试次数。如果为0或负数，表示无限次重试。
+        max_attempts (int): 最大重试次数。如果为0或负数，表示无限次重试（非交互模式下为 BATCH_FILE_RELEASE_ATTEMPTS 次）。
+        interactive (Optional[bool]): 是否等待用户按回车后重试；False 时按固定间隔自动重试。默认在无人值守模式下为 False。
     Returns:
         bool: 如果文件最终可以访问则返回 True，否则返回 False。
     """
+    if interactive is None:
+        interactive = not is_batch_mode()
+    if not interactive and max_attempts <= 0:
+        max_attempts = BATCH_FILE_RELEASE_ATTEMPTS
     attempt = 0
     while True:
         attempt += 1
@@ -500,6 +706,9 @@ def wait_for_file_release(file_path: Path, action_description: str, logger_obj,
                 f"警告: 文件 '{normalize_drive_letter(str(file_path))}' 被占用，无法进行 '{action_description}' 操作。 "
                 f"请关闭任何正在使用此文件的程序 (例如 Excel)。 (尝试 {attempt}{'/' + str(max_attempts) if max_attempts > 0 else ''})"
             )
+            if not interactive:
+                time.sleep(BATCH_FILE_RELEASE_DELAY_SECONDS) # 无人值守：等待后自动重试
+                continue
             print(f"\n文件 '{normalize_drive_letter(str(file_path))}' 被占用，无法进行 '{action_description}' 操作。")
             print("请关闭任何正在使用此文件的程序 (例如 Excel)，然后按 Enter 键继续...")
             input() # 等待用户按下回车
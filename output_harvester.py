@@ -0,0 +1,355 @@
+# filename: output_harvester.py
+# 出图收集：监视 WebUI 的输出目录，读取新 PNG 中嵌入的提示词，与已入队的分块/行对应起来，
+# 统计每分钟出图数、入队到出图的延迟，以及始终没有出图的提示词。
+# 目录扫描使用 os.scandir 增量游标：每个目录记录上次扫描时的修改时间，未变化的目录不再列出，
+# 已处理的文件名不再读取，因此输出目录积累大量历史图片后每次轮询的开销仍然很小。
+# 入队记录（ledger）由分块监听器写出，可在运行结束后离线对照:
+#   python output_harvester.py watch 输出目录 --ledger cache/harvest/ledger_xxx.jsonl [--timeout 600]
+# 本地测试时可用 benchmarks/simulate_webui_output.py 按 ledger 向目录投放模拟 PNG。
+import os
+import json
+import time
+import asyncio
+import argparse
+import datetime
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from loguru import logger
+from png_parameters import read_png_parameters, parse_generation_parameters
+from prompt_index import prompt_hash
+from trace_spans import percentile
+
+DEFAULT_HARVEST_DIR = Path(__file__).resolve().parent / "cache" / "harvest"
+DEFAULT_POLL_INTERVAL_SECONDS = 2.0
+# 无法解析的 PNG（通常是仍在写入）最多重试的轮询次数
+MAX_PARSE_ATTEMPTS = 5
+
+
+class LedgerEntry:
+    """一条已入队的提示词：所在分块与行号（均从 0 开始）、入队时间，以及匹配到的图片。"""
+    __slots__ = ("chunk", "line", "prompt", "enqueued_at", "images", "first_image_at", "first_image_path")
+
+    def __init__(self, chunk: int, line: int, prompt: str, enqueued_at: float):
+        self.chunk = chunk
+        self.line = line
+        self.prompt = prompt
+        self.enqueued_at = enqueued_at
+        self.images = 0
+        self.first_image_at: Optional[float] = None
+        self.first_image_path: Optional[str] = None
+
+
+class DirectoryCursor:
+    """单个目录的增量扫描状态：上次列出时的修改时间、已处理的文件名、待重试的文件、子目录。"""
+    __slots__ = ("mtime_ns", "seen", "retries", "subdirectories")
+
+    def __init__(self):
+        self.mtime_ns = -1
+        self.seen: set = set()
+        self.retries: Dict[str, int] = {}
+        self.subdirectories: List[str] = []
+
+
+class OutputHarvester:
+    """
+    把输出目录中的新图片与入队记录对应起来。
+    record 可直接注册为 EnqueueBackend 的分块监听器（在事件循环中调用）；poll 在工作线程中执行，两者由锁串行化。
+    开始入队前应调用 start：在工作线程中记录已有图片（基线扫描）并开始监视，输出目录很大时也不阻塞事件循环。
+    """
+    def __init__(self, output_dir: Optional[Path], ledger_path: Optional[Path] = None, include_existing: bool = False):
+        """
+        Args:
+            output_dir (Optional[Path]): WebUI 输出目录（如 outputs/txt2img-images），包含按日期划分的子目录。
+                为 None 时只记录入队（不监视出图），供运行报告使用。
+            ledger_path (Optional[Path]): 入队记录文件（JSONL），指定时每个入队的提示词追加一行，供离线对照。
+            include_existing (bool): 是否处理开始监视前就已存在的图片（离线对照时使用）。
+        """
+        self.output_dir = output_dir
+        self.ledger_path = ledger_path
+        self.started_at = time.time()
+        self.entries: List[LedgerEntry] = []
+        self._pending: Dict[int, Deque[LedgerEntry]] = {} # 提示词哈希 -> 尚未出图的条目（按入队顺序）
+        self._matched: Dict[int, LedgerEntry] = {} # 提示词哈希 -> 最近匹配的条目（同一提示词的后续图片）
+        self._cursors: Dict[str, DirectoryCursor] = {}
+        self.images_seen = 0
+        self.images_matched = 0
+        self.unmatched_images: List[str] = []
+        self.unreadable_images: List[str] = []
+        self.last_image_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._scan_lock = threading.Lock() # 后台轮询与 finish 中的轮询不会同时扫描
+        self._ledger_file = None
+        self._watch_task: Optional[asyncio.Task] = None
+        self._needs_baseline = not include_existing
+        if ledger_path is not None:
+            ledger_path.parent.mkdir(parents=True, exist_ok=True)
+            self._ledger_file = open(str(ledger_path), "a", encoding="utf-8")
+
+    def add_entry(self, chunk: int, line: int, prompt: str, enqueued_at: float) -> None:
+        """加入一条入队记录。"""
+        entry = LedgerEntry(chunk, line, prompt, enqueued_at)
+        with self._lock:
+            self.entries.append(entry)
+            self._pending.setdefault(prompt_hash(prompt), deque()).append(entry)
+
+    def record(self, index: int, content: str, timings: Optional[Dict[str, float]] = None) -> None:
+        """分块确认入队后调用：记录分块中每个提示词的行号与入队时间。"""
+        enqueued_at = time.time()
+        lines = []
+        for line_number, line in enumerate(content.splitlines()):
+            if line.strip():
+                self.add_entry(index, line_number, line, enqueued_at)
+                lines.append({"chunk": index, "line": line_number, "time": enqueued_at, "prompt": line})
+        if self._ledger_file is not None and lines:
+            self._ledger_file.write("".join(json.dumps(item, ensure_ascii=False) + "\n" for item in lines))
+            self._ledger_file.flush()
+
+    def load_ledger(self, ledger_path: Path) -> int:
+        """读取已有的入队记录文件，返回读取的条目数。"""
+        count = 0
+        with open(str(ledger_path), "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                try:
+                    item = json.loads(line)
+                    self.add_entry(int(item["chunk"]), int(item["line"]), item["prompt"], float(item["time"]))
+                    count += 1
+                except (ValueError, KeyError, TypeError):
+                    logger.warning(f"入队记录第 {line_number} 行无法解析，已忽略。")
+        return count
+
+    def _match_image(self, image_path: str, mtime: float) -> None:
+        """读取图片中的提示词并对应到入队记录；读取失败时抛出异常，由调用方决定是否重试。"""
+        parameters = read_png_parameters(Path(image_path))
+        prompt = parse_generation_parameters(parameters)["prompt"] if parameters else ""
+        key = prompt_hash(prompt)
+        with self._lock:
+            self.images_seen += 1
+            self.last_image_at = mtime if self.last_image_at is None else max(self.last_image_at, mtime)
+            pending = self._pending.get(key)
+            if pending:
+                entry = pending.popleft()
+                if not pending:
+                    del self._pending[key]
+                self._matched[key] = entry
+            else:
+                # 同一提示词的多张图片（批次数/批量大小大于 1）计入最近匹配的条目
+                entry = self._matched.get(key)
+            if entry is None:
+                self.unmatched_images.append(image_path)
+                return
+            entry.images += 1
+            if entry.first_image_at is None or mtime < entry.first_image_at:
+                entry.first_image_at = mtime
+                entry.first_image_path = image_path
+            self.images_matched += 1
+
+    def _scan_directory(self, directory: str, cursor: DirectoryCursor, baseline: bool) -> None:
+        """列出一个已变化的目录，处理其中的新 PNG，并更新子目录列表。"""
+        subdirectories = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+                    continue
+                if entry.name in cursor.seen or not entry.name.lower().endswith(".png"):
+                    continue
+                if baseline:
+                    cursor.seen.add(entry.name)
+                    continue
+                try:
+                    self._match_image(entry.path, entry.stat().st_mtime)
+                except (OSError, ValueError) as e:
+                    # 文件可能仍在写入：保持目录游标失效，下次轮询重试
+                    attempts = cursor.retries.get(entry.name, 0) + 1
+                    if attempts < MAX_PARSE_ATTEMPTS:
+                        cursor.retries[entry.name] = attempts
+                        cursor.mtime_ns = -1
+                        continue
+                    logger.warning(f"图片 '{entry.path}' 多次读取失败，已跳过: {e}")
+                    self.unreadable_images.append(entry.path)
+                cursor.retries.pop(entry.name, None)
+                cursor.seen.add(entry.name)
+        cursor.subdirectories = subdirectories
+
+    def _scan(self, baseline: bool = False) -> None:
+        """从输出目录开始，只重新列出修改时间发生变化的目录。"""
+        if self.output_dir is None or not self.output_dir.is_dir():
+            return
+        directories = [str(self.output_dir)]
+        while directories:
+            directory = directories.pop()
+            cursor = self._cursors.get(directory)
+            if cursor is None:
+                cursor = self._cursors[directory] = DirectoryCursor()
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            except FileNotFoundError:
+                self._cursors.pop(directory, None)
+                continue
+            if mtime_ns != cursor.mtime_ns:
+                cursor.mtime_ns = mtime_ns
+                self._scan_directory(directory, cursor, baseline)
+            # 目录未变化时不列出，但已知的子目录仍需检查（子目录中新增文件不会改变父目录的修改时间）
+            directories.extend(cursor.subdirectories)
+
+    def scan_baseline(self) -> None:
+        """基线扫描：只记录已有的文件名，不读取内容（不处理已有图片时只执行一次）。"""
+        with self._scan_lock:
+            if self._needs_baseline:
+                self._scan(baseline=True)
+                self._needs_baseline = False
+
+    def poll(self) -> int:
+        """扫描一次输出目录，返回本次新匹配的图片数。尚未做基线扫描时先做基线扫描。"""
+        self.scan_baseline()
+        with self._scan_lock:
+            before = self.images_matched
+            self._scan()
+            return self.images_matched - before
+
+    async def start(self, interval: float = DEFAULT_POLL_INTERVAL_SECONDS) -> None:
+        """在工作线程中完成基线扫描，然后开始后台监视。应在开始入队前调用，之前已有的图片不会被当作新出图。"""
+        if self.output_dir is None:
+            return
+        await asyncio.to_thread(self.scan_baseline)
+        self.start_watching(interval)
+
+    @property
+    def missing_count(self) -> int:
+        """尚未出图的提示词数。"""
+        with self._lock:
+            return sum(len(pending) for pending in self._pending.values())
+
+    def start_watching(self, interval: float = DEFAULT_POLL_INTERVAL_SECONDS) -> None:
+        """在后台任务中按间隔轮询输出目录（扫描在工作线程中进行，不阻塞入队）。"""
+        if self.output_dir is None:
+            return
+        async def watch() -> None:
+            while True:
+                matched = await asyncio.to_thread(self.poll)
+                if matched:
+                    logger.debug(f"[出图收集] 新匹配 {matched} 张图片，累计 {self.images_matched} 张。")
+                await asyncio.sleep(interval)
+        self._watch_task = asyncio.create_task(watch(), name="出图收集")
+        logger.info(f"[出图收集] 开始监视输出目录: {self.output_dir}")
+
+    async def finish(self, timeout: float, interval: float = DEFAULT_POLL_INTERVAL_SECONDS) -> None:
+        """
+        入队结束后继续等待出图，直到所有提示词都有图片或超过 timeout 秒，然后停止监视。
+        """
+        if self.output_dir is None:
+            return
+        deadline = time.monotonic() + timeout
+        while True:
+            await asyncio.to_thread(self.poll)
+            missing = self.missing_count
+            if missing == 0 or time.monotonic() >= deadline:
+                break
+            logger.info(f"[出图收集] 还有 {missing} 个提示词尚未出图，继续等待（最多 {deadline - time.monotonic():.0f} 秒）。")
+            await asyncio.sleep(min(interval, max(0.0, deadline - time.monotonic())))
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+
+    def summary(self) -> Dict[str, Any]:
+        """汇总：入队/出图数量、每分钟出图数、入队到出图延迟（秒）的 p50/p95/最大值。"""
+        with self._lock:
+            latencies = sorted(
+                max(0.0, entry.first_image_at - entry.enqueued_at) for entry in self.entries if entry.first_image_at is not None
+            )
+            produced = len(latencies)
+            first_enqueued = min((entry.enqueued_at for entry in self.entries), default=self.started_at)
+        elapsed = (self.last_image_at - first_enqueued) if self.last_image_at is not None else 0.0
+        return {
+            "prompts": len(self.entries),
+            "prompts_with_images": produced,
+            "prompts_missing": len(self.entries) - produced,
+            "images_seen": self.images_seen,
+            "images_matched": self.images_matched,
+            "images_unmatched": len(self.unmatched_images),
+            "images_unreadable": len(self.unreadable_images),
+            "images_per_minute": self.images_matched / elapsed * 60 if elapsed > 0 else 0.0,
+            "latency_p50_s": percentile(latencies, 0.50),
+            "latency_p95_s": percentile(latencies, 0.95),
+            "latency_max_s": latencies[-1] if latencies else 0.0,
+        }
+
+    def missing_entries(self) -> List[LedgerEntry]:
+        """没有出图的入队记录（按入队顺序）。"""
+        with self._lock:
+            return [entry for entry in self.entries if entry.images == 0]
+
+    def log_summary(self, max_missing: int = 20) -> None:
+        """输出出图统计，并列出前 max_missing 个没有出图的提示词。"""
+        stats = self.summary()
+        logger.info("--- 出图收集结果 ---")
+        logger.info(
+            f"入队提示词 {stats['prompts']} 个，已出图 {stats['prompts_with_images']} 个，未出图 {stats['prompts_missing']} 个；"
+            f"新图片 {stats['images_seen']} 张（匹配 {stats['images_matched']} 张，未匹配 {stats['images_unmatched']} 张）"
+        )
+        logger.info(
+            f"每分钟出图 {stats['images_per_minute']:.2f} 张；入队到出图延迟 p50 {stats['latency_p50_s']:.1f} 秒，"
+            f"p95 {stats['latency_p95_s']:.1f} 秒，最大 {stats['latency_max_s']:.1f} 秒"
+        )
+        missing = self.missing_entries()
+        for entry in missing[:max_missing]:
+            logger.warning(f"未出图：第 {entry.chunk + 1} 个分块第 {entry.line + 1} 行: {entry.prompt[:80]}")
+        if len(missing) > max_missing:
+            logger.warning(f"……另有 {len(missing) - max_missing} 个提示词未出图，完整列表见报告文件。")
+
+    def write_report(self, report_path: Path) -> Path:
+        """写出 JSON 报告（汇总 + 未出图的提示词 + 未匹配的图片），返回文件路径。"""
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        report = {
+            "summary": self.summary(),
+            "missing": [{"chunk": e.chunk, "line": e.line, "prompt": e.prompt} for e in self.missing_entries()],
+            "unmatched_images": list(self.unmatched_images),
+            "unreadable_images": list(self.unreadable_images),
+        }
+        with open(str(report_path), "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f"出图收集报告已写出: {report_path}")
+        return report_path
+
+    def close(self) -> None:
+        if self._ledger_file is not None and not self._ledger_file.closed:
+            self._ledger_file.close()
+
+
+def default_harvest_paths(timestamp: Optional[str] = None) -> Tuple[Path, Path]:
+    """本次运行的入队记录与报告文件路径（cache/harvest 下，按时间戳命名）。"""
+    timestamp = timestamp or datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    return DEFAULT_HARVEST_DIR / f"ledger_{timestamp}.jsonl", DEFAULT_HARVEST_DIR / f"report_{timestamp}.json"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="将 WebUI 输出目录中的图片与入队记录对照，统计出图情况。")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    watch_parser = subparsers.add_parser("watch", help="对照输出目录（含已有图片）与入队记录，可持续等待出图。")
+    watch_parser.add_argument("output_dir", type=Path)
+    watch_parser.add_argument("--ledger", type=Path, required=True, help="main.py --harvest 写出的入队记录。")
+    watch_parser.add_argument("--timeout", type=float, default=0.0, help="等待仍未出图的提示词的最长秒数。")
+    watch_parser.add_argument("--interval", type=float, default=DEFAULT_POLL_INTERVAL_SECONDS, help="轮询间隔（秒）。")
+    watch_parser.add_argument("--report", type=Path, default=None, help="JSON 报告路径。")
+    args = parser.parse_args()
+
+    harvester = OutputHarvester(args.output_dir, include_existing=True)
+    logger.info(f"已读取 {harvester.load_ledger(args.ledger)} 条入队记录。")
+
+    async def run() -> None:
+        await harvester.finish(args.timeout, args.interval)
+
+    asyncio.run(run())
+    harvester.log_summary()
+    if args.report:
+        harvester.write_report(args.report)
+
+
+if __name__ == "__main__":
+    main()
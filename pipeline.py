@@ -0,0 +1,188 @@
+# filename: pipeline.py
+# 融合流水线：处理文档.txt → 加前缀 → 分块 → 入队，全程流式，默认不落地任何中间文件
+import asyncio
+import threading
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, Optional, Tuple
+from loguru import logger
+from chunker import DEFAULT_LINES_PER_CHUNK, ChunkSize, iter_text_chunks
+from enqueue_backends import EnqueueBackend, ChunkItem
+from prefix_adder import iter_prefixed_lines
+from trace_spans import TRACER
+
+# 读取线程最多领先入队多少个分块；峰值内存约为 (该值 + 后端在途数) × 分块大小，与输入文件大小无关
+DEFAULT_PREFETCH_CHUNKS = 2
+
+_END_OF_STREAM = object()
+
+
+class _ProducerFailure:
+    """包装读取线程中抛出的异常，交给事件循环一侧重新抛出。"""
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+async def iterate_in_thread(iterable: Iterable[Any], max_prefetch: int = DEFAULT_PREFETCH_CHUNKS) -> AsyncIterator[Any]:
+    """
+    在工作线程中遍历同步可迭代对象（文件读取等阻塞操作），通过有界队列交给事件循环。
+    队列满时读取线程暂停，因此最多只有 max_prefetch 个元素在内存中排队；事件循环不会被磁盘读取阻塞。
+
+    Args:
+        iterable (Iterable[Any]): 同步可迭代对象。
+        max_prefetch (int): 队列容量。
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, max_prefetch))
+    stop_event = threading.Event()
+
+    def put(item: Any) -> None:
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def produce() -> None:
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if stop_event.is_set():
+                    break
+                put(item)
+        except BaseException as e:
+            put(_ProducerFailure(e))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+            put(_END_OF_STREAM)
+
+    producer = asyncio.ensure_future(asyncio.to_thread(produce))
+    try:
+        while True:
+            item = await queue.get()
+            if item is _END_OF_STREAM:
+                break
+            if isinstance(item, _ProducerFailure):
+                raise item.error
+            yield item
+    finally:
+        # 消费方提前结束时：通知读取线程停止，并清空队列以免其阻塞在 put 上
+        stop_event.set()
+        while not producer.done():
+            while not queue.empty():
+                queue.get_nowait()
+            await asyncio.sleep(0.01)
+        await producer
+
+
+async def _prepend(first: Any, rest: AsyncIterator[Any]) -> AsyncIterator[Any]:
+    """在异步迭代器前补回已取出的第一个元素。"""
+    yield first
+    async for item in rest:
+        yield item
+
+
+def _tee_lines_to_file(lines: Iterable[str], output_file_path: Path) -> Iterator[str]:
+    """边产出行，边将其写入文件（用于按需落地 总行数.txt）。"""
+    with open(str(output_file_path), 'w', encoding='utf-8') as outfile:
+        for line in lines:
+            outfile.write(line)
+            yield line
+
+
+def iter_source_chunks(
+    prefix: str,
+    input_file_path: Path,
+    lines_per_chunk: ChunkSize = DEFAULT_LINES_PER_CHUNK,
+    stats: Optional[Dict[str, int]] = None,
+    materialize_path: Optional[Path] = None,
+    audit_dir: Optional[Path] = None,
+    line_filter: Optional[Callable[[Iterable[str]], Iterator[str]]] = None,
+    start_index: int = 0
+) -> Iterator[ChunkItem]:
+    """
+    从原始文档流式产出已加前缀的分块。
+
+    Args:
+        prefix (str): 前缀字符串。
+        input_file_path (Path): 原始文档（处理文档.txt）路径。
+        lines_per_chunk (ChunkSize): 每个分块的行数，或返回下一块行数的函数。
+        stats (Optional[Dict[str, int]]): 行计数（total / success / failed），由 iter_prefixed_lines 实时更新。
+        materialize_path (Optional[Path]): 如指定，同时写出完整的加前缀文件（总行数.txt）。
+        audit_dir (Optional[Path]): 如指定，同时将每个分块存入该目录下的分块缓存。
+        line_filter (Optional[Callable]): 分块前的行过滤器（如提示词去重），落地文件仍包含全部行。
+        start_index (int): 第一个分块的序号。
+    """
+    lines = iter_prefixed_lines(prefix, str(input_file_path), stats)
+    if materialize_path is not None:
+        lines = _tee_lines_to_file(lines, materialize_path)
+    if line_filter is not None:
+        lines = line_filter(lines)
+    yield from iter_text_chunks(lines, lines_per_chunk, audit_dir, source=str(input_file_path), start_index=start_index)
+
+
+async def run_chunk_stream(
+    chunks: Iterable[ChunkItem],
+    backend: EnqueueBackend,
+    max_prefetch: int = DEFAULT_PREFETCH_CHUNKS,
+    source_label: str = "输入"
+) -> Tuple[int, int]:
+    """
+    在工作线程中产出分块，第一个分块就绪后才启动后端并入队；来源为空时不会启动后端（不打开浏览器）。
+
+    Args:
+        chunks (Iterable[ChunkItem]): 同步的分块来源（读取文件、展开模板等）。
+        backend (EnqueueBackend): 尚未启动的入队后端。
+        max_prefetch (int): 读取线程最多领先的分块数。
+        source_label (str): 日志中的来源描述。
+
+    Returns:
+        Tuple[int, int]: (成功分块数, 失败分块数)
+    """
+    chunk_stream = iterate_in_thread(TRACER.iterate(chunks, "读取并生成分块"), max_prefetch)
+    try:
+        first_chunk = await anext(chunk_stream, None)
+        if first_chunk is None:
+            logger.info(f"{source_label} 没有可处理的行，跳过入队。")
+            return 0, 0
+
+        logger.info(f"第一个分块已就绪，启动 '{backend.name}' 后端入队（后续行仍在读取中）。")
+        async with backend:
+            return await backend.enqueue_chunks(_prepend(first_chunk, chunk_stream))
+    finally:
+        await chunk_stream.aclose()
+
+
+async def run_fused_pipeline(
+    prefix: str,
+    input_file_path: Path,
+    backend: EnqueueBackend,
+    lines_per_chunk: ChunkSize = DEFAULT_LINES_PER_CHUNK,
+    materialize_path: Optional[Path] = None,
+    audit_dir: Optional[Path] = None,
+    max_prefetch: int = DEFAULT_PREFETCH_CHUNKS,
+    line_filter: Optional[Callable[[Iterable[str]], Iterator[str]]] = None
+) -> Dict[str, int]:
+    """
+    单一入口的流式流水线：读取 → 加前缀 → 分块 → 入队。
+    读取在工作线程中进行，第一个分块产出后立即交给后端，后续行仍在读取中；
+    输入为空时不会启动后端（不打开浏览器）。
+
+    Args:
+        prefix (str): 前缀字符串。
+        input_file_path (Path): 原始文档路径。
+        backend (EnqueueBackend): 尚未启动的入队后端。
+        lines_per_chunk (ChunkSize): 每个分块的行数，或返回下一块行数的函数。
+        materialize_path (Optional[Path]): 如指定，同时写出完整的加前缀文件。
+        audit_dir (Optional[Path]): 如指定，同时将每个分块存入该目录下的分块缓存。
+        max_prefetch (int): 读取线程最多领先的分块数。
+        line_filter (Optional[Callable]): 分块前的行过滤器（在读取线程中执行）。
+
+    Returns:
+        Dict[str, int]: 行计数 total / success / failed 以及分块计数 chunks_success / chunks_failed。
+    """
+    stats: Dict[str, int] = {}
+    chunks = iter_source_chunks(prefix, input_file_path, lines_per_chunk, stats, materialize_path, audit_dir, line_filter)
+    chunks_success, chunks_failed = await run_chunk_stream(chunks, backend, max_prefetch, f"文件 '{input_file_path}'")
+    stats.update(chunks_success=chunks_success, chunks_failed=chunks_failed)
+    logger.info("--- 流水线处理结果 ---")
+    logger.info(f"总数量: {stats.get('total', 0)} 行，成功: {stats.get('success', 0)} 行，失败: {stats.get('failed', 0)} 行")
+    logger.info(f"分块入队：成功 {chunks_success} 个，失败 {chunks_failed} 个")
+    return stats
@@ -0,0 +1,288 @@
+# filename: png_parameters.py
+# 本地读取 PNG 中 WebUI 写入的 "parameters" 生成参数，无需解码像素，也无需在 WebUI 的“图片信息”页上传图片。
+# 读取方式：内存映射文件，按块长度逐块跳过（IDAT 像素数据只跳过不读取），只解码 tEXt/iTXt/zTXt 文本块。
+# 解析结果按 (路径, 文件大小, 修改时间) 缓存在 cache/png_parameters.json，命中时只需一次 stat，不读取文件内容。
+# 批量校验参考图片: python png_parameters.py 图片1.png 图片目录 ...
+import re
+import sys
+import json
+import mmap
+import zlib
+import struct
+import argparse
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from loguru import logger
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# WebUI 保存生成参数时使用的文本块关键字
+PARAMETERS_KEYWORD = "parameters"
+TEXT_CHUNK_TYPES = (b"tEXt", b"iTXt", b"zTXt")
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parent / "cache" / "png_parameters.json"
+
+# 参数行中 "键: 值" 对，值可以是带引号的字符串（内部可含逗号）
+PARAMETER_PAIR_PATTERN = re.compile(r'\s*([\w ]+):\s*("(?:\\.|[^\\"])+"|[^,]*)(?:,|$)')
+SIZE_PATTERN = re.compile(r"^(\d+)x(\d+)$")
+
+# 参数行中的键 → 文生图接口字段及类型
+PAYLOAD_FIELDS = {
+    "Steps": ("steps", int),
+    "Sampler": ("sampler_name", str),
+    "Schedule type": ("scheduler", str),
+    "CFG scale": ("cfg_scale", float),
+    "Seed": ("seed", int),
+    "Denoising strength": ("denoising_strength", float),
+    "Hires upscale": ("hr_scale", float),
+    "Hires steps": ("hr_second_pass_steps", int),
+    "Hires upscaler": ("hr_upscaler", str),
+}
+# 参数行中的键 → override_settings 中的设置项及类型
+OVERRIDE_SETTING_FIELDS = {
+    "Model": ("sd_model_checkpoint", str),
+    "Clip skip": ("CLIP_stop_at_last_layers", int),
+    "VAE": ("sd_vae", str),
+}
+
+
+def iter_png_text_chunks(image_path: Path) -> Iterator[Tuple[str, str]]:
+    """
+    逐个产出 PNG 中的文本块 (关键字, 文本)。
+    只读取块头和文本块内容，其余块（包括像素数据）按长度直接跳过。
+
+    Raises:
+        ValueError: 文件不是 PNG 或块结构损坏。
+    """
+    with open(str(image_path), "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[:len(PNG_SIGNATURE)] != PNG_SIGNATURE:
+                raise ValueError(f"不是 PNG 文件: {image_path}")
+            position = len(PNG_SIGNATURE)
+            size = len(data)
+            while position + 8 <= size:
+                length, chunk_type = struct.unpack(">I4s", data[position:position + 8])
+                body_start = position + 8
+                body_end = body_start + length
+                if body_end + 4 > size:
+                    raise ValueError(f"PNG 块 {chunk_type!r} 被截断: {image_path}")
+                if chunk_type in TEXT_CHUNK_TYPES:
+                    yield _decode_text_chunk(chunk_type, data[body_start:body_end])
+                elif chunk_type == b"IEND":
+                    return
+                position = body_end + 4 # 跳过块数据和 CRC
+
+
+def _decode_text_chunk(chunk_type: bytes, body: bytes) -> Tuple[str, str]:
+    """按 PNG 规范解码 tEXt（Latin-1）、zTXt（压缩 Latin-1）与 iTXt（可选压缩的 UTF-8）文本块。"""
+    keyword, _, rest = body.partition(b"\x00")
+    keyword_text = keyword.decode("latin-1")
+    if chunk_type == b"tEXt":
+        return keyword_text, rest.decode("latin-1")
+    if chunk_type == b"zTXt":
+        # rest[0] 为压缩方法（只有 0 = zlib）
+        return keyword_text, zlib.decompress(rest[1:]).decode("latin-1")
+    # iTXt: 压缩标志, 压缩方法, 语言标签\0, 翻译后的关键字\0, 文本
+    compressed = rest[0] == 1
+    _, _, rest = rest[2:].partition(b"\x00")
+    _, _, text = rest.partition(b"\x00")
+    if compressed:
+        text = zlib.decompress(text)
+    return keyword_text, text.decode("utf-8", errors="replace")
+
+
+def read_png_parameters(image_path: Path) -> Optional[str]:
+    """读取 PNG 中的 "parameters" 文本，没有则返回 None。"""
+    for keyword, text in iter_png_text_chunks(image_path):
+        if keyword == PARAMETERS_KEYWORD:
+            return text
+    return None
+
+
+def parse_generation_parameters(text: str) -> Dict[str, Any]:
+    """
+    解析 WebUI 的生成参数文本：
+        正向提示词（可多行）
+        Negative prompt: 反向提示词（可多行）
+        Steps: 20, Sampler: Euler a, CFG scale: 7, Seed: 913820330, Size: 512x768, ...
+
+    Returns:
+        Dict[str, Any]: {"prompt": ..., "negative_prompt": ..., 以及最后一行的各个 "键": "值"}
+    """
+    lines = text.strip().split("\n")
+    settings: Dict[str, str] = {}
+    # 最后一行至少包含 3 个 "键: 值" 对才视为参数行（与 WebUI 的判断一致）
+    if lines and len(PARAMETER_PAIR_PATTERN.findall(lines[-1])) >= 3:
+        for key, value in PARAMETER_PAIR_PATTERN.findall(lines.pop()):
+            value = value.strip()
+            if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+                try:
+                    value = json.loads(value)
+                except json.JSONDecodeError:
+                    value = value[1:-1]
+            settings[key.strip()] = value
+
+    prompt_lines: List[str] = []
+    negative_lines: List[str] = []
+    in_negative = False
+    for line in lines:
+        if line.startswith("Negative prompt:"):
+            in_negative = True
+            line = line[len("Negative prompt:"):].strip()
+        (negative_lines if in_negative else prompt_lines).append(line)
+
+    result: Dict[str, Any] = {
+        "prompt": "\n".join(prompt_lines).strip(),
+        "negative_prompt": "\n".join(negative_lines).strip(),
+    }
+    result.update(settings)
+    return result
+
+
+def parameters_to_payload(parameters: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    将解析后的生成参数转换为文生图接口的请求体（可作为 HttpApiEnqueueBackend 的 base_payload）。
+    无法识别或转换失败的字段会被忽略；种子不写入，由入队时的随机种子决定。
+    """
+    payload: Dict[str, Any] = {
+        "prompt": parameters.get("prompt", ""),
+        "negative_prompt": parameters.get("negative_prompt", ""),
+    }
+    override_settings: Dict[str, Any] = {}
+    for key, value in parameters.items():
+        try:
+            if key in PAYLOAD_FIELDS:
+                field, cast = PAYLOAD_FIELDS[key]
+                payload[field] = cast(value)
+            elif key in OVERRIDE_SETTING_FIELDS:
+                field, cast = OVERRIDE_SETTING_FIELDS[key]
+                override_settings[field] = cast(value)
+        except ValueError:
+            logger.warning(f"生成参数 '{key}: {value}' 无法转换，已忽略。")
+
+    size_match = SIZE_PATTERN.match(str(parameters.get("Size", "")))
+    if size_match:
+        payload["width"], payload["height"] = int(size_match.group(1)), int(size_match.group(2))
+    if "Hires upscale" in parameters or "Hires upscaler" in parameters:
+        payload["enable_hr"] = True
+    if override_settings:
+        payload["override_settings"] = override_settings
+    # 参考图片的种子只对原图有效，批量入队时使用随机种子
+    payload.pop("seed", None)
+    return payload
+
+
+def reference_payload(reference_parameters: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    由参考图片的生成参数文本构造 API 后端的基础请求参数。
+    与浏览器流程一致去掉提示词：提示词全部来自“提示词输入列表”。没有参数时返回 None。
+    """
+    if not reference_parameters:
+        return None
+    payload = parameters_to_payload(parse_generation_parameters(reference_parameters))
+    payload.pop("prompt", None)
+    return payload
+
+
+class PngParametersCache:
+    """
+    按 PNG 文件路径缓存其 "parameters" 文本，同一张参考图片只需解析一次。
+    每个条目记录解析时的文件大小与修改时间（纳秒），两者任一变化即视为图片已被替换，重新解析。
+    """
+    def __init__(self, cache_path: Path = DEFAULT_CACHE_PATH):
+        """
+        Args:
+            cache_path (Path): 缓存文件路径（JSON）。
+        """
+        self.cache_path = cache_path
+        self.entries: Dict[str, Dict[str, Any]] = {} # 绝对路径 -> {"size", "mtime_ns", "parameters"}
+        self._dirty = False
+        if cache_path.exists():
+            try:
+                with open(str(cache_path), "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"PNG 参数缓存读取失败，将重新解析: {e}")
+
+    def get(self, image_path: Path) -> Optional[str]:
+        """返回图片的 "parameters" 文本（未缓存或图片已变化时读取 PNG 并写入缓存），没有参数时返回 None。"""
+        key = str(image_path.resolve())
+        stat = image_path.stat()
+        entry = self.entries.get(key)
+        if entry is not None and entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+            logger.debug(f"PNG 参数缓存命中: {image_path.name}")
+            return entry.get("parameters")
+        text = read_png_parameters(image_path)
+        self.entries[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "parameters": text}
+        self._dirty = True
+        return text
+
+    def save(self) -> None:
+        """有新条目时写回缓存文件。"""
+        if not self._dirty:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.cache_path.with_suffix(".tmp")
+        with open(str(temp_path), "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
+        temp_path.replace(self.cache_path)
+        self._dirty = False
+
+
+def load_reference_parameters(image_path: Path, cache_path: Path = DEFAULT_CACHE_PATH) -> Optional[str]:
+    """
+    读取参考图片的生成参数文本（带缓存）。图片不存在、不是 PNG 或没有参数时记录警告并返回 None。
+    """
+    if not image_path.exists():
+        logger.warning(f"参考图片不存在: {image_path}")
+        return None
+    cache = PngParametersCache(cache_path)
+    try:
+        text = cache.get(image_path)
+    except (ValueError, zlib.error) as e:
+        logger.warning(f"参考图片解析失败: {e}")
+        return None
+    cache.save()
+    if text is None:
+        logger.warning(f"参考图片中没有 '{PARAMETERS_KEYWORD}' 生成参数: {image_path.name}")
+    return text
+
+
+def iter_png_files(paths: List[Path]) -> Iterator[Path]:
+    """展开命令行中的文件和目录，产出其中的 PNG 文件。"""
+    for path in paths:
+        if path.is_dir():
+            yield from sorted(p for p in path.iterdir() if p.suffix.lower() == ".png")
+        else:
+            yield path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量读取并校验 PNG 参考图片中的 WebUI 生成参数。")
+    parser.add_argument("paths", type=Path, nargs="+", help="PNG 文件或包含 PNG 的目录。")
+    parser.add_argument("--show", action="store_true", help="输出每张图片解析后的参数。")
+    args = parser.parse_args()
+
+    cache = PngParametersCache()
+    valid = invalid = 0
+    for image_path in iter_png_files(args.paths):
+        try:
+            text = cache.get(image_path)
+        except (OSError, ValueError, zlib.error) as e:
+            logger.error(f"{image_path}: 读取失败 - {e}")
+            invalid += 1
+            continue
+        if text is None:
+            logger.warning(f"{image_path}: 没有生成参数")
+            invalid += 1
+            continue
+        parameters = parse_generation_parameters(text)
+        valid += 1
+        logger.info(f"{image_path}: {parameters.get('Size', '?')}，{parameters.get('Sampler', '?')}，{parameters.get('Steps', '?')} 步，模型 {parameters.get('Model', '?')}")
+        if args.show:
+            print(json.dumps(parameters_to_payload(parameters), ensure_ascii=False, indent=2))
+    cache.save()
+    logger.info(f"共校验 {valid + invalid} 张图片：{valid} 张包含生成参数，{invalid} 张无效。")
+    sys.exit(0 if invalid == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,41 @@
 import os
 import time
 import platform
+import argparse
 import subprocess
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from loguru import logger
 import sys
-from typing import Tuple, List
+from typing import Tuple, List, Dict, Iterator, Optional
 
 # 配置loguru日志
 # 日志文件会根据时间戳生成，防止覆盖，并限制大小为10MB
-# 1. 创建日志文件夹
 LOG_FOLDER = "prefix_adder_log"
-if not os.path.exists(LOG_FOLDER):
-    os.makedirs(LOG_FOLDER)
-# 2. 修改日志文件路径
 LOG_FILE_PATH = os.path.join(LOG_FOLDER, "prefix_adder_{time}.txt")
-logger.add(LOG_FILE_PATH, rotation="10 MB", level="INFO")
 
-# 默认将日志输出到控制台（stderr）
-logger.add(sys.stderr, level="INFO")
+# 并行模式下每个工作进程一次处理的字节范围大小（按行边界对齐）
+PARALLEL_RANGE_BYTES = 16 * 1024 * 1024
+
+# 退出码（--batch 模式下供 cron / 任务调度器判断结果；2 为 argparse 的参数错误）
+EXIT_SUCCESS = 0          # 全部行处理成功
+EXIT_FAILURE = 1          # 运行错误
+EXIT_INPUT_ERROR = 3      # 前缀或输入文件缺失、无法读取
+EXIT_PARTIAL_FAILURE = 4  # 部分行处理失败
+
+def setup_prefix_adder_logger():
+    """
+    配置本脚本的日志输出（文件 + 控制台）。
+    仅在作为独立脚本运行时调用，被 main.py 等模块导入时不会改动调用方的日志配置。
+    """
+    # 1. 创建日志文件夹
+    if not os.path.exists(LOG_FOLDER):
+        os.makedirs(LOG_FOLDER)
+    # 2. 修改日志文件路径
+    logger.add(LOG_FILE_PATH, rotation="10 MB", level="INFO")
+
+    # 默认将日志输出到控制台（stderr）
+    logger.add(sys.stderr, level="INFO")
 
 # --- 文件系统工具函数 (从 my_tools 引入，用于支持文件打开) ---
 
@@ -40,16 +58,19 @@ def open_output_files_automatically(
         file_paths (List[str]): 包含要打开的文件路径的列表。
         logger_obj (logger): Loguru logger 实例。
     """
-    # 默认不检查环境变量 DISABLE_AUTO_OPEN，因为此模块更简单
+    # 与 my_tools 一致：DISABLE_AUTO_OPEN=1 时不自动打开（无人值守运行与基准测试）
+    if os.getenv("DISABLE_AUTO_OPEN", "0") == "1":
+        logger_obj.info("已禁用自动打开文件功能。")
+        return
 
-    # 定义延迟时间 (秒)，避免文件刚写入就尝试打开导致权限问题
+    # 定义延迟时间 (秒)，避免文件刚写入就尝试打开导致权限问题；所有文件打开前只等待一次
     OPEN_FILE_DELAY_SECONDS = 0.5 
 
-    for file_path_str in file_paths:
-        # 尝试打开前增加延迟
-        logger_obj.debug(f"尝试打开文件 '{normalize_drive_letter(file_path_str)}' 前，等待 {OPEN_FILE_DELAY_SECONDS} 秒。")
+    if file_paths:
+        logger_obj.debug(f"尝试打开 {len(file_paths)} 个文件前，等待 {OPEN_FILE_DELAY_SECONDS} 秒。")
         time.sleep(OPEN_FILE_DELAY_SECONDS)
 
+    for file_path_str in file_paths:
         actual_path_to_open = file_path_str
         # 注意: 此简化模块不处理 Loguru 的 .zip 压缩日志文件特殊情况
 
@@ -159,6 +180,36 @@ def get_prefix(prefix_file_path: str) -> str | None:
         logger.error(f"读取前缀文件时发生未知错误: {e}")
         return None
 
+def add_prefix_to_line(prefix: str, line: str) -> str:
+    """
+    移除当前行末尾的换行符，然后加上前缀，最后再重新加上换行符。
+    """
+    return prefix + line.strip('\n') + '\n'
+
+def iter_prefixed_lines(prefix: str, input_file_path: str, stats: Optional[Dict[str, int]] = None) -> Iterator[str]:
+    """
+    流式读取输入文件，逐行加上前缀后产出，不写任何文件。
+    stats 字典（如提供）会实时更新 total / success / failed 计数，与 process_and_add_prefix 的返回值含义一致。
+    """
+    if stats is None:
+        stats = {}
+    stats.update(total=0, success=0, failed=0)
+
+    try:
+        with open(input_file_path, 'r', encoding='utf-8') as infile:
+            for line in infile:
+                stats["total"] += 1
+                try:
+                    processed_line = add_prefix_to_line(prefix, line)
+                except Exception as e:
+                    stats["failed"] += 1
+                    logger.warning(f"处理第 {stats['total']} 行时失败: {line.strip()} | 错误: {e}")
+                    continue
+                stats["success"] += 1
+                yield processed_line
+    except FileNotFoundError:
+        logger.error(f"错误：输入文件未找到: {os.path.basename(input_file_path)}")
+
 def process_and_add_prefix(prefix: str, input_file_path: str, output_file_path: str) -> Tuple[int, int, int]:
     """
     给输入文件的每一行加上前缀，并写入输出文件。
@@ -174,9 +225,7 @@ def process_and_add_prefix(prefix: str, input_file_path: str, output_file_path:
             for line in infile:
                 total_lines += 1
                 try:
-                    # 移除当前行末尾的换行符，然后加上前缀，最后再重新加上换行符
-                    processed_line = prefix + line.strip('\n') + '\n'
-                    outfile.write(processed_line)
+                    outfile.write(add_prefix_to_line(prefix, line))
                     success_lines += 1
                 except Exception as e:
                     logger.warning(f"处理第 {total_lines} 行时失败: {line.strip()} | 错误: {e}")
@@ -189,9 +238,141 @@ def process_and_add_prefix(prefix: str, input_file_path: str, output_file_path:
     failed_lines = total_lines - success_lines
     return total_lines, success_lines, failed_lines
 
+# --- 并行处理（大文件） ---
+
+def split_line_aligned_ranges(input_file_path: str, range_bytes: int = PARALLEL_RANGE_BYTES) -> List[Tuple[int, int]]:
+    """
+    将文件切分为约 range_bytes 大小的字节范围 [start, end)，每个范围都在换行符之后结束，不会切断任何一行。
+    """
+    file_size = os.path.getsize(input_file_path)
+    ranges = []
+    start = 0
+    with open(input_file_path, 'rb') as f:
+        while start < file_size:
+            target = start + range_bytes
+            if target >= file_size:
+                ranges.append((start, file_size))
+                break
+            f.seek(target)
+            f.readline() # 前进到下一个换行符之后
+            end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+def prefix_byte_range(input_file_path: str, start: int, end: int, prefix_bytes: bytes) -> Tuple[bytes, int, int, int]:
+    """
+    工作进程：读取一个字节范围，在字节层面一次性拼接出加前缀后的内容。
+    结果与逐行的 add_prefix_to_line 一致（与文本模式的通用换行一样，\r\n 与单独的 \r 都视为换行并统一为 \n）；
+    无法按 UTF-8 解码的行计为失败并跳过。
+
+    Returns:
+        Tuple[bytes, int, int, int]: (加前缀后的内容, 总行数, 成功行数, 失败行数)
+    """
+    with open(input_file_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    if not data:
+        return b"", 0, 0, 0
+    if b"\r" in data:
+        data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    if data.endswith(b"\n"):
+        data = data[:-1] # 末尾换行在拼接后统一补回
+    try:
+        data.decode('utf-8')
+    except UnicodeDecodeError:
+        return _prefix_lines_skipping_invalid(data.split(b"\n"), prefix_bytes)
+    # 整块替换换行符即可给每一行加上前缀，无需逐行拆分与拼接
+    total = data.count(b"\n") + 1
+    return prefix_bytes + data.replace(b"\n", b"\n" + prefix_bytes) + b"\n", total, total, 0
+
+def _prefix_lines_skipping_invalid(lines: List[bytes], prefix_bytes: bytes) -> Tuple[bytes, int, int, int]:
+    """字节范围中含有非 UTF-8 内容时逐行处理，跳过无法解码的行。"""
+    valid_lines = []
+    for line in lines:
+        try:
+            line.decode('utf-8')
+            valid_lines.append(line)
+        except UnicodeDecodeError:
+            pass
+    total = len(lines)
+    if not valid_lines:
+        return b"", total, 0, total
+    separator = b"\n" + prefix_bytes
+    return prefix_bytes + separator.join(valid_lines) + b"\n", total, len(valid_lines), total - len(valid_lines)
+
+def iter_prefixed_blocks_parallel(
+    prefix: str,
+    input_file_path: str,
+    workers: Optional[int] = None,
+    stats: Optional[Dict[str, int]] = None,
+    range_bytes: int = PARALLEL_RANGE_BYTES
+) -> Iterator[bytes]:
+    """
+    多进程并行加前缀，按原文件顺序产出加前缀后的字节块，可直接写入文件或继续流式处理。
+    同时在途的范围数限制为 2 × 工作进程数，内存占用与文件大小无关。
+
+    Args:
+        prefix (str): 前缀字符串。
+        input_file_path (str): 输入文件路径。
+        workers (Optional[int]): 工作进程数，None 表示 CPU 核数。
+        stats (Optional[Dict[str, int]]): 行计数（total / success / failed），随每个字节块更新。
+        range_bytes (int): 每个任务处理的字节数。
+    """
+    if stats is None:
+        stats = {}
+    stats.update(total=0, success=0, failed=0)
+    prefix_bytes = prefix.encode('utf-8')
+    ranges = split_line_aligned_ranges(input_file_path, range_bytes)
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        next_range = 0
+        while next_range < len(ranges) or pending:
+            while next_range < len(ranges) and len(pending) < workers * 2:
+                start, end = ranges[next_range]
+                pending.append(executor.submit(prefix_byte_range, input_file_path, start, end, prefix_bytes))
+                next_range += 1
+            block, total, success, failed = pending.popleft().result()
+            stats["total"] += total
+            stats["success"] += success
+            stats["failed"] += failed
+            if failed:
+                logger.warning(f"有 {failed} 行无法按 UTF-8 解码，已跳过。")
+            yield block
+
+def process_and_add_prefix_parallel(prefix: str, input_file_path: str, output_file_path: str, workers: Optional[int] = None) -> Tuple[int, int, int]:
+    """
+    process_and_add_prefix 的多进程版本：按行对齐的字节范围并行处理，结果按顺序写入输出文件。
+    返回 (总行数, 成功处理行数, 失败行数)。
+    读写失败或工作进程出错时异常直接抛出（输出文件可能不完整），由调用方决定退出码，不会被当作处理成功。
+    """
+    stats: Dict[str, int] = {"total": 0, "success": 0, "failed": 0}
+    with open(output_file_path, 'wb') as outfile:
+        for block in iter_prefixed_blocks_parallel(prefix, input_file_path, workers, stats):
+            outfile.write(block)
+    return stats["total"], stats["success"], stats["failed"]
+
 # --- 主函数 ---
 
-def main():
+def main(argv: Optional[List[str]] = None) -> int:
+    """脚本入口，返回退出码。"""
+    parser = argparse.ArgumentParser(description="给 处理文档.txt 的每一行加上 前缀.txt 中的前缀，写出 总行数.txt。")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="工作进程数：1 为逐行处理（默认），大于 1 时按字节范围多进程并行处理，0 表示使用全部 CPU 核。")
+    parser.add_argument("--batch", action="store_true",
+                        help="无人值守模式：不创建示例文件、不打开文件、不等待回车，按结果返回退出码（0 成功，3 输入缺失，4 部分行失败）。")
+    parser.add_argument("--prefix", default=None, help="直接指定前缀字符串（不读取前缀文件）。")
+    parser.add_argument("--prefix-file", default=None, help="前缀文件路径，默认为脚本目录下的 前缀.txt。")
+    parser.add_argument("--input", default=None, help="输入文件路径，默认为脚本目录下的 处理文档.txt。")
+    parser.add_argument("--output", default=None, help="输出文件路径，默认为脚本目录下的 总行数.txt。")
+    args = parser.parse_args(argv)
+    if args.batch:
+        # 与 my_tools.enable_batch_mode 一致：同时关闭自动打开文件
+        os.environ["BATCH_MODE"] = "1"
+        os.environ["DISABLE_AUTO_OPEN"] = "1"
+
+    setup_prefix_adder_logger()
     logger.info("--- 任务启动 ---")
     
     # 文件路径定义
@@ -209,44 +390,64 @@ def main():
         SCRIPT_DIR = os.getcwd()
         logger.warning(f"无法确定脚本路径（可能是交互式环境），文件将使用当前工作目录: {SCRIPT_DIR}")
     
-    # 将文件名转换为基于脚本目录的绝对路径
-    PREFIX_FILE = os.path.join(SCRIPT_DIR, PREFIX_FILE_NAME)
-    INPUT_FILE = os.path.join(SCRIPT_DIR, INPUT_FILE_NAME)
-    OUTPUT_FILE = os.path.join(SCRIPT_DIR, OUTPUT_FILE_NAME)
-
-    # 1. 文件检查与准备 (自动创建并尝试打开文件供检查)
-    if not prepare_files(PREFIX_FILE, INPUT_FILE):
-        logger.error("文件准备失败，任务中止。")
-        return
-    
-    # 2. 暂停等待用户确认，计时从此刻开始
-    try:
-        print("\n" + "=" * 50)
-        # 提示用户文件所在目录，增强用户体验
-        print(f"文件已尝试自动打开，请检查并编辑位于目录 '{SCRIPT_DIR}' 下的文件。")
-        input("检查完毕，请按回车键（Enter）继续处理...")
-        print("=" * 50 + "\n")
-    except EOFError:
-        logger.warning("在非交互式环境中运行，跳过回车等待。")
-    except KeyboardInterrupt:
-        logger.warning("用户取消操作。")
-        return
+    # 将文件名转换为基于脚本目录的绝对路径（命令行指定的路径优先）
+    PREFIX_FILE = args.prefix_file or os.path.join(SCRIPT_DIR, PREFIX_FILE_NAME)
+    INPUT_FILE = args.input or os.path.join(SCRIPT_DIR, INPUT_FILE_NAME)
+    OUTPUT_FILE = args.output or os.path.join(SCRIPT_DIR, OUTPUT_FILE_NAME)
+    INPUT_FILE_NAME = os.path.basename(INPUT_FILE)
+    OUTPUT_FILE_NAME = os.path.basename(OUTPUT_FILE)
+
+    if args.batch:
+        # 1-2. 无人值守：只检查文件是否存在，不创建示例文件、不打开文件、不等待确认
+        required_files = [INPUT_FILE] if args.prefix is not None else [PREFIX_FILE, INPUT_FILE]
+        missing = [path for path in required_files if not os.path.exists(path)]
+        if missing:
+            logger.error(f"输入文件不存在，任务中止: {', '.join(missing)}")
+            return EXIT_INPUT_ERROR
+    else:
+        # 1. 文件检查与准备 (自动创建并尝试打开文件供检查)
+        if not prepare_files(PREFIX_FILE, INPUT_FILE):
+            logger.error("文件准备失败，任务中止。")
+            return EXIT_INPUT_ERROR
+
+        # 2. 暂停等待用户确认，计时从此刻开始
+        try:
+            print("\n" + "=" * 50)
+            # 提示用户文件所在目录，增强用户体验
+            print(f"文件已尝试自动打开，请检查并编辑位于目录 '{SCRIPT_DIR}' 下的文件。")
+            input("检查完毕，请按回车键（Enter）继续处理...")
+            print("=" * 50 + "\n")
+        except EOFError:
+            logger.warning("在非交互式环境中运行，跳过回车等待。")
+        except KeyboardInterrupt:
+            logger.warning("用户取消操作。")
+            return EXIT_FAILURE
     
     start_time = time.time() # **计时开始节点：用户按下回车**
     logger.info(f"任务开始计时时间: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())}")
     
     # 3. 获取前缀
-    prefix_str = get_prefix(PREFIX_FILE)
+    prefix_str = args.prefix if args.prefix is not None else get_prefix(PREFIX_FILE)
     if prefix_str is None:
         logger.error("无法获取前缀，任务中止。")
         end_time_fail = time.time()
         logger.info(f"总处理时间: {end_time_fail - start_time:.4f} 秒 (失败中止)")
         logger.info(f"任务结束时间: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())}")
-        return
+        return EXIT_INPUT_ERROR
 
     # 4. 处理文档并添加前缀
     logger.info(f"开始处理文件 '{INPUT_FILE_NAME}'...")
-    total, success, failed = process_and_add_prefix(prefix_str, INPUT_FILE, OUTPUT_FILE)
+    if args.workers == 1:
+        total, success, failed = process_and_add_prefix(prefix_str, INPUT_FILE, OUTPUT_FILE)
+    else:
+        workers = args.workers or os.cpu_count()
+        logger.info(f"使用 {workers} 个工作进程并行处理。")
+        try:
+            total, success, failed = process_and_add_prefix_parallel(prefix_str, INPUT_FILE, OUTPUT_FILE, workers)
+        except Exception as e:
+            logger.error(f"并行处理文件时发生错误，输出文件 '{OUTPUT_FILE_NAME}' 可能不完整: {e}")
+            logger.info(f"总处理时间: {time.time() - start_time:.4f} 秒 (失败中止)")
+            return EXIT_FAILURE
 
     # 5. 任务结果汇总
     logger.info("--- 任务处理结果 ---")
@@ -268,6 +469,7 @@ def main():
     logger.info(f"总处理时间: {elapsed_time:.4f} 秒")
     logger.info(f"任务结束时间: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())}")
     logger.info("--- 任务结束 ---")
+    return EXIT_PARTIAL_FAILURE if failed > 0 else EXIT_SUCCESS
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,300 @@
+# filename: prompt_index.py
+# 跨运行的提示词去重索引：SQLite 中保存每条已入队提示词的 64 位去重键及首次/最近入队时间。
+# 去重键由生成上下文（参考图片及其中的生成参数）与规范化后的提示词共同决定：同一提示词换一张参考图片仍会生成。
+# 分块前按行查询，已生成过的提示词可跳过（skip）或仅统计（count）；分块确认入队后再写入索引，失败的分块不会被记录。
+# 入队后的索引写入（SQLite 提交）由后台写入线程批量执行，不阻塞事件循环。
+# 本次运行内的重复记在 SQLite 临时表中（超出页缓存后落到临时文件），内存占用不随行数增长。
+# 维护命令: python prompt_index.py stats | purge --expire-days 30 | import 总行数.txt [--image 参考图片.png]
+import re
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+from loguru import logger
+from enqueue_backends import ChunkItem
+from background_writer import BackgroundWriter
+
+DEFAULT_INDEX_PATH = Path(__file__).resolve().parent / "cache" / "prompt_index.sqlite3"
+# 去重模式：skip 跳过已生成的提示词；count 只统计重复数量，照常入队
+DEDUP_MODES = ("off", "skip", "count")
+# 每次批量查询的哈希数量（低于 SQLite 的参数个数上限）
+LOOKUP_BATCH_SIZE = 500
+# 计算参考图片摘要时每次读取的字节数
+IMAGE_READ_BLOCK_SIZE = 1 << 20
+SECONDS_PER_DAY = 86400
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+COMMA_PATTERN = re.compile(r"\s*,\s*")
+
+
+def normalize_prompt(line: str) -> str:
+    """规范化提示词：去掉首尾空白，合并连续空白，统一逗号两侧的空格。"""
+    line = WHITESPACE_PATTERN.sub(" ", line.strip())
+    return COMMA_PATTERN.sub(", ", line)
+
+
+def prompt_hash(line: str) -> int:
+    """规范化后提示词的 64 位哈希（有符号整数，可直接作为 SQLite 的 INTEGER 主键）。"""
+    digest = hashlib.blake2b(normalize_prompt(line).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def dedup_key(line: str, context: str = "") -> int:
+    """去重键：生成上下文 + 规范化后提示词的 64 位哈希。context 为空时与 prompt_hash 相同。"""
+    if not context:
+        return prompt_hash(line)
+    digest = hashlib.blake2b(f"{context}\n{normalize_prompt(line)}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def generation_context(image_path: Path) -> str:
+    """
+    参考图片对应的生成上下文：图片内容的摘要。生成参数（模型、采样器、尺寸、种子等）保存在图片中，
+    因此换图片或参数不同都会得到不同的上下文；图片只是改名或移动时上下文不变。图片无法读取时退回使用路径。
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(str(image_path), "rb") as f:
+            for block in iter(lambda: f.read(IMAGE_READ_BLOCK_SIZE), b""):
+                digest.update(block)
+    except OSError as e:
+        logger.warning(f"无法读取参考图片 '{image_path}'，去重改按图片路径区分: {e}")
+        return f"path:{Path(image_path).resolve()}"
+    return digest.hexdigest()
+
+
+class PromptIndex:
+    """
+    基于 SQLite 的提示词去重索引（WITHOUT ROWID 表，去重键即主键），千万级条目下按主键批量查询仍然很快。
+    过滤在读取线程中进行，记录在后台写入线程中进行，数据库操作由锁串行化。
+    """
+    def __init__(
+        self,
+        index_path: Path = DEFAULT_INDEX_PATH,
+        mode: str = "skip",
+        expire_days: Optional[float] = None,
+        context: str = ""
+    ):
+        """
+        Args:
+            index_path (Path): 索引数据库路径。
+            mode (str): "skip" 跳过已生成的提示词，"count" 只统计。
+            expire_days (Optional[float]): 超过该天数未再入队的提示词视为未生成过；None 表示永不过期。
+            context (str): 生成上下文（generation_context 的结果），参与去重键的计算。
+        """
+        if mode not in ("skip", "count"):
+            raise ValueError(f"未知的去重模式 '{mode}'，可选值: skip, count")
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        self.index_path = index_path
+        self.mode = mode
+        self.expire_days = expire_days
+        self.checked = 0 # 已检查的提示词行数
+        self.duplicates = 0 # 其中已生成过（或本次运行中重复）的行数
+        self.context = context
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(index_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA cache_size=-65536") # 64 MB 页缓存，千万级条目时减少随机读
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS prompts ("
+            "hash INTEGER PRIMARY KEY, first_seen INTEGER NOT NULL, last_seen INTEGER NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        # 本次运行已检查过的去重键：临时表只属于当前连接，关闭后自动删除
+        self._conn.execute("CREATE TEMP TABLE run_seen (hash INTEGER PRIMARY KEY) WITHOUT ROWID")
+        self._conn.commit()
+        self._writer = BackgroundWriter(
+            lambda batches: self.add_rows([row for rows in batches for row in rows]), "提示词去重索引"
+        )
+
+    def switch_context(self, context: str) -> None:
+        """
+        切换生成上下文（多图任务清单切换参考图片时调用），之后的过滤与记录都使用新上下文的去重键。
+        本次运行的重复检查同样按上下文区分，因为临时表中保存的是去重键。
+        """
+        self.context = context
+
+    def key(self, line: str) -> int:
+        """当前生成上下文下该行的去重键。"""
+        return dedup_key(line, self.context)
+
+    @property
+    def cutoff(self) -> int:
+        """未过期条目的最早 last_seen 时间戳；不过期时为 0。"""
+        if self.expire_days is None:
+            return 0
+        return int(time.time() - self.expire_days * SECONDS_PER_DAY)
+
+    def _lookup(self, hashes: List[int]) -> Set[int]:
+        """返回 hashes 中已存在且未过期的去重键。"""
+        found: Set[int] = set()
+        cutoff = self.cutoff
+        with self._lock:
+            for start in range(0, len(hashes), LOOKUP_BATCH_SIZE):
+                batch = hashes[start:start + LOOKUP_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT hash FROM prompts WHERE hash IN ({placeholders}) AND last_seen >= ?",
+                    (*batch, cutoff)
+                )
+                found.update(row[0] for row in rows)
+        return found
+
+    def _mark_seen(self, hashes: List[int]) -> List[bool]:
+        """将去重键记入本次运行的临时表，按顺序返回每个键是否为本次运行首次出现（批内重复同样识别）。"""
+        with self._lock:
+            first_seen = [
+                self._conn.execute("INSERT OR IGNORE INTO run_seen (hash) VALUES (?)", (line_hash,)).rowcount == 1
+                for line_hash in hashes
+            ]
+            self._conn.commit()
+        return first_seen
+
+    def _filter_batch(self, lines: List[str]) -> List[str]:
+        """检查一批行，返回应当入队的行（count 模式下原样返回）。"""
+        hashes = [self.key(line) if line.strip() else None for line in lines]
+        present = [h for h in hashes if h is not None]
+        known = self._lookup(present)
+        first_seen = iter(self._mark_seen(present))
+        kept: List[str] = []
+        for line, line_hash in zip(lines, hashes):
+            if line_hash is None:
+                kept.append(line)
+                continue
+            self.checked += 1
+            if not next(first_seen) or line_hash in known:
+                self.duplicates += 1
+                if self.mode == "skip":
+                    continue
+            kept.append(line)
+        return kept
+
+    def filter_lines(self, lines: Iterable[str]) -> Iterator[str]:
+        """
+        在分块之前按行过滤（用于融合流水线），分块大小不受去重影响。
+        每 LOOKUP_BATCH_SIZE 行查询一次数据库。
+        """
+        batch: List[str] = []
+        for line in lines:
+            batch.append(line)
+            if len(batch) >= LOOKUP_BATCH_SIZE:
+                yield from self._filter_batch(batch)
+                batch = []
+        if batch:
+            yield from self._filter_batch(batch)
+
+    def filter_chunks(
+        self,
+        chunks: Iterable[ChunkItem],
+        on_empty_chunk: Optional[Callable[[int], None]] = None
+    ) -> Iterator[ChunkItem]:
+        """
+        按分块过滤（用于 总行数.txt 的分块入队，分块与其字节范围保持一一对应）。
+        skip 模式下全部行都已生成过的分块不再产出，并调用 on_empty_chunk(分块序号)，便于检查点日志将其记为已完成。
+        """
+        for index, content in chunks:
+            kept = "".join(self._filter_batch(content.splitlines(keepends=True)))
+            if kept.strip():
+                yield index, kept
+            else:
+                logger.info(f"第 {index + 1} 个分块的提示词均已生成过，跳过。")
+                if on_empty_chunk is not None:
+                    on_empty_chunk(index)
+
+    def record(self, index: int, content: str, timings: Optional[Dict[str, float]] = None) -> None:
+        """
+        将已确认入队的分块中的提示词写入索引（由后台写入线程提交）。可直接注册为 EnqueueBackend 的分块监听器。
+
+        Args:
+            index (int): 分块序号（未使用，仅为兼容监听器签名）。
+            content (str): 分块文本。
+            timings (Optional[Dict[str, float]]): 各阶段耗时（未使用）。
+        """
+        now = int(time.time())
+        rows = [(self.key(line), now, now) for line in content.splitlines() if line.strip()]
+        if rows:
+            self._writer.submit(rows)
+
+    def add_rows(self, rows: List[tuple]) -> None:
+        """批量写入 (去重键, first_seen, last_seen)，已存在的条目只更新 last_seen。"""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO prompts (hash, first_seen, last_seen) VALUES (?, ?, ?) "
+                "ON CONFLICT(hash) DO UPDATE SET last_seen = excluded.last_seen",
+                rows
+            )
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        """删除过期条目，返回删除数量。未设置过期天数时不做任何事。"""
+        if self.expire_days is None:
+            return 0
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM prompts WHERE last_seen < ?", (self.cutoff,)).rowcount
+            self._conn.commit()
+        return deleted
+
+    def count(self) -> int:
+        """索引中的条目总数（包括已提交给写入线程的记录）。"""
+        self._writer.flush()
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM prompts").fetchone()[0]
+
+    def log_summary(self) -> None:
+        """输出本次运行的去重统计。"""
+        action = "已跳过" if self.mode == "skip" else "仍照常入队"
+        logger.info(f"提示词去重：检查 {self.checked} 行，其中 {self.duplicates} 行已生成过（{action}）。")
+
+    def close(self) -> None:
+        """写完尚未提交的记录后关闭数据库。"""
+        self._writer.close()
+        with self._lock:
+            self._conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="维护跨运行的提示词去重索引。")
+    parser.add_argument("--index", type=Path, default=DEFAULT_INDEX_PATH, help="索引数据库路径。")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="输出索引条目数。")
+    purge_parser = subparsers.add_parser("purge", help="删除超过指定天数未再入队的条目。")
+    purge_parser.add_argument("--expire-days", type=float, required=True)
+    import_parser = subparsers.add_parser("import", help="将已生成过的提示词文件导入索引。")
+    import_parser.add_argument("files", type=Path, nargs="+")
+    import_parser.add_argument("--image", type=Path, default=None, help="这些提示词所用的参考图片；不指定时导入为不区分图片的条目。")
+    args = parser.parse_args()
+
+    image = getattr(args, "image", None)
+    index = PromptIndex(
+        args.index, expire_days=getattr(args, "expire_days", None), context=generation_context(image) if image else ""
+    )
+    try:
+        if args.command == "purge":
+            logger.info(f"已删除 {index.purge_expired()} 条过期条目。")
+        elif args.command == "import":
+            now = int(time.time())
+            for file_path in args.files:
+                imported = 0
+                with open(str(file_path), "r", encoding="utf-8") as f:
+                    rows = []
+                    for line in f:
+                        if line.strip():
+                            rows.append((index.key(line), now, now))
+                        if len(rows) >= 100000:
+                            index.add_rows(rows)
+                            imported += len(rows)
+                            rows = []
+                    index.add_rows(rows)
+                    imported += len(rows)
+                logger.info(f"已从 '{file_path}' 导入 {imported} 行。")
+        logger.info(f"索引 '{args.index}' 共有 {index.count()} 条提示词。")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+# filename: prompt_templates.py
+# 提示词模板：{a|b|c} 多选一、__名称__ 引用通配符文件（wildcards/名称.txt，每行一个选项），可嵌套。
+# 转义只有 \{ \} \| \\ 四种；其余反斜杠原样保留（如 SD 提示词中常见的 \( \) 括号转义）。
+# 模板被解析为组合树，按“组合序号 → 提示词”的方式按需生成，不展开到内存或磁盘：
+#   - all 模式按顺序枚举全部组合；
+#   - random 模式用伪随机置换遍历组合序号，组合不重复，且只占常量内存（不记录已产出的序号）。
+# 预览组合数与样例: python prompt_templates.py 模板.txt [--limit 10] [--mode random]
+import re
+import random
+import argparse
+from bisect import bisect_right
+from itertools import accumulate
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+from loguru import logger
+
+DEFAULT_WILDCARD_DIR = Path(__file__).resolve().parent / "wildcards"
+EXPANSION_MODES = ("all", "random")
+# 通配符引用：__名称__，名称可包含子目录（如 __style/anime__）
+WILDCARD_PATTERN = re.compile(r"__([\w\-/.]+?)__")
+# 模板转义：反斜杠后为这些字符时表示字面字符，其余反斜杠原样保留
+TEMPLATE_ESCAPES = "{}|\\"
+# 通配符嵌套引用的最大深度（防止互相引用造成无限递归）
+MAX_WILDCARD_DEPTH = 16
+
+
+class TemplateError(ValueError):
+    """模板语法错误或通配符文件缺失。"""
+
+
+class Choice:
+    """多选一节点：options 中的每个选项是一个 Sequence。count 为所有选项组合数之和。"""
+    def __init__(self, options: List["Sequence"]):
+        self.options = options
+        self.offsets = [0] + list(accumulate(option.count for option in options))
+        self.count = self.offsets[-1]
+
+    def render(self, index: int, out: List[str]) -> None:
+        position = bisect_right(self.offsets, index) - 1
+        self.options[position].render(index - self.offsets[position], out)
+
+
+class Sequence:
+    """顺序节点：依次拼接文本与多选一节点。count 为各部分组合数之积。"""
+    def __init__(self, parts: List[Union[str, Choice]]):
+        self.parts = parts
+        self.count = 1
+        for part in parts:
+            if isinstance(part, Choice):
+                self.count *= part.count
+
+    def render(self, index: int, out: List[str]) -> None:
+        # 混合进制分解：最后一个多选一节点变化最快，与手写的 前缀 × 主体 × 风格 顺序一致
+        digits = []
+        for part in reversed(self.parts):
+            if isinstance(part, Choice):
+                index, digit = divmod(index, part.count)
+                digits.append(digit)
+        for part in self.parts:
+            if isinstance(part, Choice):
+                part.render(digits.pop(), out)
+            else:
+                out.append(part)
+
+
+class TemplateParser:
+    """将模板文本解析为组合树，通配符文件只读取并解析一次。"""
+    def __init__(self, wildcard_dir: Path = DEFAULT_WILDCARD_DIR):
+        self.wildcard_dir = wildcard_dir
+        self._wildcards: Dict[str, Choice] = {}
+        self._loading: List[str] = []
+
+    def parse(self, text: str) -> Sequence:
+        sequence, position = self._parse_sequence(text, 0, top_level=True)
+        return sequence
+
+    def _parse_sequence(self, text: str, position: int, top_level: bool = False):
+        """解析到 '|' 或 '}'（嵌套时）或文本结尾，返回 (Sequence, 结束位置)。"""
+        parts: List[Union[str, Choice]] = []
+        literal: List[str] = []
+
+        def flush_literal() -> None:
+            if literal:
+                parts.extend(self._split_wildcards("".join(literal)))
+                literal.clear()
+
+        while position < len(text):
+            char = text[position]
+            if char == "\\" and position + 1 < len(text) and text[position + 1] in TEMPLATE_ESCAPES:
+                literal.append(text[position + 1]) # \{ \| \} \\ 表示字面字符
+                position += 2
+                continue
+            if char == "{":
+                flush_literal()
+                choice, position = self._parse_choice(text, position + 1)
+                parts.append(choice)
+                continue
+            if char in "|}" and not top_level:
+                break
+            if char == "}":
+                raise TemplateError(f"第 {position + 1} 个字符处有多余的 '}}': {text}")
+            literal.append(char)
+            position += 1
+        flush_literal()
+        return Sequence(parts), position
+
+    def _parse_choice(self, text: str, position: int):
+        """解析 {...} 内部，返回 (Choice, '}' 之后的位置)。"""
+        options = []
+        while True:
+            option, position = self._parse_sequence(text, position)
+            options.append(option)
+            if position >= len(text):
+                raise TemplateError(f"缺少与 '{{' 配对的 '}}': {text}")
+            if text[position] == "}":
+                return Choice(options), position + 1
+            position += 1 # 跳过 '|'
+
+    def _split_wildcards(self, literal: str) -> List[Union[str, Choice]]:
+        """将文本中的 __名称__ 替换为对应通配符文件的多选一节点。"""
+        parts: List[Union[str, Choice]] = []
+        last = 0
+        for match in WILDCARD_PATTERN.finditer(literal):
+            if match.start() > last:
+                parts.append(literal[last:match.start()])
+            parts.append(self._load_wildcard(match.group(1)))
+            last = match.end()
+        if last < len(literal):
+            parts.append(literal[last:])
+        return parts
+
+    def _load_wildcard(self, name: str) -> Choice:
+        """读取 wildcards/名称.txt，每个非空行（可包含模板语法）作为一个选项。"""
+        if name in self._wildcards:
+            return self._wildcards[name]
+        if name in self._loading or len(self._loading) >= MAX_WILDCARD_DEPTH:
+            raise TemplateError(f"通配符循环引用: {' -> '.join(self._loading + [name])}")
+        wildcard_path = self.wildcard_dir / f"{name}.txt"
+        if not wildcard_path.exists():
+            raise TemplateError(f"通配符文件不存在: {wildcard_path}")
+        self._loading.append(name)
+        try:
+            with open(str(wildcard_path), "r", encoding="utf-8") as f:
+                options = [self.parse(line.strip()) for line in f if line.strip() and not line.startswith("#")]
+        finally:
+            self._loading.pop()
+        if not options:
+            raise TemplateError(f"通配符文件为空: {wildcard_path}")
+        choice = self._wildcards[name] = Choice(options)
+        return choice
+
+
+def load_template_file(template_path: Path, wildcard_dir: Path = DEFAULT_WILDCARD_DIR) -> Choice:
+    """
+    读取模板文件：每个非空、非 # 注释行是一个模板，整个文件视为这些模板的多选一（组合数为各行之和）。
+    """
+    parser = TemplateParser(wildcard_dir)
+    with open(str(template_path), "r", encoding="utf-8") as f:
+        templates = [parser.parse(line.rstrip("\r\n")) for line in f if line.strip() and not line.startswith("#")]
+    return Choice(templates)
+
+
+def render_prompt(node: Union[Choice, Sequence], index: int) -> str:
+    """生成第 index 个组合的提示词（0 <= index < node.count）。"""
+    out: List[str] = []
+    node.render(index, out)
+    return "".join(out)
+
+
+def iter_permuted_indices(count: int, rng: random.Random) -> Iterator[int]:
+    """
+    以伪随机顺序不重复地产出 0..count-1，只占常量内存。
+    使用模 2^k 的满周期线性同余序列（a ≡ 1 mod 4，c 为奇数），再经过一次同样是双射的 xorshift-乘法混合
+    打散低位的规律，最后跳过 >= count 的值。
+    """
+    if count <= 0:
+        return
+    bits = max(2, (count - 1).bit_length())
+    modulus = 1 << bits
+    shift = max(1, bits // 2)
+    multiplier = rng.randrange(0, modulus // 4) * 4 + 1
+    increment = rng.randrange(0, modulus // 2) * 2 + 1
+    mixer = rng.randrange(0, modulus // 2) * 2 + 1
+    value = rng.randrange(modulus)
+    for _ in range(modulus):
+        value = (value * multiplier + increment) % modulus
+        mixed = value ^ (value >> shift)
+        mixed = (mixed * mixer) % modulus
+        mixed ^= mixed >> shift
+        if mixed < count:
+            yield mixed
+
+
+def iter_expanded_prompts(
+    template: Union[Choice, Sequence],
+    mode: str = "all",
+    limit: Optional[int] = None,
+    seed: Optional[int] = None
+) -> Iterator[str]:
+    """
+    按需展开模板，逐行产出提示词（带换行符），可直接交给分块器或入队流水线。
+
+    Args:
+        template (Union[Choice, Sequence]): load_template_file 或 TemplateParser.parse 的结果。
+        mode (str): "all" 按顺序枚举；"random" 随机顺序且组合不重复。
+        limit (Optional[int]): 最多产出的行数，None 表示全部组合。
+        seed (Optional[int]): random 模式的随机种子，指定后结果可复现。
+    """
+    if mode not in EXPANSION_MODES:
+        raise ValueError(f"未知的展开模式 '{mode}'，可选值: {', '.join(EXPANSION_MODES)}")
+    total = template.count if limit is None else min(limit, template.count)
+    indices = range(template.count) if mode == "all" else iter_permuted_indices(template.count, random.Random(seed))
+    for produced, index in enumerate(indices):
+        if produced >= total:
+            return
+        yield render_prompt(template, index) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预览提示词模板的组合数与展开结果。")
+    parser.add_argument("template", type=Path, help="模板文件。")
+    parser.add_argument("--wildcard-dir", type=Path, default=DEFAULT_WILDCARD_DIR, help="通配符文件目录。")
+    parser.add_argument("--mode", choices=EXPANSION_MODES, default="all")
+    parser.add_argument("--limit", type=int, default=10, help="输出的提示词数量。")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    template = load_template_file(args.template, args.wildcard_dir)
+    logger.info(f"模板 '{args.template.name}' 共 {template.count:,} 种组合。")
+    for line in iter_expanded_prompts(template, args.mode, args.limit, args.seed):
+        print(line, end="")
+
+
+if __name__ == "__main__":
+    main()
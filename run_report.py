@@ -0,0 +1,162 @@
+# filename: run_report.py
+# 运行报告（Excel）：每个入队的提示词一行（分块、行号、状态、入队/出图时间、延迟、图片超链接），另有一张汇总表。
+# 使用 openpyxl 的只写模式逐行流式写出（图片链接为 HYPERLINK 公式），内存占用不随行数增长；列宽在写入前按最先的若干行（样本）估算，
+# 不需要写完后再扫描整列。超过 Excel 单表行数上限时自动续写到新的工作表。
+# 由 main.py --report 在运行结束时写出，也可根据入队记录离线生成:
+#   python run_report.py --ledger cache/harvest/ledger_xxx.jsonl [--output-dir 输出目录] [-o 报告.xlsx]
+import os
+import asyncio
+import argparse
+import datetime
+from itertools import chain, islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from loguru import logger
+from my_tools import (
+    create_write_only_workbook, create_sheet_with_headers, make_hyperlink_cell, estimate_column_widths
+)
+from output_harvester import OutputHarvester
+
+DEFAULT_REPORT_DIR = Path(__file__).resolve().parent / "cache" / "reports"
+REPORT_HEADERS = ["分块", "行", "状态", "入队时间", "出图时间", "延迟(秒)", "图片数", "图片", "提示词"]
+IMAGE_COLUMN_INDEX = REPORT_HEADERS.index("图片")
+# 用于估算列宽的样本行数（这些行在估算前缓存在内存中）
+WIDTH_SAMPLE_ROWS = 1000
+# Excel 单个工作表最多 1,048,576 行（含标题行）
+MAX_ROWS_PER_SHEET = 1048576 - 1
+
+STATUS_PRODUCED = "已出图"
+STATUS_MISSING = "未出图"
+STATUS_ENQUEUED = "已入队" # 未监视输出目录时无法判断是否出图
+
+SUMMARY_LABELS = {
+    "prompts": "入队提示词数",
+    "prompts_with_images": "已出图提示词数",
+    "prompts_missing": "未出图提示词数",
+    "images_seen": "新图片数",
+    "images_matched": "匹配的图片数",
+    "images_unmatched": "未匹配的图片数",
+    "images_unreadable": "无法读取的图片数",
+    "images_per_minute": "每分钟出图数",
+    "latency_p50_s": "入队到出图延迟 p50（秒）",
+    "latency_p95_s": "入队到出图延迟 p95（秒）",
+    "latency_max_s": "入队到出图延迟最大值（秒）",
+}
+
+
+def default_report_path(timestamp: Optional[str] = None) -> Path:
+    """本次运行的报告路径（cache/reports 下，按时间戳命名）。"""
+    timestamp = timestamp or datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    return DEFAULT_REPORT_DIR / f"run_report_{timestamp}.xlsx"
+
+
+def _timestamp(seconds: Optional[float]) -> Optional[datetime.datetime]:
+    return datetime.datetime.fromtimestamp(seconds).replace(microsecond=0) if seconds is not None else None
+
+
+def iter_prompt_rows(harvester: OutputHarvester) -> Iterator[List[Any]]:
+    """
+    按入队顺序逐个产出报告行（分块与行号从 1 开始显示）。图片列为图片的绝对路径（报告文件与输出目录位置无关），写出时转换为超链接单元格。
+    """
+    watching = harvester.output_dir is not None
+    for entry in harvester.entries:
+        if entry.first_image_at is not None:
+            status = STATUS_PRODUCED
+            latency = round(max(0.0, entry.first_image_at - entry.enqueued_at), 1)
+        else:
+            status = STATUS_MISSING if watching else STATUS_ENQUEUED
+            latency = None
+        yield [
+            entry.chunk + 1, entry.line + 1, status, _timestamp(entry.enqueued_at), _timestamp(entry.first_image_at),
+            latency, entry.images, os.path.abspath(entry.first_image_path) if entry.first_image_path else None, entry.prompt,
+        ]
+
+
+def summary_rows(summary: Dict[str, Any]) -> List[List[Any]]:
+    """将 OutputHarvester.summary() 转换为 (项目, 值) 行，浮点数保留两位小数。"""
+    return [
+        [SUMMARY_LABELS.get(key, key), round(value, 2) if isinstance(value, float) else value]
+        for key, value in summary.items()
+    ]
+
+
+def write_run_report(
+    report_path: Path,
+    rows: Iterable[List[Any]],
+    summary: Dict[str, Any],
+    sample_size: int = WIDTH_SAMPLE_ROWS,
+    max_rows_per_sheet: int = MAX_ROWS_PER_SHEET
+) -> Path:
+    """
+    以只写模式流式写出运行报告。
+
+    Args:
+        report_path (Path): 报告文件路径（.xlsx）。
+        rows (Iterable[List[Any]]): 报告行（列顺序同 REPORT_HEADERS），可以是生成器，只遍历一次。
+        summary (Dict[str, Any]): 汇总数据（OutputHarvester.summary() 的结果）。
+        sample_size (int): 用于估算列宽的样本行数。
+        max_rows_per_sheet (int): 每个明细工作表的最大行数（不含标题行），超过时续写到新的工作表。
+    Returns:
+        Path: 报告文件路径。
+    """
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    workbook = create_write_only_workbook()
+
+    summary_data = summary_rows(summary)
+    summary_sheet = create_sheet_with_headers(
+        workbook, "汇总", ["项目", "值"], column_widths=estimate_column_widths(["项目", "值"], summary_data)
+    )
+    for row in summary_data:
+        summary_sheet.append(row)
+
+    rows = iter(rows)
+    sample = list(islice(rows, sample_size))
+    # 图片列显示的是文件名，按文件名估算宽度
+    column_widths = estimate_column_widths(REPORT_HEADERS, [
+        [Path(value).name if index == IMAGE_COLUMN_INDEX and value else value for index, value in enumerate(row)]
+        for row in sample
+    ])
+    sheet = None
+    sheet_rows = 0
+    written = 0
+    for row in chain(sample, rows):
+        if sheet is None or sheet_rows >= max_rows_per_sheet:
+            sheet_number = written // max_rows_per_sheet + 1
+            sheet_name = "提示词" if sheet_number == 1 else f"提示词 ({sheet_number})"
+            sheet = create_sheet_with_headers(workbook, sheet_name, REPORT_HEADERS, column_widths=column_widths)
+            sheet_rows = 0
+        image_path = row[IMAGE_COLUMN_INDEX]
+        if image_path:
+            row = list(row)
+            row[IMAGE_COLUMN_INDEX] = make_hyperlink_cell(sheet, image_path, Path(image_path).name, logger, "运行报告")
+        sheet.append(row)
+        sheet_rows += 1
+        written += 1
+    if sheet is None:
+        create_sheet_with_headers(workbook, "提示词", REPORT_HEADERS, column_widths=column_widths)
+
+    workbook.save(str(report_path))
+    logger.info(f"运行报告已写出（{written} 行）: {report_path}")
+    return report_path
+
+
+def write_harvest_report(harvester: OutputHarvester, report_path: Path) -> Path:
+    """根据出图收集器的入队记录与匹配结果写出运行报告。"""
+    return write_run_report(report_path, iter_prompt_rows(harvester), harvester.summary())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="根据入队记录（及 WebUI 输出目录）生成 Excel 运行报告。")
+    parser.add_argument("--ledger", type=Path, required=True, help="main.py --harvest / --report 写出的入队记录。")
+    parser.add_argument("--output-dir", type=Path, default=None, help="WebUI 输出目录；指定时对照其中的图片（含已有图片）。")
+    parser.add_argument("-o", "--output", type=Path, default=None, help="报告路径，默认写到 cache/reports/。")
+    args = parser.parse_args()
+
+    harvester = OutputHarvester(args.output_dir, include_existing=True)
+    logger.info(f"已读取 {harvester.load_ledger(args.ledger)} 条入队记录。")
+    asyncio.run(harvester.finish(0.0))
+    write_harvest_report(harvester, args.output or default_report_path())
+
+
+if __name__ == "__main__":
+    main()
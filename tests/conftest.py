@@ -0,0 +1,89 @@
+# filename: tests/conftest.py
+# 测试公共设施：允许从仓库根目录导入模块；提供本地 Chromium 页面（无法启动浏览器时跳过相关测试）、本地 HTTP 桩服务器，
+# 以及写出带生成参数的 PNG 的辅助函数。
+import os
+import sys
+import zlib
+import struct
+import contextlib
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent)) # 允许从仓库根目录导入模块
+from png_parameters import PNG_SIGNATURE, PARAMETERS_KEYWORD
+
+# 模拟页面与其请求所用的虚拟源，由 page.route 在本地应答，不访问网络
+STAND_IN_ORIGIN = "http://stand-in.local"
+
+
+@contextlib.asynccontextmanager
+async def stand_in_page(html: str, routes: dict = None) -> AsyncIterator:
+    """
+    启动无头 Chromium 并打开模拟页面。routes 为 {路径: 处理函数(route)}，用于应答页面发出的请求。
+    本机未安装 Playwright 浏览器时跳过当前测试；可用环境变量 PLAYWRIGHT_CHROMIUM_EXECUTABLE 指定已有的 Chrome/Chromium。
+    """
+    from playwright.async_api import async_playwright, Error as PlaywrightError
+    async with async_playwright() as playwright:
+        try:
+            browser = await playwright.chromium.launch(
+                headless=True, executable_path=os.getenv("PLAYWRIGHT_CHROMIUM_EXECUTABLE") or None
+            )
+        except PlaywrightError as e:
+            pytest.skip(f"无法启动 Chromium（可运行 playwright install chromium）: {str(e).splitlines()[0]}")
+        page = await browser.new_page()
+
+        async def handle(route) -> None:
+            path = route.request.url[len(STAND_IN_ORIGIN):] or "/"
+            handler = (routes or {}).get(path)
+            if handler is not None:
+                await handler(route)
+            elif path == "/":
+                await route.fulfill(status=200, content_type="text/html; charset=utf-8", body=html)
+            else:
+                await route.fulfill(status=404, body="")
+
+        await page.route(f"{STAND_IN_ORIGIN}/**", handle)
+        await page.goto(f"{STAND_IN_ORIGIN}/")
+        try:
+            yield page
+        finally:
+            await browser.close()
+
+
+@contextlib.asynccontextmanager
+async def stub_server(routes: Dict[str, Callable]) -> AsyncIterator[str]:
+    """
+    在 127.0.0.1 的随机端口上启动 aiohttp 桩服务器，routes 为 {路径: 处理函数(request)}（接受任意请求方法）。
+    产出服务器地址（如 http://127.0.0.1:12345）。
+    """
+    from aiohttp import web
+    app = web.Application()
+    for path, handler in routes.items():
+        app.router.add_route("*", path, handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    try:
+        yield f"http://{host}:{port}"
+    finally:
+        await runner.cleanup()
+
+
+def _png_chunk(chunk_type: bytes, body: bytes) -> bytes:
+    """组装一个 PNG 块：长度 + 类型 + 数据 + CRC。"""
+    return struct.pack(">I", len(body)) + chunk_type + body + struct.pack(">I", zlib.crc32(chunk_type + body))
+
+
+def write_parameters_png(image_path: Path, parameters: str) -> None:
+    """写出一张带 "parameters" 文本块的 1x1 PNG（与 WebUI 一致：可用 Latin-1 表示时写 tEXt，否则写 iTXt）。"""
+    try:
+        text_chunk = _png_chunk(b"tEXt", PARAMETERS_KEYWORD.encode("latin-1") + b"\x00" + parameters.encode("latin-1"))
+    except UnicodeEncodeError:
+        text_chunk = _png_chunk(b"iTXt", PARAMETERS_KEYWORD.encode("latin-1") + b"\x00\x00\x00\x00\x00" + parameters.encode("utf-8"))
+    header = _png_chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 0, 0, 0, 0)) # 1x1 灰度
+    pixels = _png_chunk(b"IDAT", zlib.compress(b"\x00\x00"))
+    with open(str(image_path), "wb") as f:
+        f.write(PNG_SIGNATURE + header + text_chunk + pixels + _png_chunk(b"IEND", b""))
@@ -0,0 +1,80 @@
+# filename: tests/test_adaptive_chunking.py
+# AdaptiveChunkSizer：用固定的模拟耗时验证爬山法的增大、吞吐下降时反向、上下限截断，以及作为 lines_per_chunk 函数交给分块器。
+import pytest
+from adaptive_chunking import AdaptiveChunkSizer
+from chunker import iter_line_chunks
+
+
+def chunk(lines: int) -> str:
+    return "x\n" * lines
+
+
+def test_grows_while_throughput_improves():
+    sizer = AdaptiveChunkSizer(100, min_size=10, max_size=10000)
+    sizer.observe(0, chunk(100), {"fill": 0.5, "ack": 0.5}) # 100 行/秒
+    assert sizer.next_size() == 150
+    sizer.observe(1, chunk(150), {"fill": 0.6, "ack": 0.6}) # 125 行/秒
+    assert sizer.next_size() == 225
+
+
+def test_small_dip_within_tolerance_keeps_direction():
+    sizer = AdaptiveChunkSizer(100, min_size=10, max_size=10000)
+    sizer.observe(0, chunk(100), {"fill": 1.0})
+    sizer.observe(1, chunk(150), {"fill": 1.55}) # 约 96.8 行/秒，下降不足 5%
+    assert sizer.next_size() == 225
+
+
+def test_shrinks_after_throughput_regression():
+    sizer = AdaptiveChunkSizer(100, min_size=10, max_size=10000)
+    sizer.observe(0, chunk(100), {"fill": 1.0}) # 100 行/秒
+    sizer.observe(1, chunk(150), {"ack": 3.0})  # 50 行/秒：反向
+    assert sizer.next_size() == 100
+    sizer.observe(2, chunk(100), {"ack": 1.0})  # 100 行/秒：继续减小
+    assert sizer.next_size() == 67
+
+
+def test_total_is_used_when_no_step_timings():
+    sizer = AdaptiveChunkSizer(100, min_size=10, max_size=10000)
+    sizer.observe(0, chunk(100), {"total": 2.0})
+    assert sizer.history[0]["lines_per_second"] == 50.0
+    sizer.observe(1, chunk(100), {}) # 没有耗时：忽略
+    assert len(sizer.history) == 1
+
+
+def test_sizes_are_clamped_and_direction_reverses_at_limits():
+    assert AdaptiveChunkSizer(5, min_size=20, max_size=100).next_size() == 20
+    assert AdaptiveChunkSizer(500, min_size=20, max_size=100).next_size() == 100
+
+    sizer = AdaptiveChunkSizer(100, min_size=20, max_size=120)
+    sizer.observe(0, chunk(100), {"fill": 1.0})
+    assert sizer.next_size() == 120 # 150 截断到上限
+    sizer.observe(1, chunk(120), {"fill": 1.2})
+    assert sizer.next_size() == 120 and sizer.direction == -1 # 已在上限：反向继续探索
+    sizer.observe(2, chunk(120), {"fill": 1.2})
+    assert sizer.next_size() == 80
+
+    sizer = AdaptiveChunkSizer(30, min_size=20, max_size=120)
+    sizer.direction = -1
+    sizer.observe(0, chunk(30), {"fill": 1.0})
+    assert sizer.next_size() == 20 # 20 截断到下限
+    sizer.observe(1, chunk(20), {"fill": 0.7})
+    assert sizer.next_size() == 20 and sizer.direction == 1
+
+
+def test_next_size_drives_iter_line_chunks():
+    sizer = AdaptiveChunkSizer(10, min_size=5, max_size=40)
+    sizes = []
+    for index, chunk_lines in enumerate(iter_line_chunks(["x\n"] * 200, sizer.next_size)):
+        sizes.append(len(chunk_lines))
+        sizer.observe(index, "".join(chunk_lines), {"fill": len(chunk_lines) / 100}) # 吞吐恒定：持续增大直到上限
+    assert sizes[:5] == [10, 15, 22, 33, 40]
+    assert sum(sizes) == 200
+
+
+def test_invalid_limits_raise():
+    with pytest.raises(ValueError):
+        AdaptiveChunkSizer(10, min_size=0)
+    with pytest.raises(ValueError):
+        AdaptiveChunkSizer(10, min_size=50, max_size=20)
+    with pytest.raises(ValueError):
+        AdaptiveChunkSizer(10, step_factor=1.0)
@@ -0,0 +1,66 @@
+# filename: tests/test_backpressure.py
+# QueueBackpressure：经本地桩服务器的队列深度接口，验证高水位暂停、降到低水位以下才恢复，以及接口出错时不阻塞入队。
+import asyncio
+from aiohttp import web
+from conftest import stub_server
+from backpressure import QueueBackpressure, make_queue_depth_reader
+
+QUEUE_PATH = "/agent-scheduler/v1/queue"
+
+
+def depth_route(depths, requests):
+    """依次返回给定的待处理任务数（用完后重复最后一个），并记录请求次数。"""
+    async def handler(request):
+        requests.append(request.query_string)
+        depth = depths[min(len(requests), len(depths)) - 1]
+        return web.json_response({"total_pending_tasks": depth})
+    return handler
+
+
+def run_controller(routes, check, **kwargs):
+    async def runner():
+        async with stub_server(routes) as url:
+            controller = QueueBackpressure(
+                make_queue_depth_reader(url), low_watermark=20, high_watermark=200, poll_interval=0.01, **kwargs
+            )
+            await check(controller)
+    asyncio.run(runner())
+
+
+def test_below_high_watermark_does_not_pause():
+    requests = []
+
+    async def check(controller):
+        await controller.wait_for_capacity()
+        controller.note_enqueued()
+        await controller.wait_for_capacity() # 估算值 198 + 1 仍低于高水位且未过期，不再查询
+        assert controller.paused_seconds == 0.0
+    run_controller({QUEUE_PATH: depth_route([198], requests)}, check, refresh_interval=60.0)
+    assert len(requests) == 1
+
+
+def test_pauses_at_high_watermark_until_below_low_watermark():
+    requests = []
+
+    async def check(controller):
+        await asyncio.wait_for(controller.wait_for_capacity(), timeout=5)
+        assert controller.last_depth == 19
+        assert controller.paused_seconds > 0.0
+    # 达到高水位后暂停；恰好等于低水位时仍继续等待
+    run_controller({QUEUE_PATH: depth_route([200, 120, 20, 19], requests)}, check)
+    assert len(requests) == 4
+
+
+def test_endpoint_error_disables_backpressure():
+    requests = []
+
+    async def failing(request):
+        requests.append(request.query_string)
+        return web.Response(status=500, text="boom")
+
+    async def check(controller):
+        await asyncio.wait_for(controller.wait_for_capacity(), timeout=5)
+        await controller.wait_for_capacity()
+        assert not controller.enabled
+    run_controller({QUEUE_PATH: failing}, check)
+    assert len(requests) == 1
@@ -0,0 +1,72 @@
+# filename: tests/test_checkpoint_journal.py
+# CheckpointJournal：记录由后台写入线程落盘（record 不等待 fsync，flush / close 后才保证落盘），
+# 输入文件哈希不在调用线程中计算，续跑时据已落盘的记录计算起点。
+import asyncio
+import threading
+import checkpoint_journal
+from checkpoint_journal import CheckpointJournal
+
+
+def make_input(tmp_path):
+    input_file = tmp_path / "总行数.txt"
+    input_file.write_text("a\nb\nc\n", encoding="utf-8")
+    return input_file
+
+
+def test_records_are_written_off_the_calling_thread_and_resumed(tmp_path, monkeypatch):
+    input_file = make_input(tmp_path)
+    hash_threads = set()
+    compute_file_hash = checkpoint_journal.compute_file_hash
+
+    def tracking_hash(file_path):
+        hash_threads.add(threading.current_thread())
+        return compute_file_hash(file_path)
+    monkeypatch.setattr(checkpoint_journal, "compute_file_hash", tracking_hash)
+
+    journal = CheckpointJournal(tmp_path / "checkpoints", input_file)
+    asyncio.run(journal.prepare())
+    assert not hash_threads # 新的运行：构造与准备时都不读取输入文件
+    writer_threads = set()
+    write_records = journal._write_records
+
+    def tracking_write(records):
+        writer_threads.add(threading.current_thread())
+        write_records(records)
+    journal._writer.write_batch = tracking_write
+
+    for index, byte_range in enumerate([(0, 2), (2, 4), (4, 6)]):
+        journal.chunk_offsets[index] = byte_range
+        journal.record(index, "x\n")
+    journal.close()
+    assert writer_threads and threading.current_thread() not in writer_threads
+    assert hash_threads == writer_threads
+
+    hash_threads.clear()
+    resumed = CheckpointJournal(tmp_path / "checkpoints", input_file, resume=True)
+    try:
+        asyncio.run(resumed.prepare())
+        assert hash_threads and threading.current_thread() not in hash_threads
+        assert resumed.resume_point() == (3, 6)
+    finally:
+        resumed.close()
+
+
+def test_record_returns_before_fsync_and_flush_makes_it_durable(tmp_path):
+    input_file = make_input(tmp_path)
+    journal = CheckpointJournal(tmp_path / "checkpoints", input_file)
+    release = threading.Event()
+    write_records = journal._write_records
+
+    def blocked_write(records):
+        release.wait(5)
+        write_records(records)
+    journal._writer.write_batch = blocked_write
+
+    journal.chunk_offsets[0] = (0, 2)
+    journal.record(0, "a\n") # 写入线程被阻塞时 record 仍立即返回
+    assert journal.completed == {}
+    release.set()
+    journal.flush()
+    assert journal.completed == {0: (0, 2)}
+    assert journal.journal_path.read_text(encoding="utf-8").count("\n") == 1
+    journal.close()
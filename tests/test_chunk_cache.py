@@ -0,0 +1,62 @@
+# filename: tests/test_chunk_cache.py
+# ChunkCache 的淘汰：运行清单计入容量、旧清单按时间独立淘汰、每次运行结束都会检查。
+import os
+import time
+from chunk_cache import ChunkCache
+
+
+def write_run(cache: ChunkCache, contents, age_seconds: float = 0.0):
+    """写入一次运行，并把其清单与分块的使用时间调早 age_seconds 秒，返回运行 ID。"""
+    run = cache.start_run(source="test")
+    paths = [run.add(index, content) for index, content in enumerate(contents)]
+    run.close()
+    if age_seconds:
+        past = time.time() - age_seconds
+        for path in paths + [run.path]:
+            os.utime(str(path), (past, past))
+    return run.run_id
+
+
+def run_ids(cache: ChunkCache):
+    return {run_id for run_id, _, _, _ in cache.iter_manifests()}
+
+
+def test_manifests_count_toward_budget(tmp_path):
+    cache = ChunkCache(tmp_path, max_bytes=0, max_age_days=0)
+    write_run(cache, ["a\n"] * 50)
+    stats = cache.stats()
+    assert stats["bytes"] == 2 + stats["manifest_bytes"]
+    assert stats["manifest_bytes"] > 50 * 60 # 50 条清单记录，每条约 80 字节
+
+    # 容量只够放下分块本身时，清单也必须被淘汰才能回到上限以内
+    result = cache.gc(max_bytes=100)
+    assert result["remaining_bytes"] <= 100
+    assert result["removed_runs"] == 1
+
+
+def test_old_manifests_expire_independently_of_chunks(tmp_path):
+    cache = ChunkCache(tmp_path, max_bytes=0, max_age_days=1)
+    old_run = write_run(cache, ["shared\n"], age_seconds=3 * 86400)
+    new_run = write_run(cache, ["shared\n"]) # 命中同一分块，分块的使用时间被刷新
+    assert run_ids(cache) == {new_run}
+    assert old_run not in run_ids(cache)
+    assert cache.stats()["objects"] == 1
+
+
+def test_gc_runs_at_run_end_without_new_chunks(tmp_path):
+    cache = ChunkCache(tmp_path, max_bytes=0, max_age_days=1)
+    write_run(cache, ["x\n"])
+    expired_run = write_run(cache, ["y\n"], age_seconds=3 * 86400)
+    assert expired_run in run_ids(cache) # 刚调早时间，尚未检查
+
+    current_run = write_run(cache, ["x\n"]) # 全部命中，没有新写入的分块
+    assert expired_run not in run_ids(cache)
+    assert current_run in run_ids(cache)
+    assert cache.stats()["objects"] == 1 # 过期的 "y" 分块一并淘汰
+
+
+def test_current_run_is_protected(tmp_path):
+    cache = ChunkCache(tmp_path, max_bytes=1, max_age_days=0)
+    current_run = write_run(cache, ["a\n", "b\n"])
+    assert run_ids(cache) == {current_run}
+    assert cache.stats()["objects"] == 2
@@ -0,0 +1,53 @@
+# filename: tests/test_chunker.py
+# 分块：入队前在读取线程中校验每个分块的行数与空行，有问题的分块记录日志且不产出；
+# 二进制读取时与文本模式（及并行加前缀）一样把单独的 \r 视为换行。
+from loguru import logger
+from chunker import iter_text_chunks, iter_file_chunks
+
+
+def capture_logs():
+    """收集 WARNING 及以上级别的日志文本，返回 (列表, 处理器编号)。"""
+    messages = []
+    handler_id = logger.add(lambda message: messages.append(message.record["message"]), level="WARNING")
+    return messages, handler_id
+
+
+def test_chunk_with_merged_lines_is_rejected():
+    messages, handler_id = capture_logs()
+    try:
+        chunks = list(iter_text_chunks(["a\n", "b\n", "c", "d\n", "e\n"], 2))
+    finally:
+        logger.remove(handler_id)
+    assert chunks == [(0, "a\nb\n"), (2, "e\n")] # 第 2 块 "c" 缺少换行符，拼接后只有 1 行
+    assert any("第 2 个分块" in message for message in messages)
+
+
+def test_empty_lines_are_reported_and_blank_chunks_dropped(tmp_path):
+    input_path = tmp_path / "input.txt"
+    input_path.write_text("a\n\nb\n \n\n\n", encoding="utf-8")
+    messages, handler_id = capture_logs()
+    try:
+        chunks = list(iter_file_chunks(input_path, 3))
+    finally:
+        logger.remove(handler_id)
+    assert chunks == [(0, "a\n\nb\n")]
+    assert any("1 个空行" in message for message in messages)
+    assert any("第 2 个分块全部为空行" in message for message in messages)
+
+
+def test_lone_carriage_return_splits_lines_like_text_mode(tmp_path):
+    data = "第一行\r\n第二行\r第三行\n\r\n第五行\r\r\n末行无换行".encode("utf-8")
+    input_path = tmp_path / "input.txt"
+    input_path.write_bytes(data)
+    with open(str(input_path), "r", encoding="utf-8") as f:
+        text_mode_lines = f.readlines()
+
+    offsets = {}
+    chunks = list(iter_file_chunks(input_path, 2, chunk_offsets=offsets))
+    assert "".join(content for _, content in chunks) == "".join(text_mode_lines)
+    assert [content.count("\n") for _, content in chunks[:-1]] == [2, 2, 2] # 每块恰好 2 行
+    # 字节范围首尾相接并覆盖整个文件，续跑时按范围跳过的分块与实际分块一致
+    ranges = [offsets[index] for index, _ in chunks]
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+    assert all(previous[1] == current[0] for previous, current in zip(ranges, ranges[1:]))
+    assert data[ranges[1][0]:ranges[1][1]] == "第三行\n\r\n".encode("utf-8")
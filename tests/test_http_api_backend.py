@@ -0,0 +1,100 @@
+# filename: tests/test_http_api_backend.py
+# HttpApiEnqueueBackend 的提交与重试策略：在本地桩服务器上验证成功、4xx、5xx 重试，以及读取超时（txt2img 不重试、队列接口重试）。
+import socket
+import asyncio
+from aiohttp import web
+from loguru import logger
+from conftest import stub_server
+from enqueue_backends import HttpApiEnqueueBackend, API_ENDPOINTS
+
+
+class StubWebUi:
+    """按顺序返回预设的状态码（或 "slow" 表示超过超时时间才应答），并记录收到的请求体。"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.payloads = []
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.payloads.append(await request.json())
+        response = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        if response == "slow":
+            await asyncio.sleep(2.0)
+            response = 200
+        return web.json_response({"task_id": str(len(self.payloads))}, status=response)
+
+
+def enqueue_once(stub: StubWebUi, endpoint: str = "queue", **kwargs) -> bool:
+    """启动桩服务器与 API 后端，提交一个分块并返回结果。"""
+    async def runner():
+        async with stub_server({API_ENDPOINTS[endpoint]: stub.handle}) as url:
+            backend = HttpApiEnqueueBackend(
+                url, endpoint=endpoint, retry_backoff_seconds=0.01, request_timeout_seconds=0.5, **kwargs
+            )
+            await backend.start()
+            try:
+                return await backend.enqueue_chunk(0, "a\nb\n")
+            finally:
+                await backend.close()
+    return asyncio.run(runner())
+
+
+def test_success_sends_prompts_in_script_args():
+    stub = StubWebUi([200])
+    assert enqueue_once(stub, base_payload={"steps": 20})
+    assert len(stub.payloads) == 1
+    assert stub.payloads[0]["steps"] == 20
+    assert stub.payloads[0]["script_args"][-1] == "a\nb\n"
+
+
+def test_client_error_is_not_retried():
+    stub = StubWebUi([422])
+    assert not enqueue_once(stub, max_retries=3)
+    assert len(stub.payloads) == 1
+
+
+def test_server_error_is_retried_until_success():
+    stub = StubWebUi([500, 503, 200])
+    assert enqueue_once(stub, max_retries=3)
+    assert len(stub.payloads) == 3
+
+
+def test_server_error_gives_up_after_max_retries():
+    stub = StubWebUi([500])
+    assert not enqueue_once(stub, max_retries=2)
+    assert len(stub.payloads) == 3
+
+
+def test_read_timeout_on_txt2img_is_not_retried():
+    stub = StubWebUi(["slow"])
+    assert not enqueue_once(stub, endpoint="txt2img", max_retries=3)
+    assert len(stub.payloads) == 1
+
+
+def test_read_timeout_on_queue_endpoint_is_retried():
+    stub = StubWebUi(["slow", 200])
+    assert enqueue_once(stub, endpoint="queue", max_retries=3)
+    assert len(stub.payloads) == 2
+
+
+def test_connect_error_is_retried_for_txt2img():
+    with socket.socket() as sock: # 取一个当前无人监听的端口
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    messages = []
+    sink_id = logger.add(messages.append, level="WARNING", format="{message}")
+
+    async def runner():
+        backend = HttpApiEnqueueBackend(
+            f"http://127.0.0.1:{port}", endpoint="txt2img", max_retries=2, retry_backoff_seconds=0.01
+        )
+        await backend.start()
+        try:
+            return await backend.enqueue_chunk(0, "a\n")
+        finally:
+            await backend.close()
+    try:
+        assert not asyncio.run(runner())
+    finally:
+        logger.remove(sink_id)
+    assert sum("无法连接" in message for message in messages) == 3
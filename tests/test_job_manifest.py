@@ -0,0 +1,61 @@
+# filename: tests/test_job_manifest.py
+# run_manifest：分块序号在整个清单中连续编号；提示词去重按参考图片区分。
+import json
+import asyncio
+from enqueue_backends import EnqueueBackend
+from job_manifest import load_manifest, run_manifest
+from prompt_index import PromptIndex
+
+
+class RecordingBackend(EnqueueBackend):
+    """不连接 WebUI，只记录入队的分块与切换过的参考图片。"""
+    name = "recording"
+
+    def __init__(self):
+        super().__init__()
+        self.enqueued = []
+        self.images = []
+
+    async def enqueue_chunk(self, index: int, content: str) -> bool:
+        self.enqueued.append((index, content))
+        return True
+
+    async def switch_reference(self, image_path, reference_parameters=None) -> None:
+        self.images.append(image_path.name)
+
+
+def write_manifest(tmp_path):
+    for name in ("cat.png", "dog.png"):
+        (tmp_path / name).write_bytes(f"reference image {name}".encode("utf-8"))
+    (tmp_path / "prompts.txt").write_text("a\nb\nc\n", encoding="utf-8")
+    manifest = {
+        "defaults": {"lines_per_chunk": 2},
+        "jobs": [
+            {"name": "猫", "image": "cat.png", "prompts": "prompts.txt"},
+            {"name": "狗", "image": "dog.png", "prompts": "prompts.txt"},
+            {"name": "猫-重复", "image": "cat.png", "prompts": "prompts.txt"},
+        ],
+    }
+    manifest_path = tmp_path / "manifest.json"
+    manifest_path.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+    return manifest_path
+
+
+def test_chunk_indices_are_global_and_dedup_is_per_image(tmp_path):
+    jobs = load_manifest(write_manifest(tmp_path))
+    backend = RecordingBackend()
+    index = PromptIndex(tmp_path / "index.sqlite3", mode="skip")
+    backend.add_chunk_listener(index.record)
+    try:
+        results = asyncio.run(run_manifest(jobs, backend, load_parameters=False, prompt_index=index))
+    finally:
+        index.close()
+
+    # 执行顺序按图片分组：猫、猫-重复、狗；“猫-重复” 的提示词对同一图片已入队过，全部跳过
+    assert [result["name"] for result in results] == ["猫", "猫-重复", "狗"]
+    assert [result["chunks_success"] for result in results] == [2, 0, 2]
+    assert backend.images == ["dog.png"]
+    indices = [chunk_index for chunk_index, _ in backend.enqueued]
+    assert indices == [0, 1, 2, 3]
+    assert [result["first_chunk"] for result in results] == [0, 2, 2]
+    assert [content for _, content in backend.enqueued] == ["a\nb\n", "c\n", "a\nb\n", "c\n"]
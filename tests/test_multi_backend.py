@@ -0,0 +1,74 @@
+# filename: tests/test_multi_backend.py
+# MultiBackendScheduler 的改派策略：在多个本地桩服务器上验证分块被拒绝与后端故障的区分、改派上限与后端下线。
+import asyncio
+from contextlib import AsyncExitStack
+from aiohttp import web
+from conftest import stub_server
+from enqueue_backends import HttpApiEnqueueBackend, API_ENDPOINTS
+from multi_backend import MultiBackendScheduler
+
+
+class StubWebUi:
+    """提示词包含 "bad" 时返回 reject_status，否则返回 status；记录收到的提示词列表。"""
+
+    def __init__(self, status: int = 200, reject_status: int = 422):
+        self.status = status
+        self.reject_status = reject_status
+        self.prompts = []
+
+    async def handle(self, request: web.Request) -> web.Response:
+        prompts = (await request.json())["script_args"][-1]
+        self.prompts.append(prompts)
+        status = self.reject_status if "bad" in prompts else self.status
+        return web.json_response({"task_id": str(len(self.prompts))}, status=status)
+
+
+def run_scheduler(stubs, chunks, **scheduler_kwargs):
+    """为每个桩服务器创建一个 API 后端（不重试），经调度器提交所有分块，返回 ((成功, 失败), 调度器)。"""
+    async def runner():
+        async with AsyncExitStack() as stack:
+            urls = [
+                await stack.enter_async_context(stub_server({API_ENDPOINTS["queue"]: stub.handle})) for stub in stubs
+            ]
+            backends = [HttpApiEnqueueBackend(url, max_retries=0, retry_backoff_seconds=0.01) for url in urls]
+            async with MultiBackendScheduler(backends, **scheduler_kwargs) as scheduler:
+                return await scheduler.enqueue_chunks(chunks), scheduler
+    return asyncio.run(runner())
+
+
+def chunks_with_bad_line(good: int = 40):
+    """1 个会被拒绝的分块 + good 个正常分块，每块一行。"""
+    return list(enumerate(["bad\n"] + [f"good {i}\n" for i in range(good)]))
+
+
+def test_rejected_chunk_does_not_take_backends_offline():
+    stubs = [StubWebUi(), StubWebUi()]
+    (success, failed), scheduler = run_scheduler(stubs, chunks_with_bad_line())
+    assert (success, failed) == (40, 1)
+    assert all(slot.healthy for slot in scheduler.slots)
+    # 被拒绝的分块只提交一次，不改派
+    assert sum(stub.prompts.count("bad\n") for stub in stubs) == 1
+
+
+def test_failing_backend_goes_offline_and_chunks_are_reassigned():
+    stubs = [StubWebUi(status=500), StubWebUi()]
+    (success, failed), scheduler = run_scheduler(stubs, list(enumerate(f"p {i}\n" for i in range(20))))
+    assert (success, failed) == (20, 0)
+    assert [slot.healthy for slot in scheduler.slots] == [False, True]
+    assert len(stubs[1].prompts) == 20
+
+
+def test_poison_chunk_is_reassigned_at_most_once_per_backend():
+    # 该分块在所有后端上都触发 5xx：每个后端最多尝试一次，之后放弃，后端保持在线
+    stubs = [StubWebUi(reject_status=500), StubWebUi(reject_status=500)]
+    (success, failed), scheduler = run_scheduler(stubs, chunks_with_bad_line(), max_reassignments=5)
+    assert (success, failed) == (40, 1)
+    assert all(slot.healthy for slot in scheduler.slots)
+    assert [stub.prompts.count("bad\n") for stub in stubs] == [1, 1]
+
+
+def test_reassignment_cap():
+    stubs = [StubWebUi(reject_status=500) for _ in range(3)]
+    (success, failed), _ = run_scheduler(stubs, chunks_with_bad_line(0), max_reassignments=1)
+    assert (success, failed) == (0, 1)
+    assert sum(stub.prompts.count("bad\n") for stub in stubs) == 2
@@ -0,0 +1,56 @@
+# filename: tests/test_output_harvester.py
+# OutputHarvester：把输出目录中带提示词的 PNG 与入队记录对应起来，检查入队记录文件、匹配结果与汇总。
+import json
+import asyncio
+from conftest import write_parameters_png
+from output_harvester import OutputHarvester
+
+SETTINGS = "Negative prompt: \nSteps: 20, Sampler: Euler a, CFG scale: 7, Seed: 1, Size: 512x512"
+
+
+def write_image(directory, number: int, prompt: str):
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{number:05d}-1.png"
+    write_parameters_png(path, f"{prompt}\n{SETTINGS}")
+    return path
+
+
+def test_images_are_correlated_with_ledger_entries(tmp_path):
+    output_dir = tmp_path / "outputs"
+    day_dir = output_dir / "2026-01-01"
+    write_image(day_dir, 0, "a") # 开始监视前已有的图片不计入
+    ledger_path = tmp_path / "ledger.jsonl"
+
+    async def run():
+        harvester = OutputHarvester(output_dir, ledger_path)
+        await harvester.start(interval=60)
+        harvester.record(0, "a\nb\nc\n")
+        harvester.record(1, "d\n")
+        write_image(day_dir, 1, "a")
+        write_image(day_dir, 2, "a") # 同一提示词的第二张图片
+        write_image(day_dir / "sub", 3, "b ,  ") # 规范化后与 "b," 不同，不应匹配到 b
+        write_image(day_dir / "sub", 4, "  b ")
+        write_image(day_dir, 5, "不在入队记录中")
+        await harvester.finish(timeout=0)
+        harvester.close()
+        return harvester
+
+    harvester = asyncio.run(run())
+    images = {(entry.chunk, entry.line): entry.images for entry in harvester.entries}
+    assert images == {(0, 0): 2, (0, 1): 1, (0, 2): 0, (1, 0): 0}
+    assert harvester.entries[0].first_image_path.endswith("00001-1.png")
+    summary = harvester.summary()
+    assert (summary["prompts"], summary["prompts_with_images"], summary["prompts_missing"]) == (4, 2, 2)
+    assert (summary["images_seen"], summary["images_matched"], summary["images_unmatched"]) == (5, 3, 2)
+    assert [(entry.chunk, entry.line) for entry in harvester.missing_entries()] == [(0, 2), (1, 0)]
+
+    ledger = [json.loads(line) for line in ledger_path.read_text(encoding="utf-8").splitlines()]
+    assert [(item["chunk"], item["line"], item["prompt"]) for item in ledger] == [
+        (0, 0, "a"), (0, 1, "b"), (0, 2, "c"), (1, 0, "d")
+    ]
+
+    # 离线对照：读取入队记录并处理目录中的全部图片（包括开始监视前已有的那张）
+    offline = OutputHarvester(output_dir, include_existing=True)
+    assert offline.load_ledger(ledger_path) == 4
+    asyncio.run(offline.finish(timeout=0))
+    assert {(entry.chunk, entry.line): entry.images for entry in offline.entries}[(0, 0)] == 3
@@ -0,0 +1,53 @@
+# filename: tests/test_png_parameters.py
+# PngParametersCache：按路径、文件大小与修改时间缓存参考图片的 "parameters" 文本，图片被替换后重新解析。
+import os
+import png_parameters
+from png_parameters import PngParametersCache
+from conftest import write_parameters_png
+
+
+def count_reads(monkeypatch):
+    """统计 read_png_parameters 的调用次数。"""
+    calls = []
+    original = png_parameters.read_png_parameters
+
+    def counting(image_path):
+        calls.append(image_path)
+        return original(image_path)
+    monkeypatch.setattr(png_parameters, "read_png_parameters", counting)
+    return calls
+
+
+def test_cache_hit_does_not_reread_png(tmp_path, monkeypatch):
+    image = tmp_path / "ref.png"
+    write_parameters_png(image, "1girl, 微笑\nSteps: 20")
+    calls = count_reads(monkeypatch)
+    cache = PngParametersCache(tmp_path / "cache.json")
+    assert cache.get(image) == "1girl, 微笑\nSteps: 20"
+    assert cache.get(image) == "1girl, 微笑\nSteps: 20"
+    assert len(calls) == 1
+
+
+def test_replaced_image_is_parsed_again(tmp_path, monkeypatch):
+    image = tmp_path / "ref.png"
+    write_parameters_png(image, "first\nSteps: 20")
+    calls = count_reads(monkeypatch)
+    cache = PngParametersCache(tmp_path / "cache.json")
+    assert cache.get(image) == "first\nSteps: 20"
+    write_parameters_png(image, "second, longer prompt\nSteps: 20")
+    stat = image.stat()
+    os.utime(image, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000)) # 确保修改时间变化
+    assert cache.get(image) == "second, longer prompt\nSteps: 20"
+    assert len(calls) == 2
+
+
+def test_entries_survive_save_and_load(tmp_path, monkeypatch):
+    image = tmp_path / "ref.png"
+    write_parameters_png(image, "saved\nSteps: 20")
+    cache_path = tmp_path / "cache.json"
+    cache = PngParametersCache(cache_path)
+    cache.get(image)
+    cache.save()
+    calls = count_reads(monkeypatch)
+    assert PngParametersCache(cache_path).get(image) == "saved\nSteps: 20"
+    assert calls == []
@@ -0,0 +1,34 @@
+# filename: tests/test_prefix_adder.py
+# 加前缀：并行版本与逐行版本结果一致（含 \r\n 与单独的 \r），并行处理出错时返回非零退出码。
+import prefix_adder
+from prefix_adder import process_and_add_prefix, iter_prefixed_blocks_parallel, EXIT_FAILURE, EXIT_SUCCESS
+
+MIXED_NEWLINES = "第一行\r\n第二行\r第三行\n\r\n第五行\r\r\n末行无换行".encode("utf-8")
+
+
+def test_parallel_matches_text_mode_for_all_newline_styles(tmp_path):
+    input_file = tmp_path / "处理文档.txt"
+    input_file.write_bytes(MIXED_NEWLINES)
+    sequential_output = tmp_path / "逐行.txt"
+    total, success, failed = process_and_add_prefix("P ", str(input_file), str(sequential_output))
+
+    stats = {}
+    # 很小的字节范围：让范围边界落在各种换行符附近
+    parallel = b"".join(iter_prefixed_blocks_parallel("P ", str(input_file), workers=2, stats=stats, range_bytes=4))
+    assert parallel == sequential_output.read_bytes()
+    assert (stats["total"], stats["success"], stats["failed"]) == (total, success, failed) == (7, 7, 0)
+
+
+def test_parallel_failure_maps_to_nonzero_exit(tmp_path, monkeypatch):
+    monkeypatch.setattr(prefix_adder, "setup_prefix_adder_logger", lambda: None)
+    # --batch 会写入这两个环境变量；先经 monkeypatch 设置，测试结束后恢复原状，避免影响其他测试
+    monkeypatch.setenv("BATCH_MODE", "1")
+    monkeypatch.setenv("DISABLE_AUTO_OPEN", "1")
+    input_file = tmp_path / "处理文档.txt"
+    input_file.write_text("a\nb\n", encoding="utf-8")
+    argv = ["--batch", "--workers", "2", "--prefix", "P ", "--input", str(input_file)]
+
+    assert prefix_adder.main(argv + ["--output", str(tmp_path / "不存在的目录" / "总行数.txt")]) == EXIT_FAILURE
+    assert prefix_adder.main(argv + ["--output", str(tmp_path / "总行数.txt")]) == EXIT_SUCCESS
+    assert (tmp_path / "总行数.txt").read_text(encoding="utf-8") == "P a\nP b\n"
+
@@ -0,0 +1,52 @@
+# filename: tests/test_prompt_index.py
+# PromptIndex 的去重：本次运行内的重复（记在 SQLite 临时表中）、跨运行的已生成提示词，以及按生成上下文区分。
+from prompt_index import PromptIndex, generation_context
+
+
+def open_index(tmp_path, **kwargs) -> PromptIndex:
+    return PromptIndex(tmp_path / "index.sqlite3", **kwargs)
+
+
+def test_duplicates_within_run_are_skipped(tmp_path):
+    index = open_index(tmp_path)
+    try:
+        lines = ["a, b\n", "a ,  b\n", "c\n", "\n", "c\n"] * 300 # 跨越多个查询批次
+        kept = list(index.filter_lines(lines))
+        assert kept == ["a, b\n", "c\n"] + ["\n"] * 300
+        assert (index.checked, index.duplicates) == (1200, 1198)
+    finally:
+        index.close()
+
+
+def test_recorded_prompts_are_skipped_in_later_runs(tmp_path):
+    index = open_index(tmp_path)
+    index.record(0, "a\nb\n")
+    index.close()
+
+    index = open_index(tmp_path, mode="count")
+    try:
+        assert list(index.filter_lines(["a\n", "c\n"])) == ["a\n", "c\n"]
+        assert index.duplicates == 1
+    finally:
+        index.close()
+
+
+def test_same_prompt_with_another_reference_image_is_not_a_duplicate(tmp_path):
+    first_image, second_image = tmp_path / "first.png", tmp_path / "second.png"
+    first_image.write_bytes(b"first image with parameters A")
+    second_image.write_bytes(b"second image with parameters B")
+
+    index = open_index(tmp_path, context=generation_context(first_image))
+    index.record(0, "a\n")
+    index.close()
+
+    index = open_index(tmp_path, context=generation_context(second_image))
+    try:
+        assert list(index.filter_lines(["a\n"])) == ["a\n"]
+    finally:
+        index.close()
+    index = open_index(tmp_path, context=generation_context(first_image))
+    try:
+        assert list(index.filter_lines(["a\n"])) == []
+    finally:
+        index.close()
@@ -0,0 +1,80 @@
+# filename: tests/test_prompt_templates.py
+# 提示词模板的解析与展开：多选一、转义字符、SD 提示词中反斜杠括号的原样保留，
+# 以及随机模式的不重复置换、通配符文件与 limit 截断。
+import random
+import pytest
+from prompt_templates import (
+    TemplateParser, TemplateError, render_prompt, iter_expanded_prompts, iter_permuted_indices, load_template_file
+)
+
+
+def expand(template: str):
+    return [line.rstrip("\n") for line in iter_expanded_prompts(TemplateParser().parse(template))]
+
+
+def test_choices_expand_in_order():
+    assert expand("{a|b} {x|y}") == ["a x", "a y", "b x", "b y"]
+
+
+def test_backslash_parentheses_pass_through():
+    assert render_prompt(TemplateParser().parse(r"iori_\(blue_archive\), {a|b}"), 0) == r"iori_\(blue_archive\), a"
+    assert expand(r"\(\(masterpiece\)\), C:\path") == [r"\(\(masterpiece\)\), C:\path"]
+
+
+def test_template_escapes():
+    assert expand(r"\{a\|b\} \\ {c|\}}") == [r"{a|b} \ c", r"{a|b} \ }"]
+
+
+def test_unbalanced_braces_raise():
+    with pytest.raises(TemplateError):
+        TemplateParser().parse("{a|b")
+    with pytest.raises(TemplateError):
+        TemplateParser().parse("a}")
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 5, 64, 100, 1000])
+def test_permuted_indices_cover_each_index_once(count):
+    indices = list(iter_permuted_indices(count, random.Random(7)))
+    assert sorted(indices) == list(range(count))
+
+
+def test_random_mode_is_deterministic_and_yields_each_combination_once():
+    template = TemplateParser().parse("{a|b|c} {x|y|z|w} {1|2|3|4|5}")
+    first = list(iter_expanded_prompts(template, mode="random", seed=42))
+    assert first == list(iter_expanded_prompts(template, mode="random", seed=42))
+    assert sorted(first) == sorted(iter_expanded_prompts(template)) # 60 种组合各一次
+    assert first != list(iter_expanded_prompts(template)) # 顺序已打乱
+    assert first != list(iter_expanded_prompts(template, mode="random", seed=43))
+
+
+def test_limit_truncates_output():
+    template = TemplateParser().parse("{a|b} {x|y|z}")
+    assert len(list(iter_expanded_prompts(template, limit=4))) == 4
+    assert len(list(iter_expanded_prompts(template, mode="random", limit=4, seed=1))) == 4
+    assert len(list(iter_expanded_prompts(template, limit=100))) == 6
+    assert list(iter_expanded_prompts(template, limit=0)) == []
+
+
+def test_wildcards_are_read_from_wildcard_dir(tmp_path):
+    wildcard_dir = tmp_path / "wildcards"
+    (wildcard_dir / "style").mkdir(parents=True)
+    (wildcard_dir / "hair.txt").write_text("long hair\n# 注释行\n\n{red|blue} hair\n", encoding="utf-8")
+    (wildcard_dir / "style" / "anime.txt").write_text("cel shading\n__hair__ only\n", encoding="utf-8")
+    template_path = tmp_path / "模板.txt"
+    template_path.write_text("1girl, __hair__\n# 注释\n__style/anime__\n", encoding="utf-8")
+
+    template = load_template_file(template_path, wildcard_dir)
+    assert template.count == 3 + 4
+    assert [line.rstrip("\n") for line in iter_expanded_prompts(template)] == [
+        "1girl, long hair", "1girl, red hair", "1girl, blue hair",
+        "cel shading", "long hair only", "red hair only", "blue hair only",
+    ]
+
+
+def test_missing_or_circular_wildcard_raises(tmp_path):
+    with pytest.raises(TemplateError, match="不存在"):
+        TemplateParser(tmp_path).parse("__missing__")
+    (tmp_path / "a.txt").write_text("__b__\n", encoding="utf-8")
+    (tmp_path / "b.txt").write_text("__a__\n", encoding="utf-8")
+    with pytest.raises(TemplateError, match="循环引用"):
+        TemplateParser(tmp_path).parse("__a__")
@@ -0,0 +1,24 @@
+# filename: tests/test_trace_spans.py
+# percentile：最近秩法分位数，秩为 ceil(f*n)，并限制在列表范围内；chunk_attrs 的行数与入队的分块一致。
+from trace_spans import percentile, chunk_attrs
+
+
+def test_percentile_uses_nearest_rank():
+    values = [float(v) for v in range(1, 11)] # 1..10
+    assert percentile(values, 0.5) == 5.0
+    assert percentile(values, 0.95) == 10.0
+    assert percentile(values, 0.9) == 9.0 # 秩恰为整数时不向上多取一位
+    assert percentile(values, 0.1) == 1.0
+
+
+def test_percentile_clamps_rank():
+    assert percentile([], 0.5) == 0.0
+    assert percentile([3.0], 0.5) == 3.0
+    assert percentile([1.0, 2.0], 0.0) == 1.0
+    assert percentile([1.0, 2.0], 1.0) == 2.0
+
+
+def test_chunk_attrs_counts_last_line_without_newline():
+    assert chunk_attrs(0, "a\nb\n") == {"chunk": 1, "lines": 2, "bytes": 4}
+    assert chunk_attrs(1, "a\nb")["lines"] == 2
+    assert chunk_attrs(2, "")["lines"] == 0
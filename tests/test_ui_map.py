@@ -0,0 +1,79 @@
+# filename: tests/test_ui_map.py
+# UiMap：控件只解析一次并缓存定位器；元素被重新渲染后自动重新解析；启动检查并发解析，缺失控件共用一个时限；invalidate 后重新解析。
+import time
+import asyncio
+import pytest
+from conftest import stand_in_page
+from ui_map import UiMap, UiControl, UiMapError
+
+STAND_IN_PAGE = """
+<!DOCTYPE html>
+<html><body>
+<textarea aria-label="提示词"></textarea>
+<button>Enqueue</button>
+</body></html>
+"""
+
+CONTROLS = {control.name: control for control in (
+    UiControl("prompt", role="textbox", label="提示词", exact=True),
+    UiControl("enqueue", role="button", label="Enqueue"),
+    UiControl("missing_a", selector="#missing-a"),
+    UiControl("missing_b", selector="#missing-b"),
+)}
+
+
+def run(coro_factory):
+    """在新的事件循环中运行一个以模拟页面为参数的协程。"""
+    async def runner():
+        async with stand_in_page(STAND_IN_PAGE) as page:
+            await coro_factory(page)
+    asyncio.run(runner())
+
+
+def test_get_reuses_locator_resolved_by_verify():
+    async def check(page):
+        ui = UiMap(page, controls=CONTROLS, timeout_ms=2000)
+        await ui.verify(("prompt", "enqueue"))
+        first = await ui.get("prompt")
+        assert await ui.get("prompt") is first
+        await first.fill("1girl")
+        assert ui.resolve_count == {"prompt": 1, "enqueue": 1}
+    run(check)
+
+
+def test_verify_waits_for_missing_controls_concurrently():
+    async def check(page):
+        ui = UiMap(page, controls=CONTROLS, timeout_ms=500)
+        start = time.perf_counter()
+        with pytest.raises(UiMapError) as excinfo:
+            await ui.verify(("prompt", "missing_a", "missing_b"))
+        assert time.perf_counter() - start < 1.0 # 两个缺失控件共用一个时限，而不是依次各等一次
+        assert "missing_a" in str(excinfo.value) and "missing_b" in str(excinfo.value)
+    run(check)
+
+
+def test_invalidate_forces_resolution_on_next_get():
+    async def check(page):
+        ui = UiMap(page, controls=CONTROLS, timeout_ms=2000)
+        await ui.get("enqueue")
+        ui.invalidate()
+        await ui.get("enqueue")
+        assert ui.resolve_count["enqueue"] == 2
+    run(check)
+
+
+def test_get_resolves_again_after_rerender():
+    async def check(page):
+        ui = UiMap(page, controls=CONTROLS, timeout_ms=2000, stale_timeout_ms=300)
+        await (await ui.get("prompt")).fill("old")
+        # 模拟 Gradio 重新渲染：替换元素，标记随旧元素一起消失
+        await page.evaluate("""() => {
+            const old = document.querySelector('textarea');
+            old.replaceWith(old.cloneNode(false));
+            document.querySelector('textarea').removeAttribute('data-auto-queue');
+        }""")
+        textarea = await ui.get("prompt")
+        await textarea.fill("new")
+        assert await page.locator("textarea").input_value() == "new"
+        assert ui.resolve_count["prompt"] == 2
+    run(check)
@@ -0,0 +1,115 @@
+# filename: tests/test_webui_waits.py
+# StepWaiter 的条件等待：在本地模拟页面上验证可见、可用、文本框内容与 Enqueue 确认请求，以及超时路径（未确认的分块入队失败）。
+import time
+import asyncio
+from pathlib import Path
+import pytest
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from conftest import stand_in_page
+from webui_waits import StepWaiter
+from ui_map import UiMap, UiControl
+from fast_fill import FILL_MODE_STANDARD
+from enqueue_backends import PlaywrightEnqueueBackend, FAILURE_UNCONFIRMED
+
+# 模拟页面：控件在延迟后才出现/可用；Enqueue 按钮点击后延迟发出 /queue/join 请求，“无确认”按钮不发请求
+STAND_IN_PAGE = """
+<!DOCTYPE html>
+<html><body>
+<div id="late" style="display:none">稍后出现</div>
+<div id="never" style="display:none">永不出现</div>
+<button id="generate" disabled>Generate</button>
+<textarea id="prompt_list" aria-label="提示词输入列表"></textarea>
+<button id="enqueue">Enqueue</button>
+<button id="silent">无确认</button>
+<script>
+  setTimeout(() => { document.getElementById('late').style.display = 'block'; }, 300);
+  setTimeout(() => { document.getElementById('generate').disabled = false; }, 300);
+  document.getElementById('enqueue').addEventListener('click', () => {
+    setTimeout(() => fetch('/queue/join', {method: 'POST', body: '{}'}), 200);
+  });
+</script>
+</body></html>
+"""
+
+
+async def fulfill_ack(route) -> None:
+    await route.fulfill(status=200, content_type="application/json", body='{"event_id": "1"}')
+
+
+def run(coro_factory):
+    """在新的事件循环中运行一个以模拟页面为参数的协程。"""
+    async def runner():
+        async with stand_in_page(STAND_IN_PAGE, {"/queue/join": fulfill_ack}) as page:
+            await coro_factory(page)
+    asyncio.run(runner())
+
+
+def test_until_visible_and_enabled_wait_for_real_condition():
+    async def check(page):
+        waiter = StepWaiter(page, min_delay=0.0, timeout_ms=5000)
+        assert await waiter.until_visible(page.locator("#late"), "出现") >= 0.2
+        assert await waiter.until_enabled(page.locator("#generate"), "可用") >= 0.0
+        assert set(waiter.step_durations) == {"出现", "可用"}
+    run(check)
+
+
+def test_until_value_matches_filled_text():
+    async def check(page):
+        waiter = StepWaiter(page, min_delay=0.0, timeout_ms=5000)
+        textarea = page.get_by_role("textbox", name="提示词输入列表")
+        await textarea.fill("a\nb\n")
+        await waiter.until_value(textarea, "a\nb\n", "内容一致")
+    run(check)
+
+
+def test_min_delay_is_a_lower_bound():
+    async def check(page):
+        waiter = StepWaiter(page, min_delay=0.3, timeout_ms=5000)
+        assert await waiter.until_visible(page.locator("#enqueue"), "已可见") >= 0.3
+    run(check)
+
+
+def test_click_and_wait_ack_waits_for_queue_join_response():
+    async def check(page):
+        waiter = StepWaiter(page, min_delay=0.0, timeout_ms=5000)
+        acknowledged, elapsed = await waiter.click_and_wait_ack(page.locator("#enqueue"), "Enqueue 确认")
+        assert acknowledged
+        assert 0.15 <= elapsed < 5.0
+    run(check)
+
+
+def test_until_visible_times_out():
+    async def check(page):
+        waiter = StepWaiter(page, min_delay=0.0, timeout_ms=300)
+        with pytest.raises(PlaywrightTimeoutError):
+            await waiter.until_visible(page.locator("#never"), "永不出现")
+        with pytest.raises(AssertionError):
+            await waiter.until_value(page.locator("#prompt_list"), "不会出现的内容", "内容一致")
+    run(check)
+
+
+def test_click_and_wait_ack_falls_back_after_timeout():
+    async def check(page):
+        waiter = StepWaiter(page, min_delay=0.0, timeout_ms=300)
+        start = time.perf_counter()
+        acknowledged, _ = await waiter.click_and_wait_ack(page.locator("#silent"), "无确认")
+        assert not acknowledged
+        assert time.perf_counter() - start >= 0.3 # 未收到确认请求：超时后等待网络空闲并返回未确认，不抛出异常
+        acknowledged, _ = await waiter.click_and_wait_ack(page.locator("#silent"), "无确认元素", ack_selector="#never")
+        assert not acknowledged
+    run(check)
+
+
+def test_unacknowledged_enqueue_fails_chunk_as_unconfirmed():
+    async def check(page):
+        backend = PlaywrightEnqueueBackend(Path("reference.png"), min_step_delay=0.0, fill_mode=FILL_MODE_STANDARD)
+        backend.page = page
+        backend.waiter = StepWaiter(page, min_delay=0.0, timeout_ms=300)
+        backend.ui = UiMap(page, controls={control.name: control for control in (
+            UiControl("prompt_list", role="textbox", label="提示词输入列表"),
+            UiControl("enqueue", selector="#silent"), # 模拟页面从不确认
+        )})
+        assert not await backend.enqueue_chunk(0, "a\nb\n")
+        assert backend.chunk_failures == {0: FAILURE_UNCONFIRMED}
+        assert 0 not in backend.chunk_timings
+    run(check)
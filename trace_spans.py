@@ -0,0 +1,180 @@
+# filename: trace_spans.py
+# 计时埋点：用单调时钟记录每个浏览器操作、等待步骤与流水线阶段的耗时区间（span），
+# 运行结束后导出为 Chrome trace-event JSON（可在 https://ui.perfetto.dev 或 chrome://tracing 打开），并输出各步骤的 p50/p95 汇总。
+# 默认关闭；main.py 指定 --trace 时开启。关闭时 span() 几乎没有开销。
+import os
+import json
+import math
+import time
+import asyncio
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List
+from loguru import logger
+from chunker import count_lines
+
+
+def chunk_attrs(index: int, content: str) -> Dict[str, Any]:
+    """分块的 span 属性：序号（从 1 开始）、行数、UTF-8 字节数。"""
+    return {"chunk": index + 1, "lines": count_lines(content), "bytes": len(content.encode("utf-8"))}
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """已排序列表的分位数（最近秩法）。"""
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class Tracer:
+    """
+    收集 span 的记录器。每个 span 记为一个 Chrome trace 的完整事件（ph="X"）；
+    同一个 asyncio 任务（或线程）的 span 放在同一条轨道上，并发入队的分块会显示为并行的轨道。
+    """
+    def __init__(self):
+        self.enabled = False
+        self.events: List[Dict[str, Any]] = []
+        self._origin = time.perf_counter()
+        self._tracks: Dict[Any, int] = {}
+        self._track_names: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def enable(self) -> None:
+        """开启记录，并以当前时刻作为时间轴起点。"""
+        self.enabled = True
+        self.events.clear()
+        self._origin = time.perf_counter()
+
+    def _current_track(self) -> int:
+        """当前 asyncio 任务或线程对应的轨道编号。"""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        # 以 id 作键，不持有任务对象；任务结束后 id 被复用时自然复用同一条轨道
+        key = ("task", id(task)) if task is not None else ("thread", threading.get_ident())
+        with self._lock:
+            track = self._tracks.get(key)
+            if track is None:
+                track = self._tracks[key] = len(self._tracks) + 1
+                name = task.get_name() if task is not None else threading.current_thread().name
+                self._track_names[track] = name
+        return track
+
+    def add_span(self, name: str, start: float, end: float, category: str = "step", **attrs: Any) -> None:
+        """
+        记录一个已结束的区间。
+
+        Args:
+            name (str): 名称（用于汇总分组）。
+            start (float): 开始时刻（time.perf_counter()）。
+            end (float): 结束时刻（time.perf_counter()）。
+            category (str): 类别，如 action / wait / chunk / stage。
+            **attrs: 附加属性（分块序号、行数、字节数等），显示在 trace 的 args 中。
+        """
+        if not self.enabled:
+            return
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start - self._origin) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": os.getpid(),
+            "tid": self._current_track(),
+            "args": attrs,
+        }
+        with self._lock:
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, name: str, category: str = "step", **attrs: Any) -> Iterator[Dict[str, Any]]:
+        """
+        记录 with 代码块的耗时。产出 attrs 字典，代码块中可继续补充属性。
+        代码块抛出异常时，异常类型会记录在 error 属性中。
+        """
+        if not self.enabled:
+            yield attrs
+            return
+        start = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs["error"] = type(e).__name__
+            raise
+        finally:
+            self.add_span(name, start, time.perf_counter(), category, **attrs)
+
+    def chunk_span(self, name: str, index: int, content: str, category: str = "chunk", **attrs: Any):
+        """记录与某个分块相关的 span，分块属性只在开启记录时才计算。"""
+        if self.enabled:
+            attrs.update(chunk_attrs(index, content))
+        return self.span(name, category, **attrs)
+
+    def iterate(self, iterable: Iterable[Any], name: str, category: str = "stage") -> Iterator[Any]:
+        """包装迭代器，将每次取下一个元素（如读取并生成一个分块）记录为一个 span。"""
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            attrs: Dict[str, Any] = {}
+            if isinstance(item, tuple) and len(item) == 2 and isinstance(item[1], str):
+                attrs = chunk_attrs(*item)
+            self.add_span(name, start, time.perf_counter(), category, **attrs)
+            yield item
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """按名称汇总：次数、总耗时、p50、p95、最大值（毫秒）。"""
+        durations: Dict[str, List[float]] = {}
+        with self._lock:
+            for event in self.events:
+                durations.setdefault(event["name"], []).append(event["dur"] / 1000)
+        result = {}
+        for name, values in durations.items():
+            values.sort()
+            result[name] = {
+                "count": len(values),
+                "total_ms": sum(values),
+                "p50_ms": percentile(values, 0.50),
+                "p95_ms": percentile(values, 0.95),
+                "max_ms": values[-1],
+            }
+        return result
+
+    def log_summary(self) -> None:
+        """按总耗时从高到低输出各步骤的 p50/p95。"""
+        summary = self.summary()
+        if not summary:
+            return
+        logger.info("--- 计时汇总（按总耗时排序） ---")
+        for name, stats in sorted(summary.items(), key=lambda item: item[1]["total_ms"], reverse=True):
+            logger.info(
+                f"{name}: {stats['count']} 次，总计 {stats['total_ms'] / 1000:.2f} 秒，"
+                f"p50 {stats['p50_ms']:.1f} 毫秒，p95 {stats['p95_ms']:.1f} 毫秒，最大 {stats['max_ms']:.1f} 毫秒"
+            )
+
+    def write_chrome_trace(self, output_path: Path) -> Path:
+        """写出 Chrome trace-event JSON 文件，返回文件路径。"""
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            metadata = [
+                {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": track, "args": {"name": name}}
+                for track, name in self._track_names.items()
+            ]
+            trace = {"traceEvents": metadata + list(self.events), "displayTimeUnit": "ms"}
+        with open(str(output_path), "w", encoding="utf-8") as f:
+            json.dump(trace, f, ensure_ascii=False)
+        logger.info(f"计时 trace 已写出（{len(trace['traceEvents'])} 个事件）: {output_path}")
+        return output_path
+
+
+# 全局记录器：各模块直接使用，由 main.py 根据 --trace 决定是否开启
+TRACER = Tracer()
@@ -0,0 +1,148 @@
+# filename: ui_map.py
+# WebUI 控件映射：每个逻辑控件（提示词框、脚本下拉框、Enqueue 按钮等）只在首次使用时按角色/名称解析一次，
+# 解析后给元素打上 data-auto-queue 标记，之后通过该属性的 CSS 选择器直接定位，不再在庞大的 Gradio DOM 上反复做无障碍角色查询。
+# 取用缓存的定位器时只做一次短时的状态等待（元素在位时立即返回）；等待超时说明元素已被 Gradio 重新渲染（标记丢失），
+# 此时丢弃缓存并重新解析、重新打标记。页面状态可能整体变化（如切换参考图片）时调用方也可 invalidate 使之重新解析。
+# 界面文字（中文本地化名称）集中定义在 UI_CONTROLS 中。
+import asyncio
+from typing import Dict, Iterable, List, Optional
+from loguru import logger
+from playwright.async_api import Page, Locator
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from trace_spans import TRACER
+
+# 解析后写在元素上的标记属性
+MARKER_ATTRIBUTE = "data-auto-queue"
+# 解析控件的等待时间 (毫秒)；启动检查时所有控件并发解析，共用这一时限
+DEFAULT_RESOLVE_TIMEOUT_MS = 10000
+# 取用缓存的定位器时等待其标记元素的时间 (毫秒)，超时即视为缓存已失效
+DEFAULT_STALE_TIMEOUT_MS = 1000
+
+
+class UiControl:
+    """一个逻辑控件的定位方式：按无障碍角色 + 名称，或直接给出 CSS 选择器。"""
+    def __init__(self, name: str, role: Optional[str] = None, label: Optional[str] = None, exact: bool = False,
+                 selector: Optional[str] = None, state: str = "visible"):
+        """
+        Args:
+            name (str): 逻辑名称（同时作为标记属性的值）。
+            role (Optional[str]): 无障碍角色，如 "button"、"textbox"。
+            label (Optional[str]): 无障碍名称（WebUI 本地化后的界面文字）。
+            exact (bool): 名称是否精确匹配。
+            selector (Optional[str]): CSS 选择器；指定时不使用角色查询。
+            state (str): 解析时等待的元素状态，隐藏的 file input 等使用 "attached"。
+        """
+        self.name = name
+        self.role = role
+        self.label = label
+        self.exact = exact
+        self.selector = selector
+        self.state = state
+
+
+# WebUI（中文界面）的控件定义
+UI_CONTROLS: Dict[str, UiControl] = {control.name: control for control in (
+    UiControl("png_info_tab", role="button", label="图片信息"),
+    UiControl("png_info_file_input", selector="#pnginfo_image input[type='file']", state="attached"),
+    UiControl("send_to_txt2img", role="button", label=">> 文生图"),
+    UiControl("prompt", role="textbox", label="提示词", exact=True),
+    UiControl("paste_parameters", selector="#paste"),
+    UiControl("random_seed", role="button", label="🎲️"),
+    UiControl("script_dropdown", role="textbox", label="脚本"),
+    UiControl("script_prompts_from_file", role="button", label="Prompts from file or textbox"),
+    UiControl("prompt_list", role="textbox", label="提示词输入列表"),
+    UiControl("enqueue", role="button", label="Enqueue"),
+)}
+
+# 页面加载后即应存在于文生图页面的控件，启动时检查，缺失则立即报错
+STARTUP_CONTROLS = ("prompt", "random_seed", "script_dropdown", "enqueue")
+
+
+class UiMapError(RuntimeError):
+    """启动检查时找不到必需的控件（WebUI 版本、语言或扩展与预期不符）。"""
+
+
+class UiMap:
+    """按逻辑名称缓存控件定位器的映射表。"""
+    def __init__(self, page: Page, controls: Dict[str, UiControl] = UI_CONTROLS, timeout_ms: int = DEFAULT_RESOLVE_TIMEOUT_MS,
+                 stale_timeout_ms: int = DEFAULT_STALE_TIMEOUT_MS):
+        """
+        Args:
+            page (Page): Playwright 页面对象。
+            controls (Dict[str, UiControl]): 控件定义。
+            timeout_ms (int): 解析单个控件的最长等待时间（毫秒）。
+            stale_timeout_ms (int): 取用缓存时等待标记元素的时间（毫秒），超时即重新解析。
+        """
+        self.page = page
+        self.controls = controls
+        self.timeout_ms = timeout_ms
+        self.stale_timeout_ms = stale_timeout_ms
+        self._locators: Dict[str, Locator] = {}
+        self.resolve_count: Dict[str, int] = {} # 每个控件被解析（含重新解析）的次数
+
+    def _marker_selector(self, name: str) -> str:
+        return f'[{MARKER_ATTRIBUTE}="{name}"]'
+
+    def _query(self, control: UiControl) -> Locator:
+        """按控件定义构造原始（未缓存的）定位器。"""
+        if control.selector:
+            return self.page.locator(control.selector).first
+        return self.page.get_by_role(control.role, name=control.label, exact=control.exact).first
+
+    async def _resolve(self, name: str, timeout_ms: Optional[int] = None) -> Locator:
+        """按角色/选择器查找控件，给元素打上标记并缓存标记选择器。"""
+        control = self.controls[name]
+        with TRACER.span(f"解析控件 {name}", "ui_map"):
+            locator = self._query(control)
+            await locator.wait_for(state=control.state, timeout=timeout_ms or self.timeout_ms)
+            await locator.evaluate(
+                """(el, [attribute, name]) => {
+                    document.querySelectorAll(`[${attribute}="${name}"]`).forEach(old => old.removeAttribute(attribute));
+                    el.setAttribute(attribute, name);
+                }""",
+                [MARKER_ATTRIBUTE, name]
+            )
+        self.resolve_count[name] = self.resolve_count.get(name, 0) + 1
+        cached = self._locators[name] = self.page.locator(self._marker_selector(name))
+        return cached
+
+    async def get(self, name: str) -> Locator:
+        """
+        返回控件的定位器。未缓存时解析；已缓存时等待其标记元素（在位时立即返回），
+        等待超时（元素被重新渲染、标记丢失）则丢弃缓存，重新解析一次。
+        """
+        cached = self._locators.get(name)
+        if cached is None:
+            return await self._resolve(name)
+        try:
+            await cached.wait_for(state=self.controls[name].state, timeout=self.stale_timeout_ms)
+            return cached
+        except PlaywrightTimeoutError:
+            logger.debug(f"控件 '{name}' 的缓存已失效，重新解析。")
+        self.invalidate(name)
+        return await self._resolve(name)
+
+    def invalidate(self, *names: str) -> None:
+        """丢弃给定控件（未指定时为全部）的缓存，下次 get 时重新解析。"""
+        for name in names or tuple(self._locators):
+            if self._locators.pop(name, None) is not None:
+                logger.debug(f"控件 '{name}' 的缓存已丢弃，下次使用时重新解析。")
+
+    async def verify(self, names: Iterable[str] = STARTUP_CONTROLS) -> None:
+        """
+        启动检查：并发解析给定控件（总等待不超过一个解析时限），全部找到后才继续；
+        有缺失时列出所有缺失控件并抛出 UiMapError。
+        """
+        names = tuple(names)
+        results = await asyncio.gather(*(self._resolve(name) for name in names), return_exceptions=True)
+        missing: List[str] = []
+        for name, result in zip(names, results):
+            if isinstance(result, PlaywrightTimeoutError):
+                control = self.controls[name]
+                description = control.selector or f'{control.role} "{control.label}"'
+                missing.append(f"{name}（{description}）")
+            elif isinstance(result, BaseException):
+                raise result
+        if missing:
+            raise UiMapError(f"WebUI 页面缺少以下控件，请检查 WebUI 版本、界面语言或扩展: {', '.join(missing)}")
+        logger.info(f"控件启动检查通过: {', '.join(names)}")
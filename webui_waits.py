@@ -0,0 +1,146 @@
+# filename: webui_waits.py
+# Playwright 就绪等待层：用“真实条件满足”取代固定的 asyncio.sleep 节拍
+import time
+import asyncio
+import re
+from typing import Optional, Callable, Dict, List, Tuple
+from loguru import logger
+from playwright.async_api import Page, Locator, Response, expect
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from trace_spans import TRACER
+
+# 默认的条件等待超时时间 (毫秒)，与原先 wait_for(timeout=10000) 保持一致
+DEFAULT_TIMEOUT_MS = 10000
+# 每个步骤的最小间隔 (秒)：即使条件已满足，也至少等待这么久，作为安全下限
+DEFAULT_MIN_DELAY_SECONDS = 0.2
+# 点击 Enqueue 后，被视为“已确认加入队列”的请求地址特征
+ENQUEUE_ACK_URL_PATTERN = re.compile(r"/(queue/join|run/predict|api/predict|agent-scheduler/)")
+
+
+class StepWaiter:
+    """
+    基于条件的步骤等待器。
+    每一步都会等待真实条件（元素可见/可用、文本框内容一致、Enqueue 已确认、网络空闲）满足后立即进入下一步，
+    并记录该步骤实际等待的时间；min_delay 作为可配置的安全下限。
+    """
+    def __init__(self, page: Page, min_delay: float = DEFAULT_MIN_DELAY_SECONDS, timeout_ms: int = DEFAULT_TIMEOUT_MS):
+        """
+        Args:
+            page (Page): Playwright 页面对象。
+            min_delay (float): 每个步骤的最小延迟（秒），0 表示不设下限。
+            timeout_ms (int): 每个条件的最长等待时间（毫秒）。
+        """
+        self.page = page
+        self.min_delay = max(0.0, min_delay)
+        self.timeout_ms = timeout_ms
+        self.total_waited = 0.0 # 累计等待时间 (秒)，用于任务结束时汇总
+        self.step_durations: Dict[str, List[float]] = {} # 每个步骤名称的各次耗时 (秒)
+
+    async def _finish(self, step: str, start: float) -> float:
+        """
+        步骤条件满足后调用：记录实际等待时间，并在不足安全下限时补足延迟。
+        Returns:
+            float: 该步骤总耗时（秒，包含补足的下限延迟）。
+        """
+        condition_met = time.perf_counter()
+        condition_elapsed = condition_met - start
+        TRACER.add_span(step, start, condition_met, "wait")
+        if condition_elapsed < self.min_delay:
+            await asyncio.sleep(self.min_delay - condition_elapsed)
+            TRACER.add_span("最小延迟补足", condition_met, time.perf_counter(), "sleep", step=step)
+        total_elapsed = time.perf_counter() - start
+        self.total_waited += total_elapsed
+        self.step_durations.setdefault(step, []).append(total_elapsed)
+        logger.debug(f"[等待] {step}: 条件满足耗时 {condition_elapsed:.3f} 秒，总耗时 {total_elapsed:.3f} 秒。")
+        return total_elapsed
+
+    async def until_visible(self, locator: Locator, step: str) -> float:
+        """等待元素可见。"""
+        start = time.perf_counter()
+        await locator.wait_for(state="visible", timeout=self.timeout_ms)
+        return await self._finish(step, start)
+
+    async def until_attached(self, locator: Locator, step: str) -> float:
+        """等待元素挂载到 DOM（如隐藏的 file input）。"""
+        start = time.perf_counter()
+        await locator.wait_for(state="attached", timeout=self.timeout_ms)
+        return await self._finish(step, start)
+
+    async def until_enabled(self, locator: Locator, step: str) -> float:
+        """等待元素可见且处于可用 (enabled) 状态。"""
+        start = time.perf_counter()
+        await locator.wait_for(state="visible", timeout=self.timeout_ms)
+        await expect(locator).to_be_enabled(timeout=self.timeout_ms)
+        return await self._finish(step, start)
+
+    async def until_value(self, locator: Locator, expected: str, step: str) -> float:
+        """等待输入框/文本框的值与期望内容一致。"""
+        start = time.perf_counter()
+        await expect(locator).to_have_value(expected, timeout=self.timeout_ms)
+        return await self._finish(step, start)
+
+    async def until_network_idle(self, step: str) -> float:
+        """
+        等待网络空闲。Gradio 的长连接可能导致永远无法达到 networkidle，
+        因此超时只记录警告，不中断流程。
+        """
+        start = time.perf_counter()
+        try:
+            await self.page.wait_for_load_state("networkidle", timeout=self.timeout_ms)
+        except PlaywrightTimeoutError:
+            logger.warning(f"[等待] {step}: {self.timeout_ms} 毫秒内未达到网络空闲，继续执行。")
+        return await self._finish(step, start)
+
+    async def click_and_wait_ack(
+        self,
+        locator: Locator,
+        step: str,
+        ack_selector: Optional[str] = None,
+        is_ack_response: Optional[Callable[[Response], bool]] = None
+    ) -> Tuple[bool, float]:
+        """
+        点击按钮（如 Enqueue）并等待确认信号。
+        - 如提供 ack_selector，则等待该确认元素（如提示 toast）出现；
+        - 否则等待与 ENQUEUE_ACK_URL_PATTERN 匹配的请求返回；
+        - 若均未在超时内出现，则等待网络空闲后返回未确认，由调用方决定如何处理。
+
+        Returns:
+            Tuple[bool, float]: (是否收到确认, 该步骤总耗时（秒）)
+        """
+        start = time.perf_counter()
+        acknowledged = True
+        if ack_selector:
+            await locator.click()
+            try:
+                await self.page.locator(ack_selector).first.wait_for(state="visible", timeout=self.timeout_ms)
+            except PlaywrightTimeoutError:
+                logger.warning(f"[等待] {step}: 未检测到确认元素 '{ack_selector}'。")
+                acknowledged = False
+                await self._wait_network_idle_quietly()
+            return acknowledged, await self._finish(step, start)
+
+        predicate = is_ack_response or (lambda response: bool(ENQUEUE_ACK_URL_PATTERN.search(response.url)))
+        try:
+            async with self.page.expect_response(predicate, timeout=self.timeout_ms):
+                await locator.click()
+        except PlaywrightTimeoutError:
+            logger.warning(f"[等待] {step}: 未检测到确认请求返回。")
+            acknowledged = False
+            await self._wait_network_idle_quietly()
+        return acknowledged, await self._finish(step, start)
+
+    def log_step_summary(self, label: str = "") -> None:
+        """输出每个步骤的次数、平均耗时与最大耗时。"""
+        if not self.step_durations:
+            return
+        logger.info(f"--- 步骤耗时汇总{label} ---")
+        for step, durations in self.step_durations.items():
+            average = sum(durations) / len(durations)
+            logger.info(f"{step}: {len(durations)} 次，平均 {average * 1000:.0f} 毫秒，最大 {max(durations) * 1000:.0f} 毫秒")
+
+    async def _wait_network_idle_quietly(self) -> None:
+        """等待网络空闲，超时则忽略。"""
+        try:
+            await self.page.wait_for_load_state("networkidle", timeout=self.timeout_ms)
+        except PlaywrightTimeoutError:
+            pass